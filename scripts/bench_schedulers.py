@@ -0,0 +1,41 @@
+import argparse
+import json
+import sys
+from pathlib import Path
+from qprism.experiments.scheduler_bench import DEFAULT_SIZES, compare_to_baseline, run_benchmarks
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Microbenchmark every registered scheduler on synthetic viewports")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES), help="Tiles per viewport")
+    parser.add_argument("--policies", nargs="+", default=None, help="Scheduler variants (default: all registered)")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--out", default=None, help="Write results JSON here (use as a future --baseline)")
+    parser.add_argument("--baseline", default=None, help="Baseline JSON to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed slowdown vs baseline (default: 0.25)")
+    args = parser.parse_args()
+
+    rows = run_benchmarks(args.sizes, args.policies, repeats=args.repeats)
+    for row in rows:
+        print(
+            f"{row['policy']:<24} {row['tiles']:>6} tiles  "
+            f"{row['ns_per_schedule'] / 1000:>10.1f} us/schedule  "
+            f"{row['ns_per_tile']:>8.0f} ns/tile  "
+            f"ordering {row['ordering_quality']:.3f}"
+        )
+    if args.out:
+        Path(args.out).write_text(json.dumps(rows, indent=2), encoding="utf-8")
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8"))
+        regressions = compare_to_baseline(rows, baseline, tolerance=args.tolerance)
+        for r in regressions:
+            print(
+                f"REGRESSION {r['policy']} @ {r['tiles']} tiles: "
+                f"{r['ns_per_schedule']} ns vs {r['baseline_ns_per_schedule']} ns, "
+                f"ordering {r['ordering_quality']:.3f} vs {r['baseline_ordering_quality']:.3f}"
+            )
+        if regressions:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
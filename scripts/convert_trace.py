@@ -0,0 +1,21 @@
+import argparse
+from pathlib import Path
+from qprism.viewport.qtrace import convert_json_trace, open_qtrace
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Convert JSON viewport traces to the columnar .qtrace format")
+    parser.add_argument("traces", nargs="+", help="JSON trace files (point list or {\"frames\": [...]} layout)")
+    parser.add_argument("--out-dir", default=None, help="Write .qtrace files here (default: next to each input)")
+    args = parser.parse_args()
+
+    for src in map(Path, args.traces):
+        dst = None
+        if args.out_dir:
+            out_dir = Path(args.out_dir)
+            out_dir.mkdir(parents=True, exist_ok=True)
+            dst = out_dir / src.with_suffix(".qtrace").name
+        written = convert_json_trace(src, dst)
+        print(f"Wrote {len(open_qtrace(written))} frames -> {written}")
+
+if __name__ == "__main__":
+    main()
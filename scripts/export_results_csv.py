@@ -1,12 +1,19 @@
 import csv, os, argparse
-from qprism.experiments.analysis import compute_run_metrics, aggregate_metrics
+from qprism.experiments.analysis import materialized_run_metrics, aggregate_metrics, pooled_latency_percentiles
+from qprism.logging_sink.parquet_sink import open_results
 import duckdb
 
-def export(db_path: str, out_dir: str):
+def export(db_path: str, out_dir: str, parquet_root: str = None):
     os.makedirs(out_dir, exist_ok=True)
-    conn = duckdb.connect(db_path, read_only=True)
-    runs = conn.execute("SELECT run_id FROM runs").fetchall()
-    per_run = [compute_run_metrics(conn, run_id) for (run_id,) in runs]
+    if parquet_root:
+        # Materialized metrics persist next to the partitions
+        conn = open_results(parquet_root, duckdb.connect(os.path.join(parquet_root, "analysis.duckdb")))
+    else:
+        # Not read-only: metrics of new runs are materialized into run_metrics
+        conn = duckdb.connect(db_path)
+    per_run = [
+        {k: v for k, v in row.items() if k != "run_id"} for row in materialized_run_metrics(conn)
+    ]
     summary = aggregate_metrics(per_run)
 
     for metric, data in summary.items():
@@ -15,11 +22,21 @@ def export(db_path: str, out_dir: str):
             writer.writerow(["metric", "mean", "stdev", "count"])
             writer.writerow([metric, data['mean'], data['stdev'], data['count']])
 
+    # Pooled percentiles from merged per-run sketches, not averages of per-run percentiles
+    pooled = pooled_latency_percentiles(conn)
+    if pooled:
+        with open(os.path.join(out_dir, "latency_pooled.csv"), 'w') as f:
+            writer = csv.DictWriter(f, fieldnames=list(pooled[0].keys()))
+            writer.writeheader()
+            writer.writerows(pooled)
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
-    parser.add_argument("--db", required=True)
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--db")
+    source.add_argument("--parquet", help="Root of a results_store: parquet tree")
     parser.add_argument("--out", default="results")
     args = parser.parse_args()
-    export(args.db, args.out)
+    export(args.db, args.out, parquet_root=args.parquet)
 
 
@@ -0,0 +1,80 @@
+import argparse
+import asyncio
+import csv
+import sys
+from dataclasses import asdict, fields
+from pathlib import Path
+from typing import List
+
+from qprism.config import load_base_config, load_experiment_config
+from qprism.experiments.load import ClientResult, LoadStep, run_load
+
+def _repo_root() -> Path:
+    return Path(__file__).resolve().parent.parent
+
+def _counts(spec: str) -> List[int]:
+    # "1,2,4,8" or "1-4"
+    counts: List[int] = []
+    for part in spec.split(","):
+        if "-" in part:
+            lo, hi = part.split("-", 1)
+            counts.extend(range(int(lo), int(hi) + 1))
+        elif part:
+            counts.append(int(part))
+    return counts
+
+def _fmt(value) -> str:
+    return "-" if value is None else f"{value:.0f}"
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Load one server with N concurrent clients and report its capacity curve")
+    parser.add_argument("--experiment", required=True, help="Experiment YAML, its variant picks the server")
+    parser.add_argument("--clients", default="1,2,4,8,16,32,64", help="Client counts, one step each (default: 1,2,4,...,64)")
+    parser.add_argument("--traces", nargs="*", default=[], help="Traces handed to clients in turn (default: the YAML's)")
+    parser.add_argument("--clients-per-process", type=int, default=16, help="Above this, clients run in spawned processes")
+    parser.add_argument("--host", default="127.0.0.1", help="Server host (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=4433, help="Server port for H3 (default: 4433)")
+    parser.add_argument("--mbtiles", default=None, help="Override MBTiles path")
+    parser.add_argument("--netem", action="store_true", help="Apply the YAML's netem profile on --interface")
+    parser.add_argument("--interface", default="lo", help="tc interface for netem (default: lo)")
+    parser.add_argument("--csv", default=None, help="Also write the curve to this CSV file")
+    args = parser.parse_args()
+
+    base = load_base_config()
+    exp = load_experiment_config(Path(args.experiment))
+
+    def report(r: ClientResult) -> None:
+        if r.error:
+            print(f"client {r.index} seed={r.seed} failed:\n{r.error}", file=sys.stderr)
+
+    steps = asyncio.run(run_load(
+        base=base,
+        exp=exp,
+        repo_root=_repo_root(),
+        client_counts=_counts(args.clients),
+        traces=[Path(p) for p in args.traces],
+        host=args.host,
+        port=args.port,
+        mbtiles_path=Path(args.mbtiles) if args.mbtiles else None,
+        clients_per_process=args.clients_per_process,
+        interface=args.interface,
+        apply_netem=args.netem,
+        on_client=report,
+    ))
+
+    print(f"{'clients':>7} {'procs':>5} {'tiles/s':>8} {'depth_mean':>10} {'depth_max':>9} "
+          f"{'p99_client_med':>14} {'p99_client_max':>14} {'p99':>6} {'errors':>6}")
+    for s in steps:
+        print(
+            f"{s.clients:>7} {s.processes:>5} {s.tiles_per_s:>8.1f} {s.depth_mean:>10.1f} {s.depth_max:>9} "
+            f"{_fmt(s.client_p99_median_ms):>14} {_fmt(s.client_p99_max_ms):>14} {_fmt(s.p99_ms):>6} {s.errors:>6}"
+        )
+    if args.csv:
+        with open(args.csv, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=[fld.name for fld in fields(LoadStep)])
+            writer.writeheader()
+            writer.writerows(asdict(s) for s in steps)
+    sys.exit(1 if any(s.errors for s in steps) else 0)
+
+if __name__ == "__main__":
+    main()
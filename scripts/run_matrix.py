@@ -0,0 +1,74 @@
+import argparse
+import os
+import sys
+from pathlib import Path
+from typing import List
+
+from qprism.config import load_base_config, load_experiment_config
+from qprism.experiments.matrix import CellResult, expand_matrix, run_matrix
+from qprism.netem import namespace as netns
+
+def _repo_root() -> Path:
+    return Path(__file__).resolve().parent.parent
+
+def _seeds(spec: str) -> List[int]:
+    # "0-9" or "1,5,7"
+    seeds: List[int] = []
+    for part in spec.split(","):
+        if "-" in part:
+            lo, hi = part.split("-", 1)
+            seeds.extend(range(int(lo), int(hi) + 1))
+        elif part:
+            seeds.append(int(part))
+    return seeds
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run experiments x netem profiles x seeds in parallel")
+    parser.add_argument("--experiments", nargs="+", required=True, help="Experiment YAMLs, one per variant")
+    parser.add_argument("--profiles", nargs="*", default=[], help="Netem profiles (default: each YAML's own)")
+    parser.add_argument("--seeds", default="", help="Seeds, e.g. 0-9 or 1,5,7 (default: each YAML's runs)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--port", type=int, default=4433, help="Base H3 port (default: 4433)")
+    parser.add_argument("--mbtiles", default=None, help="Override MBTiles path")
+    parser.add_argument("--no-netns", action="store_true", help="Run on lo without namespaces or netem")
+    parser.add_argument("--print-netns", action="store_true", help="Print the namespace setup commands and exit")
+    args = parser.parse_args()
+
+    base = load_base_config()
+    cells = expand_matrix(
+        [load_experiment_config(Path(p)) for p in args.experiments],
+        profiles=args.profiles,
+        seeds=_seeds(args.seeds),
+    )
+    workers = min(args.workers, len(cells))
+    if args.print_netns:
+        for slot in range(workers):
+            for cmd in netns.setup_commands(netns.netns_pair(slot)):
+                print(" ".join(cmd))
+        return
+
+    print(f"{len(cells)} cells on {workers} workers")
+
+    def report(r: CellResult) -> None:
+        status = "ok" if r.error is None else "FAILED"
+        print(f"[{r.index + 1}/{len(cells)}] w{r.slot} {r.name} {r.netem_profile} seed={r.seed}: {status}")
+        if r.error:
+            print(r.error, file=sys.stderr)
+
+    results = run_matrix(
+        cells,
+        base=base,
+        repo_root=_repo_root(),
+        workers=workers,
+        mbtiles_path=Path(args.mbtiles) if args.mbtiles else None,
+        isolate=not args.no_netns,
+        apply_netem=not args.no_netns,
+        base_port=args.port,
+        on_result=report,
+    )
+    failed = [r for r in results if r.error is not None]
+    print(f"{len(results) - len(failed)} ok, {len(failed)} failed")
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+import argparse
+import time
+from collections import defaultdict
+from contextlib import nullcontext
+from pathlib import Path
+from statistics import mean, median
+from typing import Dict, List, Tuple
+
+from qprism.config import load_base_config, load_experiment_config
+from qprism.experiments.matrix import expand_matrix
+from qprism.experiments.run import _open_sink
+from qprism.experiments.sim import SimConfig, SimRunSummary, simulate_experiment
+from qprism.viewport.prepared import load_prepared_trace
+
+def _seeds(spec: str) -> List[int]:
+    # "0-999" or "1,5,7"
+    seeds: List[int] = []
+    for part in spec.split(","):
+        if "-" in part:
+            lo, hi = part.split("-", 1)
+            seeds.extend(range(int(lo), int(hi) + 1))
+        elif part:
+            seeds.append(int(part))
+    return seeds
+
+def _fmt(value) -> str:
+    return "-" if value is None else f"{value:.0f}"
+
+def main() -> None:
+    defaults = SimConfig()
+    parser = argparse.ArgumentParser(description="Run experiments on the simulated transport (virtual time, no root)")
+    parser.add_argument("--experiments", nargs="+", required=True, help="Experiment YAMLs, one per variant")
+    parser.add_argument("--profiles", nargs="*", default=[], help="Netem profiles (default: each YAML's own)")
+    parser.add_argument("--seeds", default="", help="Seeds, e.g. 0-999 or 1,5,7 (default: each YAML's runs)")
+    parser.add_argument("--rate-kbit", type=int, default=None, help="Bottleneck bandwidth (default: the profile's)")
+    parser.add_argument("--tile-bytes", type=int, default=defaults.tile_bytes, help="Size of every tile response")
+    parser.add_argument("--setup-rtts", type=int, default=defaults.setup_rtts, help="Round trips before each request")
+    parser.add_argument("--no-log", action="store_true", help="Only print summaries, don't write to the results store")
+    args = parser.parse_args()
+
+    base = load_base_config()
+    sim = SimConfig(tile_bytes=args.tile_bytes, setup_rtts=args.setup_rtts, rate_kbit=args.rate_kbit)
+    cells = expand_matrix(
+        [load_experiment_config(Path(p)) for p in args.experiments],
+        profiles=args.profiles,
+        seeds=_seeds(args.seeds),
+    )
+
+    prepared = {}
+    groups: Dict[Tuple[str, str], List[SimRunSummary]] = defaultdict(list)
+    start = time.perf_counter()
+    with (nullcontext() if args.no_log else _open_sink(base)) as ddb:
+        for cell in cells:
+            exp = cell.exp
+            if exp.trace_path not in prepared:
+                prepared[exp.trace_path] = load_prepared_trace(
+                    exp.trace_path, exp.viewport, save=base.cache_prepared_traces
+                )
+            groups[(exp.name, exp.netem_profile)].extend(
+                simulate_experiment(base=base, exp=exp, sim=sim, ddb=ddb, prepared=prepared[exp.trace_path])
+            )
+    elapsed = time.perf_counter() - start
+    print(f"{len(cells)} runs in {elapsed:.1f}s")
+
+    print(f"{'experiment':<24} {'profile':<12} {'runs':>5} {'ttfv_p50':>9} {'stall_mean':>11} {'lat_p50':>8} {'lat_p99':>8}")
+    for (name, profile), runs in sorted(groups.items()):
+        ttfv = [r.ttfv_ms for r in runs if r.ttfv_ms is not None]
+        p50 = [r.latency_p50_ms for r in runs if r.latency_p50_ms is not None]
+        p99 = [r.latency_p99_ms for r in runs if r.latency_p99_ms is not None]
+        print(
+            f"{name:<24} {profile:<12} {len(runs):>5} {_fmt(median(ttfv) if ttfv else None):>9} "
+            f"{_fmt(mean(r.stall_ms for r in runs)):>11} {_fmt(median(p50) if p50 else None):>8} "
+            f"{_fmt(median(p99) if p99 else None):>8}"
+        )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,30 @@
+import argparse
+from qprism.viewport.synth import SynthConfig, synthesize_traces
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Synthesize seeded user map sessions as .qtrace files")
+    parser.add_argument("out_dir", help="Output directory for the traces and manifest.json")
+    parser.add_argument("--sessions", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--duration-s", type=float, default=60.0)
+    parser.add_argument("--fps", type=int, default=60)
+    parser.add_argument("--bbox", type=float, nargs=4, default=None, metavar=("MIN_LON", "MIN_LAT", "MAX_LON", "MAX_LAT"))
+    parser.add_argument("--min-zoom", type=int, default=10)
+    parser.add_argument("--max-zoom", type=int, default=17)
+    parser.add_argument("--start-zoom", type=int, default=14)
+    args = parser.parse_args()
+
+    cfg = SynthConfig(
+        duration_s=args.duration_s,
+        fps=args.fps,
+        min_zoom=args.min_zoom,
+        max_zoom=args.max_zoom,
+        start_zoom=args.start_zoom,
+    )
+    if args.bbox:
+        cfg.bbox = tuple(args.bbox)
+    manifest = synthesize_traces(args.out_dir, args.sessions, cfg, seed=args.seed)
+    print(f"Wrote {args.sessions} sessions -> {manifest}")
+
+if __name__ == "__main__":
+    main()
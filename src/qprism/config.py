@@ -1,18 +1,26 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from pathlib import Path
 from typing import Any, Dict, Optional
 
 import yaml
 
+from qprism.types import ViewportGeometry
+
+RESULTS_STORES = ("duckdb", "parquet")
+
 @dataclass(slots=True)
 class BaseConfig:
     experiment_root: Path
     duckdb_path: Path
     default_trace: Path
     default_tile_source: Path
-    viewport_sample_hz: int
+    viewport_sample_hz: int # Grid the logged completeness series is resampled onto, 0 logs every change
     viewport_complete_threshold: float
     stall_threshold_seconds: float
+    parent_coverage_weight: float = 0.0
+    cache_prepared_traces: bool = False
+    results_store: str = "duckdb"
+    parquet_root: Optional[Path] = None
 
 @dataclass(slots=True)
 class ExperimentConfig:
@@ -23,6 +31,11 @@ class ExperimentConfig:
     runs: int
     seed_base: int
     notes: Optional[str] = None
+    scheduler_params: Dict[str, Any] = field(default_factory=dict)
+    scheduler_factory: Optional[str] = None
+    viewport: ViewportGeometry = field(default_factory=ViewportGeometry)
+    qlog: bool = False # Write qlog on both QUIC ends and ingest it after each run
+    replay_speed: float = 1.0 # Trace time per wall-clock time when pacing frames, 0 replays unpaced
 
     @classmethod
     def from_dict(cls, data: Dict[str, Any], root_path: str = "") -> "ExperimentConfig":
@@ -32,6 +45,9 @@ class ExperimentConfig:
         missing = [k for k in required if k not in data]
         if missing:
             raise KeyError(f"Expirement config missing required keys: {missing}")
+        replay_speed = float(data.get("replay_speed", 1.0))
+        if replay_speed < 0:
+            raise ValueError(f"replay_speed must be >= 0: {replay_speed}")
         return cls(
             name=str(data["name"]),
             scheduler_variant=str(data["scheduler_variant"]),
@@ -40,8 +56,25 @@ class ExperimentConfig:
             runs=int(data.get("runs", 1)),
             seed_base=int(data.get("seed_base", 0)),
             notes=str(data["notes"]) if "notes" in data else None,
+            scheduler_params=dict(data.get("scheduler") or {}),
+            scheduler_factory=str(data["scheduler_factory"]) if "scheduler_factory" in data else None,
+            viewport=_viewport_geometry(data.get("viewport") or {}),
+            qlog=bool(data.get("qlog", False)),
+            replay_speed=replay_speed,
         )
 
+def _viewport_geometry(raw: Dict[str, Any]) -> ViewportGeometry:
+    default = ViewportGeometry()
+    geometry = ViewportGeometry(
+        width_px=int(raw.get("width_px", default.width_px)),
+        height_px=int(raw.get("height_px", default.height_px)),
+        device_pixel_ratio=float(raw.get("device_pixel_ratio", default.device_pixel_ratio)),
+        tile_size_px=int(raw.get("tile_size_px", default.tile_size_px)),
+    )
+    if min(geometry.width_px, geometry.height_px, geometry.tile_size_px) <= 0 or geometry.device_pixel_ratio <= 0:
+        raise ValueError(f"Viewport geometry must be positive: {geometry}")
+    return geometry
+
 def load_yaml(path: str | Path) -> Dict[str, Any]:
     path = Path(path) if isinstance(path, str) else path 
     with path.open('r', encoding='utf-8') as f:
@@ -68,6 +101,10 @@ def load_base_config(path: str | Path ="configs/base.yaml") -> BaseConfig:
     if default_tile_source is None:
         raise KeyError("Base config is missing default_tile_source")
 
+    results_store = str(raw.get("results_store", "duckdb"))
+    if results_store not in RESULTS_STORES:
+        raise ValueError(f"results_store must be one of {RESULTS_STORES}: {results_store}")
+
     return BaseConfig(
         experiment_root=Path(experiment_root),
         duckdb_path=Path(duckdb_path),
@@ -75,7 +112,11 @@ def load_base_config(path: str | Path ="configs/base.yaml") -> BaseConfig:
         default_tile_source=Path(default_tile_source),
         viewport_sample_hz=int(raw.get("viewport_sample_hz", 10)),
         viewport_complete_threshold=float(raw.get("viewport_complete_threshold", 0.95)),
-        stall_threshold_seconds=float(raw.get("stall_threshold_seconds", 0.25))
+        stall_threshold_seconds=float(raw.get("stall_threshold_seconds", 0.25)),
+        parent_coverage_weight=float(raw.get("parent_coverage_weight", 0.0)),
+        cache_prepared_traces=bool(raw.get("cache_prepared_traces", False)),
+        results_store=results_store,
+        parquet_root=Path(raw["parquet_root"]) if raw.get("parquet_root") else Path(experiment_root) / "parquet",
     )
     
 def load_experiment_config(path: str | Path) -> ExperimentConfig:
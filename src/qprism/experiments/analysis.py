@@ -1,29 +1,311 @@
-from typing import Dict, Any
+from typing import Dict, Any, Optional, Sequence
 import duckdb
 from qprism.metrics import *
+from qprism.sketch import ALL_RINGS, DDSketch
 
-def compute_run_metrics(conn, run_id: int) -> Dict[str, Any]:
-    samples = conn.execute(f"SELECT ts_ms, completeness FROM viewport_samples WHERE run_id = {run_id}").fetchall()
-    requests = conn.execute(f"SELECT ring, requested_at FROM tile_requests WHERE run_id = {run_id}").fetchall()
-    completions = conn.execute(f"SELECT ring, requested_at, completed_at, cancelled FROM tile_completions WHERE run_id ={run_id}").fetchall()
+# runs columns pooled_latency_percentiles may group by
+POOL_COLUMNS = ("experiment_name", "scheduler_variant", "netem_profile", "trace", "mode")
+
+# Bump whenever RUN_METRICS_SQL changes what it computes, rows of older
+# versions in run_metrics are then recomputed on the next refresh
+METRICS_VERSION = 1
+
+# Per-run metrics for the runs in the selected CTE, in one pass. Mirrors
+# qprism.metrics: samples and requests are ordered per run with window
+# functions instead of being pulled into Python.
+_RUN_METRICS_TEMPLATE = """
+WITH
+selected AS ({selected}),
+samples AS (
+    SELECT run_id, ts_ms, completeness, completeness < $threshold AS below
+    FROM viewport_samples JOIN selected USING (run_id)
+    WHERE ts_ms >= $motion_start
+),
+sample_runs AS (
+    SELECT run_id,
+        min(ts_ms) FILTER (WHERE NOT below) - $motion_start AS ttfv,
+        max(ts_ms) AS last_ts
+    FROM samples GROUP BY run_id
+),
+stall_edges AS (
+    SELECT *,
+        below AND NOT coalesce(lag(below) OVER w, false) AS starts
+    FROM samples
+    WINDOW w AS (PARTITION BY run_id ORDER BY ts_ms, completeness)
+),
+stall_segments AS (
+    SELECT *,
+        sum(starts::INTEGER) OVER (
+            PARTITION BY run_id ORDER BY ts_ms, completeness ROWS UNBOUNDED PRECEDING
+        ) AS seg
+    FROM stall_edges
+),
+stalls AS (
+    -- A stall runs from its first sample below threshold to the next sample
+    -- at or above it, or to the last sample if it never recovers
+    SELECT s.run_id,
+        coalesce(min(s.ts_ms) FILTER (WHERE NOT s.below), any_value(r.last_ts))
+            - min(s.ts_ms) FILTER (WHERE s.starts) AS duration
+    FROM stall_segments s JOIN sample_runs r USING (run_id)
+    WHERE s.seg > 0
+    GROUP BY s.run_id, s.seg
+),
+stall_totals AS (
+    SELECT run_id, sum(duration) FILTER (WHERE duration >= $debounce_ms) AS vss
+    FROM stalls GROUP BY run_id
+),
+latency AS (
+    SELECT run_id,
+        quantile_cont(completed_at - requested_at, [0.5, 0.95, 0.99]) FILTER (WHERE NOT cancelled) AS q,
+        count(*) FILTER (WHERE cancelled) AS cancelled,
+        count(*) FILTER (WHERE ring = 0) AS r0_intervals
+    FROM tile_completions JOIN selected USING (run_id)
+    GROUP BY run_id
+),
+request_counts AS (
+    SELECT run_id, count(*) AS requested
+    FROM tile_requests JOIN selected USING (run_id)
+    GROUP BY run_id
+),
+fairness_events AS (
+    -- Sweep line: R0 intervals sort ahead of requests at the same instant,
+    -- a request overlaps R0 traffic when the running max interval end reaches it
+    SELECT run_id, requested_at AS pos, 0 AS kind, completed_at AS end_at
+    FROM tile_completions JOIN selected USING (run_id) WHERE ring = 0
+    UNION ALL
+    SELECT run_id, requested_at AS pos, 1 AS kind, NULL AS end_at
+    FROM tile_requests JOIN selected USING (run_id) WHERE ring > 0
+),
+fairness_sweep AS (
+    SELECT run_id, pos, kind,
+        max(end_at) OVER (PARTITION BY run_id ORDER BY pos, kind ROWS UNBOUNDED PRECEDING) AS reach
+    FROM fairness_events
+),
+fairness AS (
+    SELECT run_id, count(*) FILTER (WHERE kind = 1 AND reach >= pos) AS guard_events
+    FROM fairness_sweep GROUP BY run_id
+),
+r0_flags AS (
+    SELECT run_id, requested_at AS s, completed_at AS e,
+        coalesce(requested_at > max(completed_at) OVER (
+            PARTITION BY run_id ORDER BY requested_at, completed_at
+            ROWS BETWEEN UNBOUNDED PRECEDING AND 1 PRECEDING
+        ), true) AS new_island
+    FROM tile_completions JOIN selected USING (run_id)
+    WHERE ring = 0 AND requested_at <= completed_at
+),
+r0_islands AS (
+    -- Gaps and islands: the union of R0 intervals as disjoint islands
+    SELECT run_id, min(s) AS s, max(e) AS e
+    FROM (
+        SELECT *, sum(new_island::INTEGER) OVER (
+            PARTITION BY run_id ORDER BY s, e ROWS UNBOUNDED PRECEDING
+        ) AS island
+        FROM r0_flags
+    )
+    GROUP BY run_id, island
+),
+fairness_overlap AS (
+    SELECT o.run_id, sum(least(o.completed_at, i.e) - greatest(o.requested_at, i.s)) AS overlap_ms
+    FROM tile_completions o
+    JOIN selected USING (run_id)
+    JOIN r0_islands i ON o.run_id = i.run_id AND o.requested_at < i.e AND i.s < o.completed_at
+    WHERE o.ring > 0
+    GROUP BY o.run_id
+),
+frames AS (
+    SELECT run_id,
+        avg(cpu_ns) / 1000.0 AS sched_cpu_us_per_frame,
+        max(cpu_ns) / 1000.0 AS sched_cpu_us_max,
+        avg(loaded + cancelled) AS sched_decisions_per_frame
+    FROM scheduler_frames JOIN selected USING (run_id)
+    GROUP BY run_id
+)
+SELECT
+    s.run_id,
+    sr.ttfv,
+    coalesce(st.vss, 0) AS vss,
+    l.q[1] AS p50,
+    l.q[2] AS p95,
+    l.q[3] AS p99,
+    CASE WHEN rc.requested > 0 THEN coalesce(l.cancelled, 0) / rc.requested END AS cancel_ratio,
+    CASE WHEN l.r0_intervals > 0 THEN coalesce(f.guard_events, 0) / l.r0_intervals END AS fairness_gaurd_rate,
+    coalesce(fo.overlap_ms, 0) AS fairness_overlap_ms,
+    fr.sched_cpu_us_per_frame,
+    fr.sched_cpu_us_max,
+    fr.sched_decisions_per_frame
+FROM selected s
+LEFT JOIN sample_runs sr USING (run_id)
+LEFT JOIN stall_totals st USING (run_id)
+LEFT JOIN latency l USING (run_id)
+LEFT JOIN request_counts rc USING (run_id)
+LEFT JOIN fairness f USING (run_id)
+LEFT JOIN fairness_overlap fo USING (run_id)
+LEFT JOIN frames fr USING (run_id)
+ORDER BY s.run_id
+"""
+
+# $run_id NULL selects all runs
+RUN_METRICS_SQL = _RUN_METRICS_TEMPLATE.format(selected="""
+    SELECT run_id FROM runs
+    WHERE CAST($run_id AS BIGINT) IS NULL OR run_id = CAST($run_id AS BIGINT)
+""")
+
+RUN_METRICS_COLUMNS = (
+    "ttfv", "vss", "p50", "p95", "p99", "cancel_ratio", "fairness_gaurd_rate", "fairness_overlap_ms",
+    "sched_cpu_us_per_frame", "sched_cpu_us_max", "sched_decisions_per_frame",
+)
+
+RUN_METRICS_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS run_metrics (
+    run_id BIGINT,
+    metrics_version INTEGER,
+    threshold DOUBLE,
+    debounce_ms INTEGER,
+    motion_start INTEGER,
+    ttfv BIGINT,
+    vss BIGINT,
+    p50 DOUBLE,
+    p95 DOUBLE,
+    p99 DOUBLE,
+    cancel_ratio DOUBLE,
+    fairness_gaurd_rate DOUBLE,
+    fairness_overlap_ms BIGINT,
+    sched_cpu_us_per_frame DOUBLE,
+    sched_cpu_us_max DOUBLE,
+    sched_decisions_per_frame DOUBLE,
+    PRIMARY KEY (run_id, metrics_version)
+)
+"""
+
+# Finished runs without a current row: new runs, invalidated runs and runs last
+# computed with other parameters or an older METRICS_VERSION. Runs still
+# logging are left out, a row computed from their partial events would stick.
+_STALE_RUNS_SQL = """
+    SELECT r.run_id FROM runs r
+    WHERE EXISTS (SELECT 1 FROM run_finished f WHERE f.run_id = r.run_id)
+    AND NOT EXISTS (
+        SELECT 1 FROM run_metrics m
+        WHERE m.run_id = r.run_id AND m.metrics_version = $version
+            AND m.threshold = $threshold AND m.debounce_ms = $debounce_ms AND m.motion_start = $motion_start
+    )
+"""
 
-    ttfv = time_to_first_viewport(samples)
-    vss = viewport_stall_seconds(samples)
+_REFRESH_RUN_METRICS_SQL = f"""
+INSERT OR REPLACE INTO run_metrics
+SELECT run_id, $version, $threshold, $debounce_ms, $motion_start, {", ".join(RUN_METRICS_COLUMNS)}
+FROM ({_RUN_METRICS_TEMPLATE.format(selected=_STALE_RUNS_SQL)})
+"""
 
-    latencies = [comp - req for (_r, req, comp, c) in completions if not c]
-    lats = latency_percentiles(latencies)
+def compute_all_run_metrics(
+    conn,
+    run_id: Optional[int] = None,
+    threshold: float = 0.98,
+    debounce_ms: int = 100,
+    motion_start: int = 0,
+) -> List[Dict[str, Any]]:
+    """Metrics for every run (or just run_id) in a single query."""
+    cursor = conn.execute(RUN_METRICS_SQL, {
+        "run_id": run_id,
+        "threshold": threshold,
+        "debounce_ms": debounce_ms,
+        "motion_start": motion_start,
+    })
+    columns = [d[0] for d in cursor.description]
+    return [dict(zip(columns, row)) for row in cursor.fetchall()]
 
-    cancel = cancel_ratio(len(requests), sum(1 for (t, comp) in requests if t is None))
+def refresh_run_metrics(
+    conn,
+    threshold: float = 0.98,
+    debounce_ms: int = 100,
+    motion_start: int = 0,
+) -> int:
+    """Compute run_metrics rows for finished runs that have no current row; returns how many.
 
-    r0s = [(req, comp) for (_r, req, comp, c) in completions if _r ==0]
-    nonr0s = [comp for (t,comp) in requests if t > 0]
-    fairness = fairness_gaurd_rate(r0s, nonr0s)
+    Older rows of other versions are kept, so analyses pinned to an older
+    METRICS_VERSION can still read them.
+    """
+    conn.execute(RUN_METRICS_TABLE_SQL)
+    params = {"threshold": threshold, "debounce_ms": debounce_ms, "motion_start": motion_start}
+    stale = conn.execute(
+        f"SELECT count(*) FROM ({_STALE_RUNS_SQL})", {**params, "version": METRICS_VERSION}
+    ).fetchone()[0]
+    if stale:
+        conn.execute(_REFRESH_RUN_METRICS_SQL, {**params, "version": METRICS_VERSION})
+    return stale
 
-    return {
-        "ttfv": ttfv, "vss": vss,
-        **lats, "cancel_ratio": cancel,
-        "fairness_gaurd_rate": fairness
-    }
+def invalidate_run_metrics(conn, run_ids: Optional[Sequence[int]] = None) -> None:
+    """Drop materialized metrics of run_ids (all runs if None), e.g. after re-logging a run."""
+    conn.execute(RUN_METRICS_TABLE_SQL)
+    if run_ids is None:
+        conn.execute("DELETE FROM run_metrics")
+    else:
+        conn.execute("DELETE FROM run_metrics WHERE list_contains(?, run_id)", [list(run_ids)])
+
+def materialized_run_metrics(
+    conn,
+    threshold: float = 0.98,
+    debounce_ms: int = 100,
+    motion_start: int = 0,
+) -> List[Dict[str, Any]]:
+    """Like compute_all_run_metrics, but only new or invalidated runs are computed."""
+    refresh_run_metrics(conn, threshold, debounce_ms, motion_start)
+    cursor = conn.execute(
+        f"SELECT run_id, {', '.join(RUN_METRICS_COLUMNS)} FROM run_metrics "
+        "WHERE metrics_version = ? ORDER BY run_id",
+        [METRICS_VERSION],
+    )
+    columns = [d[0] for d in cursor.description]
+    return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+def compute_run_metrics(conn, run_id: int) -> Dict[str, Any]:
+    rows = compute_all_run_metrics(conn, run_id)
+    if not rows:
+        raise KeyError(f"Unknown run_id: {run_id}")
+    metrics = rows[0]
+    del metrics["run_id"]
+    return metrics
+
+def pooled_latency_percentiles(
+    conn,
+    group_by: Sequence[str] = ("scheduler_variant", "netem_profile"),
+    ring: int = ALL_RINGS,
+    percentiles=(50, 95, 99),
+) -> List[Dict[str, Any]]:
+    """Latency percentiles over all completions of each group, by merging run sketches.
+
+    Unlike averaging per-run percentiles, this is the percentile of the pooled
+    latencies (within the sketches' relative accuracy).
+    """
+    unknown = [c for c in group_by if c not in POOL_COLUMNS]
+    if unknown:
+        raise KeyError(f"Cannot group latency sketches by: {unknown}")
+    has_table = conn.execute(
+        "SELECT count(*) FROM information_schema.tables WHERE table_name = 'latency_sketches'"
+    ).fetchone()[0]
+    if not has_table:
+        # Database written before sketches were recorded
+        return []
+    columns = ", ".join(f"r.{c}" for c in group_by)
+    select = f"SELECT {columns}, s.sketch" if group_by else "SELECT s.sketch"
+    rows = conn.execute(
+        f"{select} FROM latency_sketches s JOIN runs r USING (run_id) WHERE s.ring = ?",
+        [ring],
+    ).fetchall()
+    pooled: Dict[tuple, DDSketch] = {}
+    runs: Dict[tuple, int] = {}
+    for row in rows:
+        key, blob = tuple(row[:-1]), row[-1]
+        sketch = DDSketch.from_bytes(blob)
+        if key in pooled:
+            pooled[key].merge(sketch)
+        else:
+            pooled[key] = sketch
+        runs[key] = runs.get(key, 0) + 1
+    return [
+        {**dict(zip(group_by, key)), "runs": runs[key], "count": sketch.count, **sketch.percentiles(percentiles)}
+        for key, sketch in sorted(pooled.items(), key=lambda kv: tuple(str(k) for k in kv[0]))
+    ]
 
 def aggregate_metrics(metrics: List[Dict]) -> Dict[str, Dict[str, float]]:
     result = {}
@@ -0,0 +1,99 @@
+import random
+import time
+from typing import Optional, Protocol, Set, Tuple
+
+from qprism.logging_sink.duckdb_logger import DuckDBLogger
+from qprism.scheduler.base import Scheduler
+from qprism.scheduler.rings import ring_enum, ring_tiles
+from qprism.types import SchedulerFrame, Tile, TileRequest
+from qprism.viewport.prepared import PreparedTrace
+from qprism.viewport.traces import TracePoint
+
+TileKey = Tuple[int, int, int]
+
+class TileTransport(Protocol):
+    """Where a frame's decisions go: the live runner's fetch tasks or a simulated link.
+
+    now_ms() is the run clock requests are stamped with, on the trace's
+    timescale. cancel() is called for every tile the scheduler drops and
+    only has to act on those still in flight.
+    """
+    def now_ms(self) -> int: ...
+
+    def request(self, tile: Tile, tr: TileRequest) -> None: ...
+
+    def cancel(self, tile: Tile) -> None: ...
+
+def schedule_frame(
+    frame_idx: int,
+    tp: TracePoint,
+    prepared: PreparedTrace,
+    scheduler: Scheduler,
+    transport: TileTransport,
+    requested: Set[TileKey],
+    rng: random.Random,
+    ddb: Optional[DuckDBLogger] = None,
+    run_id: int = 0,
+    lateness_us: Optional[int] = None,
+    loop_lag_us: Optional[int] = None,
+    rings: Optional[int] = None,
+) -> Optional[SchedulerFrame]:
+    """Offer one frame's tiles, schedule them, log the frame and hand the decisions to transport.
+
+    The offer is the frame's visible tiles, plus rings 1..candidate_rings
+    around its viewport for policies that set it; rings overrides that for
+    harnesses that offer every policy the same tiles.
+    requested holds every (z, x, y) issued so far in the run and is updated
+    in place. Returns the logged frame, None when nothing is visible.
+    """
+    scheduler.observe_frame(tp)
+    viewport = prepared.viewports[frame_idx]
+    if viewport is None:
+        return None
+
+    # Only tiles never requested, schedulers would otherwise track them as in flight
+    candidates = [Tile(x, y, tp.zoom) for (x, y) in prepared.visible[frame_idx]]
+    if rings is None:
+        rings = getattr(scheduler, "candidate_rings", 0)
+    if rings:
+        candidates.extend(ring_tiles(viewport, rings))
+    candidates = [t for t in candidates if (t.z, t.x, t.y) not in requested]
+    rng.shuffle(candidates)
+
+    wall_start = time.perf_counter_ns()
+    cpu_start = time.thread_time_ns()
+    to_load, to_cancel = scheduler.schedule(viewport, candidates)
+    cpu_ns = time.thread_time_ns() - cpu_start
+    wall_ns = time.perf_counter_ns() - wall_start
+    frame = SchedulerFrame(
+        frame_idx=frame_idx,
+        t_ms=int(tp.t_ms),
+        candidates=len(candidates),
+        loaded=len(to_load),
+        cancelled=len(to_cancel),
+        cpu_ns=cpu_ns,
+        wall_ns=wall_ns,
+        lateness_us=lateness_us,
+        loop_lag_us=loop_lag_us,
+    )
+    if ddb is not None:
+        ddb.log_scheduler_frame(run_id, frame)
+
+    for t in to_cancel:
+        transport.cancel(t)
+
+    for t in to_load:
+        key = (t.z, t.x, t.y)
+        if key in requested:
+            continue
+        requested.add(key)
+        ring = ring_enum(t, viewport)
+        deadline = scheduler.deadline_for(t)
+        # When the request is actually sent, which lags t_ms by the frame's lateness
+        tr = TileRequest(
+            tile_id=f"{t.x}_{t.y}", zoom=t.z, ring=ring, requested_at_ms=transport.now_ms(), deadline_ms=deadline
+        )
+        if ddb is not None:
+            ddb.log_tile_requested(run_id, tr)
+        transport.request(t, tr)
+    return frame
@@ -0,0 +1,268 @@
+import asyncio
+import math
+import multiprocessing as mp
+import random
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, replace
+from pathlib import Path
+from statistics import mean, median
+from typing import Callable, Dict, List, Optional, Sequence
+
+from qprism.config import BaseConfig, ExperimentConfig
+from qprism.experiments.matrix import worker_base
+from qprism.experiments.run import _boot_server, _open_sink, _run_single_trace, _shutdown_server
+from qprism.logging_sink.duckdb_logger import DuckDBLogger
+from qprism.netem import controller as netem_controller
+from qprism.netem import profiles as netem_profiles
+from qprism.scheduler.registry import make_scheduler
+from qprism.sketch import ALL_RINGS, DDSketch, RingSketches
+from qprism.transport.server_shim.server_stats import ServerStats
+from qprism.viewport.completeness import LiveCompleteness
+from qprism.viewport.prepared import PreparedTrace, load_prepared_trace
+
+@dataclass(slots=True)
+class LoadClient:
+    index: int
+    trace_path: Path
+    seed: int
+
+@dataclass(slots=True)
+class ClientResult:
+    index: int
+    run_id: Optional[int]
+    seed: int
+    trace: str
+    completed: int
+    cancelled: int
+    elapsed_s: float
+    # Serialized DDSketch of every completed tile's latency
+    sketch: bytes
+    error: Optional[str] = None
+
+    @property
+    def p99_ms(self) -> Optional[float]:
+        return DDSketch.from_bytes(self.sketch).quantile(0.99)
+
+@dataclass(slots=True)
+class LoadStep:
+    clients: int
+    processes: int
+    elapsed_s: float
+    completed: int
+    cancelled: int
+    errors: int
+    tiles_per_s: float
+    depth_mean: float
+    depth_max: int
+    queued_max: int
+    served: int
+    client_p99_median_ms: Optional[float]
+    client_p99_max_ms: Optional[float]
+    p99_ms: Optional[float]
+
+def load_clients(exp: ExperimentConfig, count: int, traces: Sequence[Path] = ()) -> List[LoadClient]:
+    """count clients, each on the next trace in turn (default: exp's) with seed seed_base + index."""
+    traces = list(traces) or [exp.trace_path]
+    return [LoadClient(i, Path(traces[i % len(traces)]), exp.seed_base + i) for i in range(count)]
+
+async def _run_client(
+    client: LoadClient,
+    base: BaseConfig,
+    exp: ExperimentConfig,
+    prepared: PreparedTrace,
+    ddb: DuckDBLogger,
+    base_url: Optional[str],
+    host: str,
+    port: int,
+) -> ClientResult:
+    client_exp = replace(exp, trace_path=client.trace_path, seed_base=client.seed)
+    run_id = ddb.log_run(client_exp, mode="load")
+    scheduler = make_scheduler(exp.scheduler_variant, exp.scheduler_params, factory=exp.scheduler_factory)
+    tracker = LiveCompleteness(
+        prepared,
+        parent_weight=base.parent_coverage_weight,
+        on_sample=lambda ts_ms, frac: ddb.log_viewport_sample(run_id, ts_ms, frac),
+        sample_hz=base.viewport_sample_hz,
+    )
+    sketches = RingSketches()
+    result = ClientResult(client.index, run_id, client.seed, str(client.trace_path), 0, 0, 0.0, b"")
+    start = time.monotonic()
+    try:
+        completions = await _run_single_trace(
+            prepared,
+            scheduler,
+            exp.scheduler_variant.lower(),
+            base_url,
+            host,
+            port,
+            run_id,
+            ddb,
+            random.Random(client.seed),
+            tracker,
+            sketches,
+            replay_speed=exp.replay_speed,
+        )
+        result.completed = sum(1 for tc in completions if not tc.cancelled)
+        result.cancelled = len(completions) - result.completed
+    except Exception:
+        # One failing client is reported, the others keep loading the server
+        result.error = traceback.format_exc()
+    result.elapsed_s = time.monotonic() - start
+    tracker.finish()
+    for ring, sketch in sketches.by_ring.items():
+        ddb.log_latency_sketch(run_id, ring, sketch)
+    if result.error is None:
+        # A failed client's run stays unfinished, its partial events never become metrics
+        ddb.finish_run(run_id)
+    result.sketch = sketches.by_ring[ALL_RINGS].to_bytes()
+    return result
+
+async def _drive_clients(
+    clients: Sequence[LoadClient],
+    base: BaseConfig,
+    exp: ExperimentConfig,
+    base_url: Optional[str],
+    host: str,
+    port: int,
+) -> List[ClientResult]:
+    prepared: Dict[Path, PreparedTrace] = {}
+    for client in clients:
+        if client.trace_path not in prepared:
+            prepared[client.trace_path] = load_prepared_trace(
+                client.trace_path, exp.viewport, save=base.cache_prepared_traces
+            )
+            if not len(prepared[client.trace_path]):
+                raise ValueError(f"Trace is empty: {client.trace_path}")
+    with _open_sink(base) as ddb:
+        return list(await asyncio.gather(*(
+            _run_client(c, base, exp, prepared[c.trace_path], ddb, base_url, host, port) for c in clients
+        )))
+
+def _clients_process(
+    clients: Sequence[LoadClient],
+    base: BaseConfig,
+    exp: ExperimentConfig,
+    base_url: Optional[str],
+    host: str,
+    port: int,
+) -> List[ClientResult]:
+    return asyncio.run(_drive_clients(clients, base, exp, base_url, host, port))
+
+async def _sample_depth(stats: ServerStats, interval_s: float, depths: List[int], queued: List[int]) -> None:
+    while True:
+        depths.append(stats.depth)
+        queued.append(stats.queued)
+        await asyncio.sleep(interval_s)
+
+def _summarize(
+    clients: int, processes: int, elapsed_s: float, results: List[ClientResult],
+    depths: List[int], queued: List[int], served: int,
+) -> LoadStep:
+    pooled = DDSketch()
+    p99s = []
+    for r in results:
+        sketch = DDSketch.from_bytes(r.sketch)
+        pooled.merge(sketch)
+        if sketch.count:
+            p99s.append(sketch.quantile(0.99))
+    completed = sum(r.completed for r in results)
+    return LoadStep(
+        clients=clients,
+        processes=processes,
+        elapsed_s=elapsed_s,
+        completed=completed,
+        cancelled=sum(r.cancelled for r in results),
+        errors=sum(1 for r in results if r.error is not None),
+        tiles_per_s=completed / elapsed_s if elapsed_s > 0 else 0.0,
+        depth_mean=mean(depths) if depths else 0.0,
+        depth_max=max(depths, default=0),
+        queued_max=max(queued, default=0),
+        served=served,
+        client_p99_median_ms=median(p99s) if p99s else None,
+        client_p99_max_ms=max(p99s, default=None),
+        p99_ms=pooled.quantile(0.99),
+    )
+
+async def run_load(
+    *,
+    base: BaseConfig,
+    exp: ExperimentConfig,
+    repo_root: Path,
+    client_counts: Sequence[int],
+    traces: Sequence[Path] = (),
+    host: str = "127.0.0.1",
+    port: int = 4433,
+    mbtiles_path: Optional[Path] = None,
+    clients_per_process: int = 16,
+    sample_interval_s: float = 0.05,
+    interface: str = "lo",
+    apply_netem: bool = False,
+    on_client: Optional[Callable[[ClientResult], None]] = None,
+) -> List[LoadStep]:
+    """Load one booted server with a growing number of concurrent clients.
+
+    Each step runs client_counts[i] clients, each its own run (mode 'load')
+    with its own trace, seed and scheduler. Up to clients_per_process of them
+    share this process's event loop with the server; beyond that they are
+    spread over spawned processes so the server keeps this loop to itself.
+    The server's queue depth is sampled every sample_interval_s.
+    """
+    if clients_per_process <= 0:
+        raise ValueError(f"clients_per_process must be positive: {clients_per_process}")
+    if any(n <= 0 for n in client_counts):
+        raise ValueError(f"Client counts must be positive: {list(client_counts)}")
+    profile = None
+    if apply_netem:
+        profiles = netem_profiles.load_profiles()
+        if exp.netem_profile not in profiles:
+            raise KeyError(f"Unknown netem profile: {exp.netem_profile}")
+        profile = profiles[exp.netem_profile]
+
+    tiles_path = mbtiles_path or (repo_root / "src" / "qprism" / base.default_tile_source)
+    if not tiles_path.is_file():
+        raise FileNotFoundError(f"MBTiles not found: {tiles_path}")
+
+    if profile is not None:
+        netem_controller.apply_profile(profile, interface=interface)
+    stats = ServerStats()
+    # Clients never drain server chunks here, recording them would only load the server under test
+    ctx = await _boot_server(exp.scheduler_variant, tiles_path, host, port, repo_root, stats=stats, record_chunks=False)
+    steps = []
+    try:
+        ctx_proc = mp.get_context("spawn")
+        for n in client_counts:
+            clients = load_clients(exp, n, traces)
+            processes = 0 if n <= clients_per_process else math.ceil(n / clients_per_process)
+            served_before = stats.served
+            depths: List[int] = []
+            queued: List[int] = []
+            sampler = asyncio.create_task(_sample_depth(stats, sample_interval_s, depths, queued))
+            start = time.monotonic()
+            try:
+                if not processes:
+                    results = await _drive_clients(clients, base, exp, ctx.base_url, host, port)
+                else:
+                    with ProcessPoolExecutor(max_workers=processes, mp_context=ctx_proc) as pool:
+                        futures = [
+                            asyncio.wrap_future(pool.submit(
+                                _clients_process, clients[slot::processes], worker_base(base, slot), exp,
+                                ctx.base_url, host, port,
+                            ))
+                            for slot in range(processes)
+                        ]
+                        results = [r for chunk in await asyncio.gather(*futures) for r in chunk]
+            finally:
+                sampler.cancel()
+            elapsed_s = time.monotonic() - start
+            results.sort(key=lambda r: r.index)
+            if on_client is not None:
+                for r in results:
+                    on_client(r)
+            steps.append(_summarize(n, processes, elapsed_s, results, depths, queued, stats.served - served_before))
+    finally:
+        await _shutdown_server(ctx)
+        if profile is not None:
+            netem_controller.clear(interface=interface)
+    return steps
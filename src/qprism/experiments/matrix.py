@@ -0,0 +1,174 @@
+import asyncio
+import multiprocessing as mp
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, replace
+from pathlib import Path
+from typing import Callable, List, Optional, Sequence
+
+from qprism.config import BaseConfig, ExperimentConfig
+from qprism.experiments.run import run_experiment
+from qprism.netem import namespace as netns
+from qprism.netem import profiles as netem_profiles
+
+@dataclass(slots=True)
+class MatrixCell:
+    index: int
+    exp: ExperimentConfig
+
+@dataclass(slots=True)
+class CellResult:
+    index: int
+    name: str
+    scheduler_variant: str
+    netem_profile: str
+    seed: int
+    slot: int
+    error: Optional[str] = None
+
+def expand_matrix(
+    experiments: Sequence[ExperimentConfig],
+    profiles: Sequence[str] = (),
+    seeds: Sequence[int] = (),
+) -> List[MatrixCell]:
+    """One cell per experiment x profile x seed, each a single run.
+
+    An empty profile or seed list keeps the experiment's own netem_profile,
+    or its seed_base .. seed_base + runs - 1.
+    """
+    cells = []
+    for exp in experiments:
+        for profile in profiles or (exp.netem_profile,):
+            for seed in seeds or range(exp.seed_base, exp.seed_base + exp.runs):
+                cell_exp = replace(exp, netem_profile=profile, seed_base=int(seed), runs=1)
+                cells.append(MatrixCell(len(cells), cell_exp))
+    return cells
+
+@dataclass(slots=True)
+class _Worker:
+    slot: int
+    base: BaseConfig
+    repo_root: Path
+    mbtiles_path: Optional[Path]
+    pair: Optional[netns.NetnsPair]
+    port: int
+    apply_netem: bool
+
+_WORKER: Optional[_Worker] = None
+
+def worker_base(base: BaseConfig, slot: int) -> BaseConfig:
+    """Per-worker sink and scratch files (qlog): Parquet roots are shared, DuckDB files are not."""
+    worker_root = base.experiment_root / f"worker{slot}"
+    if base.results_store == "parquet":
+        return replace(base, experiment_root=worker_root)
+    path = base.duckdb_path
+    return replace(
+        base, experiment_root=worker_root, duckdb_path=path.with_name(f"{path.stem}.w{slot}{path.suffix}")
+    )
+
+def _init_worker(
+    slots: "mp.Queue[int]",
+    base: BaseConfig,
+    repo_root: Path,
+    mbtiles_path: Optional[Path],
+    isolate: bool,
+    base_port: int,
+    apply_netem: bool,
+) -> None:
+    global _WORKER
+    slot = slots.get()
+    _WORKER = _Worker(
+        slot=slot,
+        base=worker_base(base, slot),
+        repo_root=repo_root,
+        mbtiles_path=mbtiles_path,
+        pair=netns.netns_pair(slot) if isolate else None,
+        # Namespaces have their own port space, without them each worker needs its own port
+        port=base_port if isolate else base_port + slot,
+        apply_netem=apply_netem,
+    )
+
+def _run_cell(cell: MatrixCell) -> CellResult:
+    w = _WORKER
+    assert w is not None, "matrix worker was not initialized"
+    exp = cell.exp
+    result = CellResult(
+        cell.index, exp.name, exp.scheduler_variant, exp.netem_profile, exp.seed_base, w.slot
+    )
+    try:
+        shaped = False
+        if w.pair is not None and w.apply_netem:
+            profile = netem_profiles.load_profiles()[exp.netem_profile]
+            netns.apply_profile(w.pair, profile)
+            shaped = True
+        try:
+            asyncio.run(run_experiment(
+                base=w.base,
+                exp=exp,
+                repo_root=w.repo_root,
+                host=w.pair.peer_addr if w.pair is not None else "127.0.0.1",
+                port=w.port,
+                mbtiles_path=w.mbtiles_path,
+                apply_netem=False,
+                server_netns=w.pair.name if w.pair is not None else None,
+            ))
+        finally:
+            if shaped:
+                netns.clear(w.pair)
+    except Exception:
+        # Reported by the parent, the remaining cells still run
+        result.error = traceback.format_exc()
+    return result
+
+def run_matrix(
+    cells: Sequence[MatrixCell],
+    *,
+    base: BaseConfig,
+    repo_root: Path,
+    workers: int,
+    mbtiles_path: Optional[Path] = None,
+    isolate: bool = True,
+    apply_netem: bool = True,
+    base_port: int = 4433,
+    on_result: Optional[Callable[[CellResult], None]] = None,
+) -> List[CellResult]:
+    """Run every cell on a pool of workers, each with its own namespace, port and sink.
+
+    With isolate, worker slot N owns namespace qprism<N> and its veth pair,
+    which are created before the pool starts and removed when it is done.
+    Without it every worker runs on lo unshaped, as lo can't be shaped per
+    worker.
+    """
+    if workers <= 0:
+        raise ValueError(f"workers must be positive: {workers}")
+    if apply_netem and not isolate:
+        raise ValueError("netem needs isolated namespaces when experiments run in parallel")
+    workers = min(workers, len(cells)) or 1
+    pairs = [netns.netns_pair(slot) for slot in range(workers)] if isolate else []
+
+    ctx = mp.get_context("spawn")
+    slots = ctx.Queue()
+    for slot in range(workers):
+        slots.put(slot)
+
+    results: List[CellResult] = []
+    try:
+        for pair in pairs:
+            netns.create(pair)
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=ctx,
+            initializer=_init_worker,
+            initargs=(slots, base, repo_root, mbtiles_path, isolate, base_port, apply_netem),
+        ) as pool:
+            futures = [pool.submit(_run_cell, cell) for cell in cells]
+            for future in as_completed(futures):
+                result = future.result()
+                results.append(result)
+                if on_result is not None:
+                    on_result(result)
+    finally:
+        for pair in pairs:
+            netns.destroy(pair)
+    results.sort(key=lambda r: r.index)
+    return results
@@ -0,0 +1,205 @@
+import heapq
+import random
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Optional, Protocol, Sequence, Set, Tuple, Union
+
+from qprism.experiments.frame_step import TileKey, schedule_frame
+from qprism.scheduler.base import Scheduler
+from qprism.types import Ring, Tile, TileCompletion, TileRequest, ViewportGeometry
+from qprism.viewport.completeness import LiveCompleteness
+from qprism.viewport.prepared import PreparedTrace, as_prepared
+from qprism.viewport.traces import TracePoint
+
+class CompletionModel(Protocol):
+    def fetch(self, tile: Tile, ring: Ring, requested_at_ms: int) -> Tuple[int, int]:
+        """Return (completed_at_ms, bytes) for a request issued at requested_at_ms."""
+        ...
+
+class ModeledLatency:
+    """Latency = base + per-ring penalty + uniform jitter; fixed tile size."""
+    def __init__(
+        self,
+        base_ms: int = 40,
+        per_ring_ms: int = 10,
+        jitter_ms: int = 10,
+        tile_bytes: int = 20_000,
+        seed: int = 0,
+    ) -> None:
+        self.base_ms = base_ms
+        self.per_ring_ms = per_ring_ms
+        self.jitter_ms = jitter_ms
+        self.tile_bytes = tile_bytes
+        self.rng = random.Random(seed)
+
+    def fetch(self, tile: Tile, ring: Ring, requested_at_ms: int) -> Tuple[int, int]:
+        jitter = self.rng.randint(0, self.jitter_ms) if self.jitter_ms > 0 else 0
+        return requested_at_ms + self.base_ms + self.per_ring_ms * int(ring) + jitter, self.tile_bytes
+
+class RecordedLatency:
+    """Replays the latencies and sizes of a previous run's completions.
+
+    Tiles the recording never completed fall back to `fallback`.
+    """
+    def __init__(self, completions: Sequence[TileCompletion], fallback: Optional[CompletionModel] = None) -> None:
+        self.fallback = fallback or ModeledLatency()
+        self._recorded: Dict[Tuple[int, str], Tuple[int, int]] = {}
+        for tc in completions:
+            if not tc.cancelled:
+                latency = tc.completed_at_ms - tc.requested_at_ms
+                self._recorded[(tc.zoom, tc.tile_id)] = (latency, tc.bytes_transferred or 0)
+
+    def fetch(self, tile: Tile, ring: Ring, requested_at_ms: int) -> Tuple[int, int]:
+        rec = self._recorded.get((tile.z, f"{tile.x}_{tile.y}"))
+        if rec is None:
+            return self.fallback.fetch(tile, ring, requested_at_ms)
+        return requested_at_ms + rec[0], rec[1]
+
+def ring_inversions(rings: Sequence[int]) -> int:
+    # Pairs loaded before a tile of a closer ring; rings are small so count per value
+    seen: Dict[int, int] = {}
+    inversions = 0
+    for r in rings:
+        inversions += sum(c for ring, c in seen.items() if ring > r)
+        seen[r] = seen.get(r, 0) + 1
+    return inversions
+
+@dataclass(slots=True)
+class ReplayResult:
+    frames: int = 0
+    requested: int = 0
+    cancelled: int = 0
+    ring_inversions: int = 0
+    ring_pairs: int = 0
+    schedule_ns: List[int] = field(default_factory=list)
+    completions: List[TileCompletion] = field(default_factory=list)
+
+    @property
+    def ordering_quality(self) -> float:
+        """Fraction of same-frame load pairs not sent ahead of a closer ring."""
+        return 1.0 if not self.ring_pairs else 1.0 - self.ring_inversions / self.ring_pairs
+
+    def ns_percentile(self, p: float) -> Optional[int]:
+        if not self.schedule_ns:
+            return None
+        ordered = sorted(self.schedule_ns)
+        return ordered[max(0, min(len(ordered) - 1, int(p / 100 * len(ordered))))]
+
+    def summary(self) -> Dict[str, Optional[float]]:
+        calls = len(self.schedule_ns)
+        return {
+            "frames": self.frames,
+            "requested": self.requested,
+            "cancelled": self.cancelled,
+            "ordering_quality": self.ordering_quality,
+            "ns_per_schedule": sum(self.schedule_ns) / calls if calls else None,
+            "ns_p50": self.ns_percentile(50),
+            "ns_p99": self.ns_percentile(99),
+        }
+
+class _ModeledTransport:
+    """The frame step's TileTransport over a CompletionModel, on trace time.
+
+    Each frame's requests keep their send order in frame_rings, which is
+    what ordering quality is scored on.
+    """
+    def __init__(self, model: CompletionModel) -> None:
+        self.model = model
+        self.now = 0
+        self.requests: Dict[TileKey, TileRequest] = {}
+        self.frame_rings: List[int] = []
+        self.cancelled: List[TileKey] = []
+        self._pending: List[Tuple[int, int, TileKey, int]] = []
+        self._live: Dict[TileKey, int] = {}
+        self._seq = 0
+
+    def now_ms(self) -> int:
+        return self.now
+
+    def request(self, tile: Tile, tr: TileRequest) -> None:
+        key = (tile.z, tile.x, tile.y)
+        self.requests[key] = tr
+        self.frame_rings.append(int(tr.ring))
+        completed_at, nbytes = self.model.fetch(tile, tr.ring, tr.requested_at_ms)
+        self._seq += 1
+        self._live[key] = self._seq
+        heapq.heappush(self._pending, (completed_at, self._seq, key, nbytes))
+
+    def cancel(self, tile: Tile) -> None:
+        key = (tile.z, tile.x, tile.y)
+        if self._live.pop(key, None) is not None:
+            self.cancelled.append(key)
+
+    def deliver(self, until_ms: Optional[int]) -> Iterator[Tuple[TileKey, int, int]]:
+        while self._pending and (until_ms is None or self._pending[0][0] <= until_ms):
+            at_ms, token, key, nbytes = heapq.heappop(self._pending)
+            if self._live.get(key) == token:
+                del self._live[key]
+                yield key, at_ms, nbytes
+
+def replay_trace(
+    trace: Union[Sequence[TracePoint], PreparedTrace],
+    scheduler: Scheduler,
+    completion_model: CompletionModel,
+    rng: Optional[random.Random] = None,
+    geometry: Optional[ViewportGeometry] = None,
+    candidate_rings: Optional[int] = None,
+) -> ReplayResult:
+    """Drive a scheduler through a trace with modeled completions and no network.
+
+    Runs the runner's frame step with a live completeness tracker attached:
+    completions due by a frame's timestamp are reported to the tracker and
+    scheduler before it is asked to schedule that frame. candidate_rings
+    offers every policy the same rings instead of its own choice, so their
+    ordering can be compared.
+    """
+    rng = rng or random.Random(0)
+    prepared = as_prepared(trace, geometry)
+    result = ReplayResult()
+    transport = _ModeledTransport(completion_model)
+    tracker = LiveCompleteness(prepared)
+    requested: Set[TileKey] = set()
+
+    def _complete(key: TileKey, at_ms: int, nbytes: int, cancelled: bool) -> None:
+        tr = transport.requests[key]
+        z, x, y = key
+        tc = TileCompletion(
+            tile_id=tr.tile_id,
+            zoom=z,
+            ring=tr.ring,
+            requested_at_ms=tr.requested_at_ms,
+            completed_at_ms=at_ms,
+            cancelled=cancelled,
+            bytes_transferred=0 if cancelled else nbytes,
+        )
+        result.completions.append(tc)
+        if not cancelled:
+            tracker.record(tc)
+        scheduler.on_tile_completed(Tile(x, y, z), tc)
+
+    scheduler.attach_completeness(tracker)
+    for frame_idx, tp in enumerate(prepared.points()):
+        for key, at_ms, nbytes in transport.deliver(tp.t_ms):
+            _complete(key, at_ms, nbytes, cancelled=False)
+        transport.now = tp.t_ms
+        tracker.advance(frame_idx)
+        transport.frame_rings = []
+        frame = schedule_frame(
+            frame_idx, tp, prepared, scheduler, transport, requested, rng, rings=candidate_rings,
+        )
+        if frame is None:
+            continue
+        result.frames += 1
+        result.schedule_ns.append(frame.wall_ns)
+        for key in transport.cancelled:
+            result.cancelled += 1
+            _complete(key, tp.t_ms, 0, cancelled=True)
+        transport.cancelled = []
+
+        rings = transport.frame_rings
+        result.requested += len(rings)
+        result.ring_inversions += ring_inversions(rings)
+        result.ring_pairs += len(rings) * (len(rings) - 1) // 2
+
+    for key, at_ms, nbytes in transport.deliver(None):
+        _complete(key, at_ms, nbytes, cancelled=False)
+    return result
@@ -4,30 +4,35 @@ import socket
 import time
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Dict, List, Optional, Set, Tuple
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
 
 from aiohttp import web
 from aioquic.asyncio import serve
 from aioquic.quic.configuration import QuicConfiguration
+from aioquic.quic.logger import QuicFileLogger
 
 from qprism.config import BaseConfig, ExperimentConfig
 from qprism.eps import eps_from_ring
-from qprism.logging_sink.duckdb_logger import DuckDBLogger
+from qprism.experiments.frame_step import TileKey, schedule_frame
+from qprism.logging_sink.duckdb_logger import BufferedDuckDBLogger, DuckDBLogger
+from qprism.logging_sink.parquet_sink import ParquetRunLogger
 from qprism.netem import controller as netem_controller
+from qprism.netem import namespace as netns
 from qprism.netem import profiles as netem_profiles
-from qprism.scheduler.policy_cancel_only import CancelOnlyScheduler
-from qprism.scheduler.policy_priority_only import PriorityOnlyScheduler
-from qprism.scheduler.policy_qprism import QPrismScheduler
-from qprism.scheduler.rings import Viewport, ring_enum, viewport_from_visible
+from qprism.scheduler.base import Scheduler
+from qprism.scheduler.registry import make_scheduler
+from qprism.sketch import RingSketches
+from qprism.transport.chunk_recorder import ChunkRecorder, ChunkStream
 from qprism.transport.clients.H2_client import fetch_tile_h2
 from qprism.transport.clients.H3_client import fetch_tile_h3
+from qprism.transport.clients.H3_util import build_client_config
 from qprism.transport.clients.QPRISM_client import fetch_tile_qprism
 from qprism.transport.server_shim.factory import server_shim_init
 from qprism.transport.server_shim.mb_tiles_backend import MbTilesBackend
+from qprism.transport.server_shim.server_stats import ServerStats
 from qprism.types import Tile, TileCompletion, TileRequest
-from qprism.viewport import model
-from qprism.viewport.completeness import compute_completeness
-from qprism.viewport.traces import TracePoint, load_trace
+from qprism.viewport.completeness import LiveCompleteness
+from qprism.viewport.prepared import PreparedTrace, load_prepared_trace
 
 @dataclass(frozen=True)
 class _TileKey:
@@ -43,16 +48,6 @@ def _free_port() -> int:
         s.bind(("127.0.0.1", 0))
         return int(s.getsockname()[1])
 
-def _make_scheduler(variant: str):
-    v = variant.lower()
-    if v == "qprism_full":
-        return QPrismScheduler()
-    if v == "qprism_priority_only":
-        return PriorityOnlyScheduler()
-    if v == "qprism_cancel_only":
-        return CancelOnlyScheduler()
-    return None
-
 def _load_certs(repo_root: Path) -> Tuple[Path, Path]:
     cert = repo_root / "src" / "qprism" / "certs" / "cert.pem"
     key = repo_root / "src" / "qprism" / "certs" / "key.pem"
@@ -60,14 +55,26 @@ def _load_certs(repo_root: Path) -> Tuple[Path, Path]:
         raise FileNotFoundError(f"Missing certs: {cert}, {key}")
     return cert, key
 
-async def _start_h2_server(mbtiles_path: Path) -> Tuple[web.AppRunner, str]:
+async def _start_h2_server(
+    mbtiles_path: Path, host: str = "127.0.0.1", stats: Optional[ServerStats] = None
+) -> Tuple[web.AppRunner, str]:
     backend = MbTilesBackend(mbtiles_path)
 
     async def handle(request: web.Request) -> web.Response:
         z = int(request.match_info["z"])
         x = int(request.match_info["x"])
         y = int(request.match_info["y"])
-        data = await backend.tile_data(z, x, y)
+        if stats is None:
+            data = await backend.tile_data(z, x, y)
+        else:
+            stats.active += 1
+            try:
+                data = await backend.tile_data(z, x, y)
+            finally:
+                stats.active -= 1
+            if data:
+                stats.served += 1
+                stats.bytes_sent += len(data)
         if not data:
             return web.Response(status=404, body=b"")
         headers = {
@@ -84,9 +91,9 @@ async def _start_h2_server(mbtiles_path: Path) -> Tuple[web.AppRunner, str]:
     runner = web.AppRunner(app)
     await runner.setup()
     port = _free_port()
-    site = web.TCPSite(runner, "127.0.0.1", port)
+    site = web.TCPSite(runner, host, port)
     await site.start()
-    return runner, f"http://127.0.0.1:{port}"
+    return runner, f"http://{host}:{port}"
 
 
 async def _start_h3_server(
@@ -95,11 +102,21 @@ async def _start_h3_server(
     host: str,
     port: int,
     repo_root: Path,
+    chunk_recorder: Optional[ChunkRecorder] = None,
+    qlog_dir: Optional[Path] = None,
+    server_stats: Optional[ServerStats] = None,
 ) -> asyncio.AbstractServer:
     cert, key = _load_certs(repo_root)
     quic_cfg = QuicConfiguration(is_client=False, alpn_protocols=["h3"])
     quic_cfg.load_cert_chain(str(cert), str(key))
-    protocol_factory = server_shim_init(kind, mbtiles_path=mbtiles_path)
+    if qlog_dir is not None:
+        qlog_dir.mkdir(parents=True, exist_ok=True)
+        quic_cfg.quic_logger = QuicFileLogger(str(qlog_dir))
+    protocol_factory = server_shim_init(
+        kind,
+        mbtiles_path=mbtiles_path,
+        protocol_kwargs={"chunk_recorder": chunk_recorder, "server_stats": server_stats},
+    )
     return await serve(host, port, configuration=quic_cfg, create_protocol=protocol_factory)
 
 @dataclass
@@ -107,6 +124,14 @@ class _ServerContext:
     h2_runner: Optional[web.AppRunner] = None
     h3_server: Optional[asyncio.AbstractServer] = None
     base_url: Optional[str] = None
+    chunk_recorder: Optional[ChunkRecorder] = None
+    stats: Optional[ServerStats] = None
+
+def _open_sink(base: BaseConfig) -> BufferedDuckDBLogger:
+    if base.results_store == "parquet":
+        return ParquetRunLogger(base.parquet_root)
+    base.duckdb_path.parent.mkdir(parents=True, exist_ok=True)
+    return BufferedDuckDBLogger(base.duckdb_path)
 
 async def _boot_server(
     variant: str,
@@ -114,20 +139,70 @@ async def _boot_server(
     host: str,
     port: int,
     repo_root: Path,
+    qlog_dir: Optional[Path] = None,
+    stats: Optional[ServerStats] = None,
+    record_chunks: bool = True,
 ) -> _ServerContext:
-    ctx = _ServerContext()
+    ctx = _ServerContext(stats=stats)
     v = variant.lower()
 
     if v == "http2_default":
-        ctx.h2_runner, ctx.base_url = await _start_h2_server(tiles_path)
-    elif v == "http3_default":
-        ctx.h3_server = await _start_h3_server("H3", tiles_path, host, port, repo_root)
+        ctx.h2_runner, ctx.base_url = await _start_h2_server(tiles_path, host, stats)
     else:
-        ctx.h3_server = await _start_h3_server("QPRISM", tiles_path, host, port, repo_root)
+        if record_chunks:
+            ctx.chunk_recorder = ChunkRecorder()
+        kind = "H3" if v == "http3_default" else "QPRISM"
+        ctx.h3_server = await _start_h3_server(
+            kind, tiles_path, host, port, repo_root, ctx.chunk_recorder,
+            qlog_dir / "server" if qlog_dir is not None else None,
+            stats,
+        )
 
     return ctx
 
 
+def _client_qlog_config(qlog_dir: Path, run_id: int) -> QuicConfiguration:
+    run_dir = qlog_dir / str(run_id) / "client"
+    run_dir.mkdir(parents=True, exist_ok=True)
+    cfg = build_client_config()
+    cfg.quic_logger = QuicFileLogger(str(run_dir))
+    return cfg
+
+async def _ingest_qlogs(
+    ddb: DuckDBLogger,
+    qlog_dir: Path,
+    run_id: int,
+    t0_ms: float,
+    owners: Dict[str, Tuple[int, float]],
+    timeout: float = 5.0,
+) -> None:
+    """Ingest the client qlogs of run_id and every server qlog whose client is known.
+
+    Both ends name their trace after the connection's ODCID, which ties a
+    server trace to the run that opened it. Servers write their trace only
+    after draining, so this waits up to timeout for the run's server files.
+    """
+    for path in sorted((qlog_dir / str(run_id) / "client").glob("*.qlog")):
+        ddb.log_qlog(run_id, "client", path, t0_ms)
+        owners[path.stem] = (run_id, t0_ms)
+
+    server_dir = qlog_dir / "server"
+    deadline = time.monotonic() + timeout
+    waiting = {stem for stem, (owner, _t0) in owners.items() if owner == run_id}
+    while True:
+        for path in sorted(server_dir.glob("*.qlog")):
+            owner = owners.pop(path.stem, None)
+            if owner is None:
+                continue
+            ddb.log_qlog(owner[0], "server", path, owner[1])
+            done_dir = qlog_dir / str(owner[0]) / "server"
+            done_dir.mkdir(parents=True, exist_ok=True)
+            path.replace(done_dir / path.name)
+            waiting.discard(path.stem)
+        if not waiting or time.monotonic() >= deadline:
+            return
+        await asyncio.sleep(0.05)
+
 async def _shutdown_server(ctx: _ServerContext) -> None:
     if ctx.h3_server is not None:
         ctx.h3_server.close()
@@ -143,24 +218,85 @@ async def _fetch_tile(
     base_url: Optional[str],
     host: str,
     port: int,
+    chunks: Optional[ChunkStream] = None,
+    config: Optional[QuicConfiguration] = None,
 ) -> bytes:
     tile_path = f"/tiles/{tk.z}/{tk.x}/{tk.y}.pbf"
 
     if variant == "http2_default":
         assert base_url is not None
-        return await fetch_tile_h2(base_url, tile_path)
+        return await fetch_tile_h2(base_url, tile_path, chunks=chunks)
     elif variant == "http3_default":
-        return await fetch_tile_h3(host, port, tile_path)
+        return await fetch_tile_h3(host, port, tile_path, config=config, chunks=chunks)
     else:
         eps = eps_from_ring(tr.ring)
         return await fetch_tile_qprism(
-            host, port, tile_path, urgency=eps.urgency, incremental=eps.incremental
+            host, port, tile_path, urgency=eps.urgency, incremental=eps.incremental, config=config, chunks=chunks
         )
 
 
+class _FramePacer:
+    """Releases frames at their trace time on the monotonic clock.
+
+    Trace time t_ms is due at t0 + (t_ms - t_first_ms) / speed, and the run
+    clock now_ms() maps elapsed time back onto the trace's timescale, so
+    request, completion and deadline times all compare with frame t_ms at
+    any speed. Speed 0 releases each frame as soon as the loop gets to it,
+    the old burst replay, and its clock runs unscaled from t_first_ms.
+    """
+    def __init__(self, t0_ns: int, t_first_ms: float, speed: float) -> None:
+        self.t0_ns = t0_ns
+        self.t_first_ms = t_first_ms
+        self.speed = speed
+
+    def now_ms(self) -> int:
+        elapsed_ms = (time.monotonic_ns() - self.t0_ns) / 1e6
+        return int(self.t_first_ms + (elapsed_ms * self.speed if self.speed > 0 else elapsed_ms))
+
+    async def wait(self, t_ms: float) -> Tuple[Optional[int], int]:
+        """Sleep until t_ms is due, returning (lateness_us, loop_lag_us).
+
+        Lateness is how long after its due time the frame was released; the
+        loop lag is the part of it spent waiting for the event loop past the
+        sleep's own deadline, the rest being overrun of earlier frames.
+        """
+        before = time.monotonic_ns()
+        if self.speed <= 0:
+            # Still yields so fetch callbacks run between frames
+            await asyncio.sleep(0)
+            return None, (time.monotonic_ns() - before) // 1000
+        due = self.t0_ns + int((t_ms - self.t_first_ms) * 1e6 / self.speed)
+        await asyncio.sleep(max(0, due - before) / 1e9)
+        woke = time.monotonic_ns()
+        return (woke - due) // 1000, (woke - max(due, before)) // 1000
+
+class _LiveTransport:
+    """The live run's TileTransport, one fetch task per requested tile."""
+    def __init__(
+        self,
+        pacer: _FramePacer,
+        fetch: Callable[[_TileKey, TileRequest], Awaitable[None]],
+        in_flight: Dict[_TileKey, asyncio.Task],
+    ) -> None:
+        self.pacer = pacer
+        self.fetch = fetch
+        self.in_flight = in_flight
+
+    def now_ms(self) -> int:
+        return self.pacer.now_ms()
+
+    def request(self, tile: Tile, tr: TileRequest) -> None:
+        tk = _TileKey(tile.z, tile.x, tile.y)
+        self.in_flight[tk] = asyncio.create_task(self.fetch(tk, tr))
+
+    def cancel(self, tile: Tile) -> None:
+        task = self.in_flight.get(_TileKey(tile.z, tile.x, tile.y))
+        if task and not task.done():
+            task.cancel()
+
 async def _run_single_trace(
-    trace: List[TracePoint],
-    scheduler,
+    prepared: PreparedTrace,
+    scheduler: Scheduler,
     variant: str,
     base_url: Optional[str],
     host: str,
@@ -168,16 +304,33 @@ async def _run_single_trace(
     run_id: int,
     ddb: DuckDBLogger,
     rng: random.Random,
+    tracker: LiveCompleteness,
+    sketches: RingSketches,
+    server_chunks: Optional[ChunkRecorder] = None,
+    client_config: Optional[QuicConfiguration] = None,
+    replay_speed: float = 1.0,
 ) -> List[TileCompletion]:
-    t0 = time.monotonic()
-    requested: Set[_TileKey] = set()
+    t0_ns = time.monotonic_ns()
+    pacer = _FramePacer(t0_ns, prepared.trace[0].t_ms, replay_speed)
+    requested: Set[TileKey] = set()
     in_flight: Dict[_TileKey, asyncio.Task] = {}
     completions: List[TileCompletion] = []
+    client_chunks = ChunkRecorder()
+    if server_chunks is not None:
+        # Late events of the previous run's streams
+        server_chunks.drain()
+
+    def _drain_chunks(force: bool = False) -> None:
+        for side, recorder in (("client", client_chunks), ("server", server_chunks)):
+            if recorder is not None and (force or recorder.pending >= recorder.capacity // 2):
+                ddb.log_tile_chunks(run_id, side, recorder.drain(t0_ns))
 
     async def _fetch_and_record(tk: _TileKey, tr: TileRequest) -> None:
+        tc: Optional[TileCompletion] = None
+        chunks = client_chunks.open(tk.tile_id(), tk.z)
         try:
-            body = await _fetch_tile(tk, tr, variant, base_url, host, port)
-            completed_at_ms = int((time.monotonic() - t0) * 1000)
+            body = await _fetch_tile(tk, tr, variant, base_url, host, port, chunks, client_config)
+            completed_at_ms = pacer.now_ms()
             tc = TileCompletion(
                 tile_id=tk.tile_id(),
                 zoom=tk.z,
@@ -189,9 +342,12 @@ async def _run_single_trace(
             )
             completions.append(tc)
             ddb.log_tile_completed(run_id, tc)
+            tracker.record(tc)
+            sketches.add(int(tr.ring), completed_at_ms - tr.requested_at_ms)
 
         except asyncio.CancelledError:
-            completed_at_ms = int((time.monotonic() - t0) * 1000)
+            chunks.reset()
+            completed_at_ms = pacer.now_ms()
             tc = TileCompletion(
                 tile_id=tk.tile_id(),
                 zoom=tk.z,
@@ -206,43 +362,23 @@ async def _run_single_trace(
             raise
         finally:
             in_flight.pop(tk, None)
-
-    for tp in trace:
-        visible_xy = model.visible_tile_coords(tp.lat, tp.lon, tp.zoom)
-        if not visible_xy:
-            continue
-
-        viewport = viewport_from_visible(visible_xy, tp.zoom)
-        visible_tiles = [Tile(x, y, tp.zoom) for (x, y) in visible_xy]
-        rng.shuffle(visible_tiles)
-
-        if scheduler is None:
-            to_cancel = []
-            to_load = [t for t in visible_tiles if _TileKey(t.z, t.x, t.y) not in requested]
-        else:
-            to_load, to_cancel = scheduler.schedule(viewport, visible_tiles)
-
-        for t in to_cancel:
-            tk = _TileKey(t.z, t.x, t.y)
-            task = in_flight.get(tk)
-            if task and not task.done():
-                task.cancel()
-
-        for t in to_load:
-            tk = _TileKey(t.z, t.x, t.y)
-            if tk in requested:
-                continue
-            requested.add(tk)
-
-            ring = ring_enum(t, viewport)
-            tr = TileRequest(tile_id=tk.tile_id(), zoom=tk.z, ring=ring, requested_at_ms=int(tp.t_ms))
-            ddb.log_tile_requested(run_id, tr)
-            in_flight[tk] = asyncio.create_task(_fetch_and_record(tk, tr))
-
-        await asyncio.sleep(0)
+            # Failed fetches report None so the scheduler frees the slot
+            scheduler.on_tile_completed(Tile(tk.x, tk.y, tk.z), tc)
+
+    transport = _LiveTransport(pacer, _fetch_and_record, in_flight)
+    scheduler.attach_completeness(tracker)
+    for frame_idx, tp in enumerate(prepared.points()):
+        lateness_us, loop_lag_us = await pacer.wait(tp.t_ms)
+        # Unpaced frames keep their trace time, they are all shown within the first milliseconds
+        tracker.advance(frame_idx, pacer.now_ms() if replay_speed > 0 else None)
+        schedule_frame(
+            frame_idx, tp, prepared, scheduler, transport, requested, rng, ddb, run_id, lateness_us, loop_lag_us,
+        )
+        _drain_chunks()
 
     if in_flight:
         await asyncio.wait(list(in_flight.values()), timeout=60.0)
+    _drain_chunks(force=True)
 
     return completions
 
@@ -258,6 +394,7 @@ async def run_experiment(
     mbtiles_path: Optional[Path] = None,
     apply_netem: bool = True,
     dry_netem: bool = False,
+    server_netns: Optional[str] = None,
 ) -> None:
     profiles = netem_profiles.load_profiles()
     if exp.netem_profile not in profiles:
@@ -271,24 +408,47 @@ async def run_experiment(
     if apply_netem:
         netem_controller.apply_profile(profile, interface=interface, dry_run=dry_netem)
 
-    base.duckdb_path.parent.mkdir(parents=True, exist_ok=True)
+    # qlog only exists for the QUIC variants
+    qlog_dir = None
+    if exp.qlog and exp.scheduler_variant.lower() != "http2_default":
+        qlog_dir = base.experiment_root / "qlog" / exp.name
+    qlog_owners: Dict[str, Tuple[int, float]] = {}
 
-    ctx = await _boot_server(exp.scheduler_variant, tiles_path, host, port, repo_root)
+    if server_netns is not None:
+        # The server listens inside the namespace, the client stays outside
+        with netns.entered(server_netns):
+            ctx = await _boot_server(exp.scheduler_variant, tiles_path, host, port, repo_root, qlog_dir)
+    else:
+        ctx = await _boot_server(exp.scheduler_variant, tiles_path, host, port, repo_root, qlog_dir)
 
     try:
-        trace = load_trace(str(exp.trace_path))
-        if not trace:
+        # Shared by every run of this trace: visible sets, viewports and deltas
+        prepared = load_prepared_trace(exp.trace_path, exp.viewport, save=base.cache_prepared_traces)
+        if not len(prepared):
             raise ValueError(f"Trace is empty: {exp.trace_path}")
 
-        scheduler = _make_scheduler(exp.scheduler_variant)
-
-        with DuckDBLogger(base.duckdb_path) as ddb:
+        # Buffered so inserts and commits never run on the event loop mid-fetch
+        with _open_sink(base) as ddb:
             for run_idx in range(exp.runs):
                 run_id = ddb.log_run(exp, run_idx=run_idx)
                 rng = random.Random(exp.seed_base + run_idx)
+                # Fresh scheduler per run so in-flight and estimator state don't leak
+                scheduler = make_scheduler(
+                    exp.scheduler_variant, exp.scheduler_params, factory=exp.scheduler_factory
+                )
 
-                completions = await _run_single_trace(
-                    trace,
+                # Viewport samples are streamed to the sink as the run progresses
+                tracker = LiveCompleteness(
+                    prepared,
+                    parent_weight=base.parent_coverage_weight,
+                    on_sample=lambda ts_ms, frac, run_id=run_id: ddb.log_viewport_sample(run_id, ts_ms, frac),
+                    sample_hz=base.viewport_sample_hz,
+                )
+                sketches = RingSketches()
+                client_config = _client_qlog_config(qlog_dir, run_id) if qlog_dir is not None else None
+                t0_wall_ms = time.time() * 1000.0
+                await _run_single_trace(
+                    prepared,
                     scheduler,
                     exp.scheduler_variant.lower(),
                     ctx.base_url,
@@ -297,11 +457,18 @@ async def run_experiment(
                     run_id,
                     ddb,
                     rng,
+                    tracker,
+                    sketches,
+                    ctx.chunk_recorder,
+                    client_config,
+                    exp.replay_speed,
                 )
-
-                comp_series = compute_completeness(trace, completions)
-                for ts_ms, frac in comp_series:
-                    ddb.log_viewport_sample(run_id, int(ts_ms), float(frac))
+                tracker.finish()
+                for ring, sketch in sketches.by_ring.items():
+                    ddb.log_latency_sketch(run_id, ring, sketch)
+                if qlog_dir is not None:
+                    await _ingest_qlogs(ddb, qlog_dir, run_id, t0_wall_ms, qlog_owners)
+                ddb.finish_run(run_id)
 
     finally:
         await _shutdown_server(ctx)
@@ -0,0 +1,85 @@
+import math
+import random
+import time
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from qprism.experiments.replay import ring_inversions
+from qprism.scheduler.registry import available_schedulers, make_scheduler
+from qprism.scheduler.rings import Viewport, ring_enum
+from qprism.types import Tile
+
+DEFAULT_SIZES = (10, 100, 1_000, 10_000)
+
+def synthetic_viewport(n_tiles: int, zoom: int = 16, seed: int = 0) -> Tuple[Viewport, List[Tile]]:
+    """A square viewport plus its R1-R3 rings, shuffled and cut to n_tiles tiles."""
+    # Smallest square viewport whose three rings hold at least n_tiles tiles
+    side = max(1, math.isqrt(max(0, n_tiles - 1)) + 1 - 6)
+    origin = 1 << (zoom - 1)
+    viewport: Viewport = (origin, origin + side - 1, origin, origin + side - 1, zoom)
+    tiles = [
+        Tile(x, y, zoom)
+        for x in range(origin - 3, origin + side + 3)
+        for y in range(origin - 3, origin + side + 3)
+    ]
+    rng = random.Random(seed)
+    rng.shuffle(tiles)
+    return viewport, tiles[:n_tiles]
+
+def bench_policy(name: str, n_tiles: int, repeats: int = 5, seed: int = 0) -> Dict[str, Any]:
+    """Time a fresh scheduler's first schedule() call and a steady-state second call."""
+    viewport, tiles = synthetic_viewport(n_tiles, seed=seed)
+    cold: List[int] = []
+    warm: List[int] = []
+    quality = 1.0
+    for _ in range(repeats):
+        scheduler = make_scheduler(name)
+        start = time.perf_counter_ns()
+        to_load, _to_cancel = scheduler.schedule(viewport, tiles)
+        cold.append(time.perf_counter_ns() - start)
+        start = time.perf_counter_ns()
+        scheduler.schedule(viewport, tiles)
+        warm.append(time.perf_counter_ns() - start)
+
+        rings = [int(ring_enum(t, viewport)) for t in to_load]
+        pairs = len(rings) * (len(rings) - 1) // 2
+        quality = 1.0 if not pairs else 1.0 - ring_inversions(rings) / pairs
+    cold.sort()
+    warm.sort()
+    return {
+        "policy": name,
+        "tiles": n_tiles,
+        "ns_per_schedule": cold[len(cold) // 2],
+        "ns_per_tile": cold[len(cold) // 2] / n_tiles,
+        "ns_steady_state": warm[len(warm) // 2],
+        "ordering_quality": quality,
+    }
+
+def run_benchmarks(
+    sizes: Iterable[int] = DEFAULT_SIZES,
+    policies: Optional[Sequence[str]] = None,
+    repeats: int = 5,
+) -> List[Dict[str, Any]]:
+    names = list(policies) if policies is not None else available_schedulers()
+    return [bench_policy(name, n, repeats=repeats) for name in names for n in sizes]
+
+def compare_to_baseline(
+    rows: Sequence[Dict[str, Any]],
+    baseline: Sequence[Dict[str, Any]],
+    tolerance: float = 0.25,
+) -> List[Dict[str, Any]]:
+    """Rows slower than the baseline by more than `tolerance` or with worse ordering."""
+    base = {(r["policy"], r["tiles"]): r for r in baseline}
+    regressions = []
+    for row in rows:
+        ref = base.get((row["policy"], row["tiles"]))
+        if ref is None:
+            continue
+        slower = row["ns_per_schedule"] > ref["ns_per_schedule"] * (1.0 + tolerance)
+        worse = row["ordering_quality"] < ref["ordering_quality"] - 1e-9
+        if slower or worse:
+            regressions.append({
+                **row,
+                "baseline_ns_per_schedule": ref["ns_per_schedule"],
+                "baseline_ordering_quality": ref["ordering_quality"],
+            })
+    return regressions
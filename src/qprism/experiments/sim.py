@@ -0,0 +1,370 @@
+import heapq
+import math
+import random
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from qprism.config import BaseConfig, ExperimentConfig
+from qprism.eps import EpsPriority, eps_from_ring
+from qprism.experiments.frame_step import TileKey, schedule_frame
+from qprism.logging_sink.duckdb_logger import DuckDBLogger
+from qprism.metrics import time_to_first_viewport, viewport_stall_seconds
+from qprism.netem import profiles as netem_profiles
+from qprism.netem.profiles import NetemProfile
+from qprism.scheduler.base import Scheduler
+from qprism.scheduler.registry import make_scheduler
+from qprism.sketch import ALL_RINGS, RingSketches
+from qprism.types import Tile, TileCompletion, TileRequest
+from qprism.viewport.completeness import LiveCompleteness
+from qprism.viewport.prepared import PreparedTrace, load_prepared_trace
+
+MSS_BYTES = 1200
+# RFC 9002 default, added to every probe timeout
+MAX_ACK_DELAY_MS = 25.0
+# Priority of every stream of the variants that send none
+_SHARED = EpsPriority(urgency=3, incremental=True)
+
+_ARRIVE, _RESET, _DELIVER = 0, 1, 2
+
+@dataclass(slots=True)
+class SimConfig:
+    tile_bytes: int = 20_000
+    # Round trips before each request, the clients open a connection per tile
+    setup_rtts: int = 1
+    # Overrides the profile's rate_kbit, 0 leaves the link unlimited
+    rate_kbit: Optional[int] = None
+    # How long in-flight tiles may still complete after the last frame, like the runner's wait
+    drain_ms: int = 60_000
+
+@dataclass(slots=True)
+class _Stream:
+    token: int
+    key: TileKey
+    urgency: int
+    incremental: bool
+    size: int
+    # Bytes on the wire including retransmissions, and those not sent yet
+    wire: int
+    remaining: float
+    recovery_ms: float
+
+class SimLink:
+    """A NetemProfile's link on a virtual clock, with EPS stream scheduling at the server.
+
+    Each direction is delayed by rtt_ms plus normal jitter, as netem does on
+    lo. Lost packets are resent over the bottleneck and delay delivery by one
+    round trip, or by a probe timeout when the tail of the response is lost.
+    The bandwidth goes to the lowest urgency with streams open: its
+    non-incremental streams one at a time in request order, otherwise shared
+    equally by its incremental ones (RFC 9218). A reset reaches the server
+    one way later and frees the rest of the stream's bandwidth.
+    """
+    def __init__(self, profile: NetemProfile, rng: random.Random, rate_kbit: Optional[int] = None, setup_rtts: int = 1) -> None:
+        self.profile = profile
+        self.rng = rng
+        self.setup_rtts = setup_rtts
+        rate = profile.rate_kbit if rate_kbit is None else rate_kbit
+        self.bytes_per_ms: Optional[float] = rate / 8.0 if rate > 0 else None
+        self.rtt_ms = 2.0 * profile.rtt_ms
+        self.pto_ms = self.rtt_ms + 4.0 * profile.jitter_ms + MAX_ACK_DELAY_MS
+        self.now = 0.0
+        self.delivered_bytes = 0
+        self.wasted_bytes = 0
+        self.lost_packets = 0
+        self._events: List[Tuple[float, int, int, object]] = []
+        self._seq = 0
+        self._live: Dict[TileKey, int] = {}
+        self._active: Dict[int, _Stream] = {}
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._live)
+
+    def _one_way(self) -> float:
+        if self.profile.jitter_ms <= 0:
+            return float(self.profile.rtt_ms)
+        return max(0.0, self.rng.gauss(self.profile.rtt_ms, self.profile.jitter_ms))
+
+    def _lost(self) -> bool:
+        return self.profile.loss > 0 and self.rng.random() < self.profile.loss
+
+    def _push(self, at_ms: float, kind: int, payload: object) -> None:
+        self._seq += 1
+        heapq.heappush(self._events, (at_ms, self._seq, kind, payload))
+
+    def request(self, key: TileKey, at_ms: float, size: int, priority: Optional[EpsPriority] = None) -> None:
+        priority = priority or _SHARED
+        self._seq += 1
+        token = self._seq
+        self._live[key] = token
+        arrive = at_ms + sum(self._one_way() + self._one_way() for _ in range(self.setup_rtts)) + self._one_way()
+        if self._lost():
+            arrive += self.pto_ms
+        packets = max(1, math.ceil(size / MSS_BYTES))
+        lost = sum(1 for _ in range(packets) if self._lost())
+        recovery_ms = 0.0
+        if lost:
+            self.lost_packets += lost
+            recovery_ms = self.pto_ms if self.rng.random() < lost / packets else self.rtt_ms
+        wire = size + lost * MSS_BYTES
+        stream = _Stream(token, key, priority.urgency, priority.incremental, size, wire, float(wire), recovery_ms)
+        self._push(arrive, _ARRIVE, stream)
+
+    def cancel(self, key: TileKey, at_ms: float) -> bool:
+        token = self._live.pop(key, None)
+        if token is None:
+            return False
+        self._push(at_ms + self._one_way(), _RESET, token)
+        return True
+
+    def _served(self) -> Tuple[List[_Stream], float]:
+        if not self._active or self.bytes_per_ms is None:
+            return [], 0.0
+        top = min(s.urgency for s in self._active.values())
+        group = [s for s in self._active.values() if s.urgency == top]
+        sequential = [s for s in group if not s.incremental]
+        served = [min(sequential, key=lambda s: s.token)] if sequential else group
+        return served, self.bytes_per_ms / len(served)
+
+    def _finish(self, stream: _Stream) -> None:
+        del self._active[stream.token]
+        self._push(self.now + self._one_way() + stream.recovery_ms, _DELIVER, stream)
+
+    def _handle(self, kind: int, payload: object, on_delivered: Callable[[TileKey, float, int], None]) -> None:
+        if kind == _ARRIVE:
+            stream = payload
+            if self._live.get(stream.key) != stream.token:
+                return
+            self._active[stream.token] = stream
+            if self.bytes_per_ms is None:
+                self._finish(stream)
+        elif kind == _RESET:
+            stream = self._active.pop(payload, None)
+            if stream is not None:
+                self.wasted_bytes += int(stream.wire - stream.remaining)
+        else:
+            stream = payload
+            if self._live.get(stream.key) != stream.token:
+                self.wasted_bytes += stream.wire
+                return
+            del self._live[stream.key]
+            self.delivered_bytes += stream.size
+            on_delivered(stream.key, self.now, stream.size)
+
+    def advance(self, until_ms: float, on_delivered: Callable[[TileKey, float, int], None]) -> None:
+        """Run the link up to until_ms, reporting each response the client receives."""
+        while True:
+            served, share = self._served()
+            t_finish = math.inf
+            if served:
+                t_finish = self.now + min(s.remaining for s in served) / share
+            t_event = self._events[0][0] if self._events else math.inf
+            t_next = min(t_finish, t_event)
+            if t_next > until_ms:
+                t_next = until_ms
+            for s in served:
+                s.remaining -= share * (t_next - self.now)
+            self.now = max(self.now, t_next)
+            if t_next >= until_ms and t_event > until_ms and t_finish > until_ms:
+                return
+            if t_event <= t_finish:
+                _at, _seq, kind, payload = heapq.heappop(self._events)
+                self._handle(kind, payload, on_delivered)
+            else:
+                # Rounding can leave a few bytes on the stream that set t_finish
+                done = [s for s in served if s.remaining <= 1e-6] or [min(served, key=lambda s: s.remaining)]
+                for s in done:
+                    self._finish(s)
+
+@dataclass(slots=True)
+class SimResult:
+    frames: int = 0
+    requested: int = 0
+    cancelled: int = 0
+    delivered_bytes: int = 0
+    wasted_bytes: int = 0
+    lost_packets: int = 0
+    end_ms: int = 0
+    completions: List[TileCompletion] = field(default_factory=list)
+
+def _priority(variant: str, ring) -> Optional[EpsPriority]:
+    # Same split as the runner's _fetch_tile: only the Q-PRISM variants send priorities
+    if variant in ("http2_default", "http3_default"):
+        return None
+    return eps_from_ring(ring)
+
+class _SimTransport:
+    """A SimLink as the frame step's TileTransport, on the link's virtual clock."""
+    def __init__(
+        self, link: SimLink, variant: str, tile_bytes: int, on_cancelled: Callable[[TileKey, float], None]
+    ) -> None:
+        self.link = link
+        self.variant = variant
+        self.tile_bytes = tile_bytes
+        self.on_cancelled = on_cancelled
+        self.requests: Dict[TileKey, TileRequest] = {}
+        self.cancelled = 0
+
+    def now_ms(self) -> int:
+        return int(self.link.now)
+
+    def request(self, tile: Tile, tr: TileRequest) -> None:
+        key = (tile.z, tile.x, tile.y)
+        self.requests[key] = tr
+        self.link.request(key, self.link.now, self.tile_bytes, _priority(self.variant, tr.ring))
+
+    def cancel(self, tile: Tile) -> None:
+        key = (tile.z, tile.x, tile.y)
+        if self.link.cancel(key, self.link.now):
+            self.cancelled += 1
+            self.on_cancelled(key, self.link.now)
+
+def simulate_trace(
+    prepared: PreparedTrace,
+    scheduler: Scheduler,
+    variant: str,
+    link: SimLink,
+    rng: random.Random,
+    tracker: LiveCompleteness,
+    sketches: RingSketches,
+    ddb: Optional[DuckDBLogger] = None,
+    run_id: int = 0,
+    sim: Optional[SimConfig] = None,
+) -> SimResult:
+    """The runner's frame step over a SimLink, so time only moves with the trace.
+
+    Responses the link delivers before a frame's timestamp are reported to
+    the tracker and scheduler before that frame is scheduled, as they would
+    be by the fetch callbacks of a live run.
+    """
+    sim = sim or SimConfig()
+    result = SimResult()
+    requested: Set[TileKey] = set()
+
+    def _complete(key: TileKey, at_ms: float, nbytes: int, cancelled: bool) -> None:
+        z, x, y = key
+        tr = transport.requests[key]
+        tc = TileCompletion(
+            tile_id=tr.tile_id,
+            zoom=z,
+            ring=tr.ring,
+            requested_at_ms=tr.requested_at_ms,
+            completed_at_ms=int(math.ceil(at_ms)),
+            cancelled=cancelled,
+            bytes_transferred=nbytes,
+        )
+        result.completions.append(tc)
+        if ddb is not None:
+            ddb.log_tile_completed(run_id, tc)
+        if not cancelled:
+            tracker.record(tc)
+            sketches.add(int(tr.ring), tc.completed_at_ms - tr.requested_at_ms)
+        scheduler.on_tile_completed(Tile(x, y, z), tc)
+
+    def _delivered(key: TileKey, at_ms: float, nbytes: int) -> None:
+        _complete(key, at_ms, nbytes, cancelled=False)
+
+    def _cancelled(key: TileKey, at_ms: float) -> None:
+        _complete(key, at_ms, 0, cancelled=True)
+
+    transport = _SimTransport(link, variant, sim.tile_bytes, _cancelled)
+    scheduler.attach_completeness(tracker)
+    last_ms = 0
+    for frame_idx, tp in enumerate(prepared.points()):
+        link.advance(tp.t_ms, _delivered)
+        tracker.advance(frame_idx)
+        # The virtual clock has no frame lateness or loop lag to log
+        if schedule_frame(frame_idx, tp, prepared, scheduler, transport, requested, rng, ddb, run_id) is not None:
+            result.frames += 1
+        last_ms = tp.t_ms
+
+    link.advance(last_ms + sim.drain_ms, _delivered)
+    result.requested = len(transport.requests)
+    result.cancelled = transport.cancelled
+    result.end_ms = int(link.now)
+    result.delivered_bytes = link.delivered_bytes
+    result.wasted_bytes = link.wasted_bytes
+    result.lost_packets = link.lost_packets
+    return result
+
+@dataclass(slots=True)
+class SimRunSummary:
+    run_id: Optional[int]
+    seed: int
+    ttfv_ms: Optional[int]
+    stall_ms: int
+    requested: int
+    cancelled: int
+    completed: int
+    wasted_bytes: int
+    latency_p50_ms: Optional[float]
+    latency_p99_ms: Optional[float]
+
+def simulate_experiment(
+    *,
+    base: BaseConfig,
+    exp: ExperimentConfig,
+    sim: Optional[SimConfig] = None,
+    ddb: Optional[DuckDBLogger] = None,
+    profile: Optional[NetemProfile] = None,
+    prepared: Optional[PreparedTrace] = None,
+) -> List[SimRunSummary]:
+    """Every run of exp on the simulated transport, seeded like run_experiment.
+
+    With a sink the runs are logged with mode 'sim' into the same tables as
+    live runs, so analysis and exports treat them alike.
+    """
+    sim = sim or SimConfig()
+    if profile is None:
+        profiles = netem_profiles.load_profiles()
+        if exp.netem_profile not in profiles:
+            raise KeyError(f"Unknown netem profile: {exp.netem_profile}")
+        profile = profiles[exp.netem_profile]
+    if prepared is None:
+        prepared = load_prepared_trace(exp.trace_path, exp.viewport, save=base.cache_prepared_traces)
+    if not len(prepared):
+        raise ValueError(f"Trace is empty: {exp.trace_path}")
+
+    summaries = []
+    for run_idx in range(exp.runs):
+        seed = exp.seed_base + run_idx
+        run_id = ddb.log_run(exp, run_idx=run_idx, mode="sim") if ddb is not None else None
+        rng = random.Random(seed)
+        # The link draws from its own stream so scheduler shuffles don't move its losses
+        link = SimLink(profile, random.Random(f"link-{seed}"), rate_kbit=sim.rate_kbit, setup_rtts=sim.setup_rtts)
+        scheduler = make_scheduler(exp.scheduler_variant, exp.scheduler_params, factory=exp.scheduler_factory)
+        samples: List[Tuple[int, float]] = []
+
+        def _on_sample(ts_ms: int, frac: float, run_id=run_id) -> None:
+            samples.append((ts_ms, frac))
+            if ddb is not None:
+                ddb.log_viewport_sample(run_id, ts_ms, frac)
+
+        tracker = LiveCompleteness(
+            prepared, parent_weight=base.parent_coverage_weight, on_sample=_on_sample, sample_hz=base.viewport_sample_hz,
+        )
+        sketches = RingSketches()
+        result = simulate_trace(
+            prepared, scheduler, exp.scheduler_variant.lower(), link, rng, tracker, sketches, ddb, run_id or 0, sim,
+        )
+        tracker.finish()
+        if ddb is not None:
+            for ring, sketch in sketches.by_ring.items():
+                ddb.log_latency_sketch(run_id, ring, sketch)
+            ddb.finish_run(run_id)
+
+        overall = sketches.by_ring[ALL_RINGS]
+        threshold = base.viewport_complete_threshold
+        summaries.append(SimRunSummary(
+            run_id=run_id,
+            seed=seed,
+            ttfv_ms=time_to_first_viewport(samples, threshold),
+            stall_ms=viewport_stall_seconds(samples, threshold),
+            requested=result.requested,
+            cancelled=result.cancelled,
+            completed=overall.count,
+            wasted_bytes=result.wasted_bytes,
+            latency_p50_ms=overall.quantile(0.50),
+            latency_p99_ms=overall.quantile(0.99),
+        ))
+    return summaries
@@ -1,8 +1,113 @@
+import threading
+import time
+from array import array
 from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
 import duckdb
+import numpy as np
+import pandas as pd
 
 from qprism.config import ExperimentConfig
-from qprism.types import TileRequest, TileCompletion
+from qprism.logging_sink.qlog import qlog_rows
+from qprism.sketch import DDSketch
+from qprism.transport.chunk_recorder import ChunkColumns
+from qprism.types import SchedulerFrame, TileRequest, TileCompletion
+
+# Per-event tables and their column types, shared by the immediate and buffered loggers.
+# i8? and f8? mark nullable columns.
+_EVENT_COLUMNS: Dict[str, Tuple[Tuple[str, str], ...]] = {
+    "tile_requests": (
+        ("run_id", "i8"), ("tile_id", "str"), ("zoom", "i8"), ("ring", "i8"),
+        ("requested_at", "i8"), ("deadline_at", "i8?"),
+    ),
+    "tile_completions": (
+        ("run_id", "i8"), ("tile_id", "str"), ("zoom", "i8"), ("ring", "i8"),
+        ("requested_at", "i8"), ("completed_at", "i8"), ("cancelled", "bool"), ("bytes_transferred", "i8?"),
+    ),
+    "scheduler_frames": (
+        ("run_id", "i8"), ("frame_idx", "i8"), ("t_ms", "i8"), ("candidates", "i8"),
+        ("loaded", "i8"), ("cancelled", "i8"), ("cpu_ns", "i8"), ("wall_ns", "i8"),
+        ("lateness_us", "i8?"), ("loop_lag_us", "i8?"),
+    ),
+    "viewport_samples": (("run_id", "i8"), ("ts_ms", "i8"), ("completeness", "f8")),
+    "tile_chunks": (
+        ("run_id", "i8"), ("side", "str"), ("tile_id", "str"), ("zoom", "i8"), ("stream_id", "i8"),
+        ("kind", "str"), ("t_us", "i8"), ("bytes", "i8"),
+    ),
+    "qlog_metrics": (
+        ("run_id", "i8"), ("side", "str"), ("odcid", "str"), ("t_ms", "f8"),
+        ("latest_rtt_ms", "f8?"), ("min_rtt_ms", "f8?"), ("smoothed_rtt_ms", "f8?"), ("rtt_variance_ms", "f8?"),
+        ("cwnd", "i8?"), ("bytes_in_flight", "i8?"), ("ssthresh", "i8?"),
+    ),
+    "qlog_loss": (
+        ("run_id", "i8"), ("side", "str"), ("odcid", "str"), ("t_ms", "f8"), ("kind", "str"),
+        ("packet_type", "str"), ("packet_number", "i8?"), ("stream_id", "i8?"), ("frame_offset", "i8?"), ("length", "i8?"),
+    ),
+}
+
+def _insert_sql(table: str) -> str:
+    names = [name for name, _kind in _EVENT_COLUMNS[table]]
+    return f"INSERT INTO {table} ({', '.join(names)}) VALUES ({', '.join('?' * len(names))})"
+
+_EVENT_INSERTS: Dict[str, str] = {table: _insert_sql(table) for table in _EVENT_COLUMNS}
+
+class _ColumnBuffer:
+    """Typed column arrays for one table; rows are appended column by column."""
+    def __init__(self, columns: Sequence[Tuple[str, str]]) -> None:
+        self.columns = columns
+        self.data: List = []
+        self.masks: Dict[int, array] = {}
+        for i, (_name, kind) in enumerate(columns):
+            if kind == "str":
+                self.data.append([])
+            elif kind in ("f8", "f8?"):
+                self.data.append(array("d"))
+            elif kind == "bool":
+                self.data.append(array("B"))
+            else:
+                self.data.append(array("q"))
+            if kind.endswith("?"):
+                self.masks[i] = array("B")
+        self.rows = 0
+
+    def append(self, row: Tuple) -> None:
+        masks = self.masks
+        for i, value in enumerate(row):
+            if i in masks:
+                masks[i].append(value is None)
+                value = 0 if value is None else value
+            self.data[i].append(value)
+        self.rows += 1
+
+    def extend_columns(self, values: Sequence[Iterable]) -> int:
+        # Bulk path for non-nullable columns, e.g. a whole completeness series
+        n = None
+        for col, vals in zip(self.data, values):
+            before = len(col)
+            col.extend(vals)
+            n = len(col) - before
+        self.rows += n or 0
+        return n or 0
+
+    def frame(self) -> pd.DataFrame:
+        out = {}
+        for i, (name, kind) in enumerate(self.columns):
+            col = self.data[i]
+            if kind == "str":
+                out[name] = pd.array(col, dtype=object)
+            elif kind == "bool":
+                out[name] = np.frombuffer(col, dtype=np.uint8).astype(bool)
+            elif kind == "f8":
+                out[name] = np.frombuffer(col, dtype=np.float64)
+            elif kind == "f8?":
+                mask = np.frombuffer(self.masks[i], dtype=np.uint8).astype(bool)
+                out[name] = pd.arrays.FloatingArray(np.frombuffer(col, dtype=np.float64), mask)
+            elif i in self.masks:
+                mask = np.frombuffer(self.masks[i], dtype=np.uint8).astype(bool)
+                out[name] = pd.arrays.IntegerArray(np.frombuffer(col, dtype=np.int64), mask)
+            else:
+                out[name] = np.frombuffer(col, dtype=np.int64)
+        return pd.DataFrame(out)
 
 class DuckDBLogger:
     def __init__(self, db_path: str | Path):
@@ -12,82 +117,280 @@ class DuckDBLogger:
             self.db_path = Path(db_path) if db_path != ':memory:' else db_path
 
         self.conn = duckdb.connect(str(self.db_path))
+        # Guards the connection, the buffered logger writes from a background thread
+        self._conn_lock = threading.RLock()
+
+        # Schema is idempotent so tables added later are created on older databases too
+        schema_file = Path(__file__).parent / "schema.sql"
+        schema_sql = schema_file.read_text()
+
+        had_runs = self._has_table("runs")
+        had_finished = self._has_table("run_finished")
+        for stmt in schema_sql.split(';'):
+            if stmt.strip():
+                self.conn.execute(stmt)
+        if had_runs and not had_finished:
+            # Databases from before run_finished only hold runs whose process already exited
+            self.conn.execute("INSERT INTO run_finished SELECT run_id, NULL FROM runs")
+        self.conn.commit()
+        # Columns added after the first schema release
+        self.conn.execute("ALTER TABLE tile_requests ADD COLUMN IF NOT EXISTS deadline_at INTEGER")
+        for column in ("lateness_us", "loop_lag_us"):
+            self.conn.execute(f"ALTER TABLE scheduler_frames ADD COLUMN IF NOT EXISTS {column} BIGINT")
+        for column, sql_type in (
+            ("viewport_width_px", "INTEGER"),
+            ("viewport_height_px", "INTEGER"),
+            ("device_pixel_ratio", "DOUBLE"),
+            ("tile_size_px", "INTEGER"),
+            # 'live' over the network or 'sim' on the simulated transport
+            ("mode", "TEXT DEFAULT 'live'"),
+        ):
+            self.conn.execute(f"ALTER TABLE runs ADD COLUMN IF NOT EXISTS {column} {sql_type}")
+        self.conn.commit()
+
+    def _has_table(self, table: str) -> bool:
+        return bool(self.conn.execute(
+            "SELECT count(*) FROM information_schema.tables WHERE table_schema = 'main' AND table_name = ?",
+            [table],
+        ).fetchone()[0])
+
+    def _emit(self, table: str, row: Tuple) -> None:
+        with self._conn_lock:
+            self.conn.execute(_EVENT_INSERTS[table], row)
+            self.conn.commit()
 
+    def _ingest(self, table: str, buffer: _ColumnBuffer) -> None:
+        # One INSERT ... SELECT over a registered DataFrame instead of binding rows
+        names = ", ".join(name for name, _kind in buffer.columns)
+        view = f"_ingest_{table}"
+        self.conn.register(view, buffer.frame())
         try:
-            # check if database initialized
-            self.conn.execute("SELECT 1 FROM runs LIMIT 1")
-        except Exception:
-            schema_file = Path(__file__).parent / "schema.sql"
-            schema_sql = schema_file.read_text()
-
-            for stmt in schema_sql.split(';'):
-                if stmt.strip():
-                    self.conn.execute(stmt)
+            self.conn.execute(f"INSERT INTO {table} ({names}) SELECT {names} FROM {view}")
+        finally:
+            self.conn.unregister(view)
+
+    def _emit_columns(self, table: str, columns: Sequence[Iterable]) -> None:
+        buffer = _ColumnBuffer(_EVENT_COLUMNS[table])
+        if not buffer.extend_columns(columns):
+            return
+        with self._conn_lock:
+            self._ingest(table, buffer)
             self.conn.commit()
 
-    def log_run(self, experiment: ExperimentConfig, run_idx: int = 0) -> int:
+    def log_run(self, experiment: ExperimentConfig, run_idx: int = 0, mode: str = "live") -> int:
         actual_seed = experiment.seed_base + run_idx
-        result = self.conn.execute(
-            "INSERT INTO runs (experiment_name, scheduler_variant, netem_profile, trace, seed, notes) "
-            "VALUES (?, ?, ?, ?, ?, ?) RETURNING run_id",
-            (
-                experiment.name,
-                experiment.scheduler_variant,
-                experiment.netem_profile,
-                str(experiment.trace_path),
-                actual_seed,
-                experiment.notes
-            )
-        ).fetchone()
-        run_id = result[0]
-        self.conn.commit()
+        geometry = experiment.viewport
+        with self._conn_lock:
+            result = self.conn.execute(
+                "INSERT INTO runs (experiment_name, scheduler_variant, netem_profile, trace, seed, notes, "
+                "viewport_width_px, viewport_height_px, device_pixel_ratio, tile_size_px, mode) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?) RETURNING run_id",
+                (
+                    experiment.name,
+                    experiment.scheduler_variant,
+                    experiment.netem_profile,
+                    str(experiment.trace_path),
+                    actual_seed,
+                    experiment.notes,
+                    geometry.width_px,
+                    geometry.height_px,
+                    geometry.device_pixel_ratio,
+                    geometry.tile_size_px,
+                    mode,
+                )
+            ).fetchone()
+            run_id = result[0]
+            self.conn.commit()
         return run_id
 
     def log_tile_requested(self, run_id: int, tile_req: TileRequest) -> None:
-        self.conn.execute(
-            "INSERT INTO tile_requests (run_id, tile_id, zoom, ring, requested_at)"
-            "VALUES (?, ?, ?, ?, ?)",
-            (
-                run_id,
-                tile_req.tile_id,
-                tile_req.zoom,
-                int(tile_req.ring),
-                tile_req.requested_at_ms
-            )
-        )
-        self.conn.commit()
+        self._emit("tile_requests", (
+            run_id,
+            tile_req.tile_id,
+            tile_req.zoom,
+            int(tile_req.ring),
+            tile_req.requested_at_ms,
+            tile_req.deadline_ms
+        ))
 
     def log_tile_completed(self, run_id: int, tile_comp: TileCompletion) -> None:
-        self.conn.execute(
-            "INSERT INTO tile_completions "
-            "(run_id, tile_id, zoom, ring, requested_at, completed_at, cancelled, bytes_transferred) "
-            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
-            (
-                run_id,
-                tile_comp.tile_id,
-                tile_comp.zoom,
-                int(tile_comp.ring),
-                tile_comp.requested_at_ms,
-                tile_comp.completed_at_ms,
-                tile_comp.cancelled,
-                tile_comp.bytes_transferred
-            )
-        )
-        self.conn.commit()
+        self._emit("tile_completions", (
+            run_id,
+            tile_comp.tile_id,
+            tile_comp.zoom,
+            int(tile_comp.ring),
+            tile_comp.requested_at_ms,
+            tile_comp.completed_at_ms,
+            tile_comp.cancelled,
+            tile_comp.bytes_transferred
+        ))
+
+    def log_scheduler_frame(self, run_id: int, frame: SchedulerFrame) -> None:
+        self._emit("scheduler_frames", (
+            run_id,
+            frame.frame_idx,
+            frame.t_ms,
+            frame.candidates,
+            frame.loaded,
+            frame.cancelled,
+            frame.cpu_ns,
+            frame.wall_ns,
+            frame.lateness_us,
+            frame.loop_lag_us,
+        ))
 
     def log_viewport_sample(self, run_id: int, timestamp_ms: int, completeness: float) -> None:
-        self.conn.execute(
-            "INSERT INTO viewport_samples (run_id, ts_ms, completeness) VALUES (?, ?, ?)",
-            (run_id, timestamp_ms, completeness)
-        )
-        self.conn.commit()
+        self._emit("viewport_samples", (run_id, timestamp_ms, completeness))
+
+    def log_viewport_samples(self, run_id: int, samples: Iterable[Tuple[int, float]]) -> None:
+        """Bulk insert of a whole completeness series, e.g. from compute_completeness."""
+        samples = list(samples)
+        self._emit_columns("viewport_samples", (
+            (run_id for _ in samples),
+            (int(t) for t, _ in samples),
+            (float(c) for _, c in samples),
+        ))
+
+    def log_tile_chunks(self, run_id: int, side: str, chunks: ChunkColumns) -> None:
+        """Bulk insert of drained ChunkRecorder events for one side of the connection."""
+        n = len(chunks[0])
+        self._emit_columns("tile_chunks", ([run_id] * n, [side] * n, *chunks))
+
+    def log_qlog(self, run_id: int, side: str, path: str | Path, t0_ms: float = 0.0) -> int:
+        """Stream one qlog file into qlog_metrics and qlog_loss; returns the rows queued."""
+        n = 0
+        for table, row in qlog_rows(path, t0_ms):
+            self._emit(table, (run_id, side, *row))
+            n += 1
+        return n
+
+    def log_latency_sketch(self, run_id: int, ring: int, sketch: DDSketch) -> None:
+        with self._conn_lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO latency_sketches (run_id, ring, sketch) VALUES (?, ?, ?)",
+                (run_id, ring, sketch.to_bytes())
+            )
+            self.conn.commit()
+
+    def finish_run(self, run_id: int) -> None:
+        """Write out run_id's events and mark it finished, so its metrics can be materialized."""
+        self.flush()
+        with self._conn_lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO run_finished (run_id, finished_at) VALUES (?, current_timestamp)", [run_id]
+            )
+            self.conn.commit()
+
+    def flush(self) -> None:
+        return None
 
     def close(self) -> None:
-        self.conn.commit()
-        self.conn.close()
+        with self._conn_lock:
+            self.conn.commit()
+            self.conn.close()
 
     def __exit__(self, exc_type, exc_val, exc_tb):
         self.close()
-        
+
     def __enter__(self):
         return self
+
+class BufferedDuckDBLogger(DuckDBLogger):
+    """DuckDBLogger that queues events in memory and writes them in bulk.
+
+    log_* calls only append to typed column buffers, so nothing touches the
+    database on the asyncio loop. A background thread ingests the buffers in
+    one transaction once max_batch events are queued or flush_interval_s has
+    passed; flush() writes everything synchronously, e.g. at the end of a run.
+    If a background write fails its batch is rolled back and every later
+    call raises instead of queueing events that would never be written.
+    """
+    def __init__(self, db_path: str | Path, max_batch: int = 5000, flush_interval_s: float = 0.5):
+        super().__init__(db_path)
+        self.max_batch = max_batch
+        self.flush_interval_s = flush_interval_s
+        self._pending = self._new_buffers()
+        self._queued = 0
+        self._wake = threading.Condition()
+        self._closed = False
+        self._error: Optional[BaseException] = None
+        self._writer = threading.Thread(target=self._run_writer, name="duckdb-writer", daemon=True)
+        self._writer.start()
+
+    @staticmethod
+    def _new_buffers() -> Dict[str, _ColumnBuffer]:
+        return {table: _ColumnBuffer(columns) for table, columns in _EVENT_COLUMNS.items()}
+
+    def _queued_rows(self, n: int) -> None:
+        self._queued += n
+        if self._queued >= self.max_batch:
+            self._wake.notify()
+
+    def _emit(self, table: str, row: Tuple) -> None:
+        self._raise_writer_error()
+        with self._wake:
+            self._pending[table].append(row)
+            self._queued_rows(1)
+
+    def _emit_columns(self, table: str, columns: Sequence[Iterable]) -> None:
+        self._raise_writer_error()
+        with self._wake:
+            self._queued_rows(self._pending[table].extend_columns(columns))
+
+    def _take(self) -> Dict[str, _ColumnBuffer]:
+        with self._wake:
+            batch = self._pending
+            self._pending = self._new_buffers()
+            self._queued = 0
+        return batch
+
+    def _write(self, batch: Dict[str, _ColumnBuffer]) -> None:
+        if not any(buffer.rows for buffer in batch.values()):
+            return
+        with self._conn_lock:
+            self.conn.execute("BEGIN TRANSACTION")
+            try:
+                for table, buffer in batch.items():
+                    if buffer.rows:
+                        self._ingest(table, buffer)
+                self.conn.execute("COMMIT")
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+
+    def _run_writer(self) -> None:
+        deadline = time.monotonic() + self.flush_interval_s
+        while True:
+            with self._wake:
+                while not self._closed and self._queued < self.max_batch:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._wake.wait(remaining)
+                if self._closed:
+                    return
+            deadline = time.monotonic() + self.flush_interval_s
+            try:
+                self._write(self._take())
+            except BaseException as exc:
+                # Nothing drains the buffers from here on, so every later log_*, flush() and close() raises
+                self._error = exc
+                return
+
+    def _raise_writer_error(self) -> None:
+        if self._error is not None:
+            raise RuntimeError("Background DuckDB write failed") from self._error
+
+    def flush(self) -> None:
+        self._raise_writer_error()
+        self._write(self._take())
+
+    def close(self) -> None:
+        with self._wake:
+            self._closed = True
+            self._wake.notify()
+        self._writer.join()
+        try:
+            self.flush()
+        finally:
+            super().close()
@@ -0,0 +1,145 @@
+import secrets
+from pathlib import Path
+from typing import Dict, Optional
+
+import duckdb
+
+from qprism.config import ExperimentConfig
+from qprism.logging_sink.duckdb_logger import BufferedDuckDBLogger, _ColumnBuffer
+from qprism.sketch import DDSketch
+
+# Hive partition keys, taken from the runs row of each event's run
+PARTITION_COLUMNS = ("experiment_name", "scheduler_variant", "netem_profile", "run_id")
+TABLES = (
+    "runs", "run_finished", "tile_requests", "tile_completions", "viewport_samples", "scheduler_frames", "latency_sketches",
+    "tile_chunks", "qlog_metrics", "qlog_loss",
+)
+_HIVE_TYPES = "{'experiment_name': 'VARCHAR', 'scheduler_variant': 'VARCHAR', 'netem_profile': 'VARCHAR', 'run_id': 'BIGINT'}"
+
+def _copy_options() -> str:
+    # APPEND with uuid file names: concurrent writers never touch each other's files
+    return (
+        f"FORMAT parquet, PARTITION_BY ({', '.join(PARTITION_COLUMNS)}), "
+        "APPEND, FILENAME_PATTERN 'part_{uuid}'"
+    )
+
+def table_glob(root: Path, table: str) -> str:
+    return str(Path(root) / table / "*" / "*" / "*" / "*" / "*.parquet")
+
+class ParquetRunLogger(BufferedDuckDBLogger):
+    """Results sink writing Parquet files partitioned per run instead of one DuckDB file.
+
+    Files land in <root>/<table>/experiment_name=../scheduler_variant=../
+    netem_profile=../run_id=../part_<uuid>.parquet. run_ids are random 63-bit
+    integers, so any number of processes can write to the same root without
+    a shared sequence or file lock. Read the results with open_results().
+    """
+    def __init__(self, root: str | Path, max_batch: int = 50_000, flush_interval_s: float = 5.0):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        # The in-memory database only holds this process's runs rows for the partition join
+        super().__init__(":memory:", max_batch=max_batch, flush_interval_s=flush_interval_s)
+
+    def _copy(self, select_sql: str, table: str) -> None:
+        self.conn.execute(f"COPY ({select_sql}) TO '{self.root / table}' ({_copy_options()})")
+
+    def log_run(self, experiment: ExperimentConfig, run_idx: int = 0, mode: str = "live") -> int:
+        run_id = secrets.randbits(63)
+        geometry = experiment.viewport
+        with self._conn_lock:
+            self.conn.execute(
+                "INSERT INTO runs (run_id, experiment_name, scheduler_variant, netem_profile, trace, seed, notes, "
+                "viewport_width_px, viewport_height_px, device_pixel_ratio, tile_size_px, mode) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    run_id,
+                    experiment.name,
+                    experiment.scheduler_variant,
+                    experiment.netem_profile,
+                    str(experiment.trace_path),
+                    experiment.seed_base + run_idx,
+                    experiment.notes,
+                    geometry.width_px,
+                    geometry.height_px,
+                    geometry.device_pixel_ratio,
+                    geometry.tile_size_px,
+                    mode,
+                )
+            )
+            self._copy(f"SELECT * FROM runs WHERE run_id = {int(run_id)}", "runs")
+        return run_id
+
+    def finish_run(self, run_id: int) -> None:
+        self.flush()
+        with self._conn_lock:
+            self._copy(
+                f"SELECT {int(run_id)} AS run_id, current_timestamp AS finished_at, "
+                f"r.experiment_name, r.scheduler_variant, r.netem_profile FROM runs r WHERE r.run_id = {int(run_id)}",
+                "run_finished",
+            )
+
+    def _ingest(self, table: str, buffer: _ColumnBuffer) -> None:
+        view = f"_ingest_{table}"
+        self.conn.register(view, buffer.frame())
+        try:
+            self._copy(
+                f"SELECT b.*, r.experiment_name, r.scheduler_variant, r.netem_profile "
+                f"FROM {view} b JOIN runs r USING (run_id)",
+                table,
+            )
+        finally:
+            self.conn.unregister(view)
+
+    def _write(self, batch: Dict[str, _ColumnBuffer]) -> None:
+        with self._conn_lock:
+            for table, buffer in batch.items():
+                if buffer.rows:
+                    self._ingest(table, buffer)
+
+    def log_latency_sketch(self, run_id: int, ring: int, sketch: DDSketch) -> None:
+        # Held in memory until flush(), sketches are written once per run
+        with self._conn_lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO latency_sketches (run_id, ring, sketch) VALUES (?, ?, ?)",
+                (run_id, ring, sketch.to_bytes())
+            )
+
+    def flush(self) -> None:
+        super().flush()
+        with self._conn_lock:
+            if self.conn.execute("SELECT count(*) FROM latency_sketches").fetchone()[0]:
+                self._copy(
+                    "SELECT s.*, r.experiment_name, r.scheduler_variant, r.netem_profile "
+                    "FROM latency_sketches s JOIN runs r USING (run_id)",
+                    "latency_sketches",
+                )
+                self.conn.execute("DELETE FROM latency_sketches")
+
+def open_results(root: str | Path, conn: Optional[duckdb.DuckDBPyConnection] = None) -> duckdb.DuckDBPyConnection:
+    """A DuckDB connection with one view per results table over the Parquet files.
+
+    Filters on the partition columns (run_id, scheduler_variant, ...) prune
+    whole directories. Tables with no files yet are empty views with the
+    schema.sql columns, so analysis queries run unchanged.
+    """
+    root = Path(root)
+    conn = conn or duckdb.connect()
+    conn.execute("CREATE SCHEMA IF NOT EXISTS _empty")
+    conn.execute("SET search_path = '_empty'")
+    try:
+        schema_sql = (Path(__file__).parent / "schema.sql").read_text()
+        for stmt in schema_sql.split(';'):
+            if stmt.strip():
+                conn.execute(stmt)
+    finally:
+        conn.execute("SET search_path = 'main'")
+    for table in TABLES:
+        if any((root / table).glob("*/*/*/*/*.parquet")):
+            source = (
+                f"read_parquet('{table_glob(root, table)}', hive_partitioning = true, "
+                f"hive_types = {_HIVE_TYPES}, union_by_name = true)"
+            )
+        else:
+            source = f"_empty.{table}"
+        conn.execute(f"CREATE OR REPLACE VIEW main.{table} AS SELECT * FROM {source}")
+    return conn
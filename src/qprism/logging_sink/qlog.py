@@ -0,0 +1,103 @@
+import json
+from pathlib import Path
+from typing import Any, Dict, Iterator, Set, Tuple
+
+_DECODER = json.JSONDecoder()
+_READ_CHARS = 1 << 16
+
+def iter_qlog_events(path: str | Path, read_chars: int = _READ_CHARS) -> Iterator[Dict[str, Any]]:
+    """Events of every trace in a JSON qlog file, decoded one at a time.
+
+    aioquic's QuicFileLogger writes a single JSON document per connection, so
+    instead of json.load() this scans for each "events" array and decodes its
+    elements with raw_decode, holding only the unread tail of the file.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        buf = ""
+        pos = 0
+        in_events = False
+        eof = False
+        while True:
+            keep = pos
+            if not in_events:
+                start = buf.find('"events"', pos)
+                bracket = buf.find("[", start) if start >= 0 else -1
+                if bracket >= 0:
+                    pos = bracket + 1
+                    in_events = True
+                    continue
+                # A key split across reads is found again after the next one
+                keep = start if start >= 0 else max(pos, len(buf) - len('"events"'))
+            else:
+                while pos < len(buf) and buf[pos] in " \t\r\n,":
+                    pos += 1
+                if pos < len(buf) and buf[pos] == "]":
+                    pos += 1
+                    in_events = False
+                    continue
+                if pos < len(buf):
+                    try:
+                        event, end = _DECODER.raw_decode(buf, pos)
+                    except json.JSONDecodeError:
+                        pass
+                    else:
+                        pos = end
+                        yield event
+                        continue
+                keep = pos
+            if eof:
+                if in_events:
+                    raise ValueError(f"Truncated qlog: {path}")
+                return
+            # Need more input: drop what was consumed and read the next block
+            buf = buf[keep:]
+            pos = 0
+            chunk = f.read(read_chars)
+            if chunk:
+                buf += chunk
+            else:
+                eof = True
+
+def _ms(value: Any) -> float | None:
+    return None if value is None else float(value)
+
+def qlog_rows(path: str | Path, t0_ms: float = 0.0) -> Iterator[Tuple[str, Tuple]]:
+    """(table, row) pairs for qlog_metrics and qlog_loss from one qlog file.
+
+    Rows carry the file's ODCID (its stem) and event times in ms since t0_ms,
+    the wall-clock start of the run in ms. Retransmissions are stream or
+    crypto frames sent again at an offset already sent on this connection.
+    """
+    odcid = Path(path).stem
+    sent: Set[Tuple[str, Any, int]] = set()
+    for event in iter_qlog_events(path):
+        name = event.get("name")
+        data = event.get("data") or {}
+        t_ms = float(event.get("time", 0.0)) - t0_ms
+        if name == "recovery:metrics_updated":
+            yield "qlog_metrics", (
+                odcid, t_ms,
+                _ms(data.get("latest_rtt")), _ms(data.get("min_rtt")),
+                _ms(data.get("smoothed_rtt")), _ms(data.get("rtt_variance")),
+                data.get("cwnd"), data.get("bytes_in_flight"), data.get("ssthresh"),
+            )
+        elif name == "recovery:packet_lost":
+            yield "qlog_loss", (
+                odcid, t_ms, "lost", data.get("type"), data.get("packet_number"), None, None, None,
+            )
+        elif name == "transport:packet_sent":
+            header = data.get("header") or {}
+            for frame in data.get("frames") or ():
+                kind = frame.get("frame_type")
+                if kind not in ("stream", "crypto") or not frame.get("length"):
+                    continue
+                # Crypto offsets restart in every packet number space
+                scope = frame.get("stream_id") if kind == "stream" else header.get("packet_type")
+                key = (kind, scope, frame["offset"])
+                if key in sent:
+                    yield "qlog_loss", (
+                        odcid, t_ms, "retransmit", header.get("packet_type"), header.get("packet_number"),
+                        frame.get("stream_id"), frame["offset"], frame["length"],
+                    )
+                else:
+                    sent.add(key)
@@ -1,26 +1,38 @@
-CREATE SEQUENCE seq_run_id START 1;
+CREATE SEQUENCE IF NOT EXISTS seq_run_id START 1;
 
-CREATE TABLE runs (
-	run_id INTEGER PRIMARY KEY DEFAULT nextval('seq_run_id'),
+CREATE TABLE IF NOT EXISTS runs (
+	run_id BIGINT PRIMARY KEY DEFAULT nextval('seq_run_id'),
 	experiment_name TEXT,
 	scheduler_variant TEXT,
 	netem_profile TEXT,
 	trace TEXT,
 	seed INTEGER,
-	notes TEXT
+	notes TEXT,
+	viewport_width_px INTEGER,
+	viewport_height_px INTEGER,
+	device_pixel_ratio DOUBLE,
+	tile_size_px INTEGER,
+	mode TEXT DEFAULT 'live'
 );
 
-CREATE TABLE tile_requests (
-	run_id INTEGER REFERENCES runs(run_id),
+-- One row per run once everything it logged is written, runs without one are still running or crashed
+CREATE TABLE IF NOT EXISTS run_finished (
+	run_id BIGINT PRIMARY KEY REFERENCES runs(run_id),
+	finished_at TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS tile_requests (
+	run_id BIGINT REFERENCES runs(run_id),
 	tile_id TEXT,
 	zoom INTEGER,
 	ring INTEGER,
 	requested_at INTEGER,
-	PRIMARY KEY (run_id, tile_id, requested_at)
+	deadline_at INTEGER,
+	PRIMARY KEY (run_id, tile_id, zoom, requested_at)
 );
 
-CREATE TABLE tile_completions (
-	run_id INTEGER REFERENCES runs(run_id),
+CREATE TABLE IF NOT EXISTS tile_completions (
+	run_id BIGINT REFERENCES runs(run_id),
 	tile_id TEXT,
 	zoom INTEGER,
 	ring INTEGER,
@@ -28,11 +40,70 @@ CREATE TABLE tile_completions (
 	completed_at INTEGER,
 	cancelled BOOLEAN,
 	bytes_transferred INTEGER,
-	PRIMARY KEY (run_id, tile_id, requested_at)
+	PRIMARY KEY (run_id, tile_id, zoom, requested_at)
 );
 
-CREATE TABLE viewport_samples (
-	run_id INTEGER REFERENCES runs(run_id),
+CREATE TABLE IF NOT EXISTS viewport_samples (
+	run_id BIGINT REFERENCES runs(run_id),
 	ts_ms INTEGER,
 	completeness DOUBLE
 );
+
+CREATE TABLE IF NOT EXISTS scheduler_frames (
+	run_id BIGINT REFERENCES runs(run_id),
+	frame_idx INTEGER,
+	t_ms INTEGER,
+	candidates INTEGER,
+	loaded INTEGER,
+	cancelled INTEGER,
+	cpu_ns BIGINT,
+	wall_ns BIGINT,
+	lateness_us BIGINT,
+	loop_lag_us BIGINT,
+	PRIMARY KEY (run_id, frame_idx)
+);
+
+CREATE TABLE IF NOT EXISTS latency_sketches (
+	run_id BIGINT REFERENCES runs(run_id),
+	ring INTEGER, -- -1 holds every ring of the run
+	sketch BLOB,
+	PRIMARY KEY (run_id, ring)
+);
+
+CREATE TABLE IF NOT EXISTS tile_chunks (
+	run_id BIGINT REFERENCES runs(run_id),
+	side TEXT, -- client or server
+	tile_id TEXT,
+	zoom INTEGER,
+	stream_id BIGINT, -- server side QUIC stream, -1 on the client
+	kind TEXT, -- request, headers, data or reset
+	t_us BIGINT, -- since the start of the run
+	bytes INTEGER
+);
+
+CREATE TABLE IF NOT EXISTS qlog_metrics (
+	run_id BIGINT REFERENCES runs(run_id),
+	side TEXT, -- client or server
+	odcid TEXT, -- original destination connection ID, shared by both ends
+	t_ms DOUBLE, -- since the start of the run
+	latest_rtt_ms DOUBLE,
+	min_rtt_ms DOUBLE,
+	smoothed_rtt_ms DOUBLE,
+	rtt_variance_ms DOUBLE,
+	cwnd BIGINT,
+	bytes_in_flight BIGINT,
+	ssthresh BIGINT
+);
+
+CREATE TABLE IF NOT EXISTS qlog_loss (
+	run_id BIGINT REFERENCES runs(run_id),
+	side TEXT,
+	odcid TEXT,
+	t_ms DOUBLE,
+	kind TEXT, -- lost or retransmit
+	packet_type TEXT,
+	packet_number BIGINT,
+	stream_id BIGINT,
+	frame_offset BIGINT,
+	length BIGINT
+);
@@ -1,4 +1,5 @@
 from typing import List, Tuple, Dict, Optional
+from bisect import bisect_right
 from statistics import mean, stdev
 
 ViewportSample = Tuple[int, float]
@@ -46,13 +47,79 @@ def latency_percentiles(latencies: List[int], percentiles=(50, 95,99)) -> Dict[s
 def cancel_ratio(total: int, cancelled: int) -> Optional[float]:
     return cancelled / total if total else None
 
+def merge_intervals(intervals: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    """Union of closed intervals as sorted, disjoint intervals; touching ones are merged."""
+    merged: List[Tuple[int, int]] = []
+    for start, end in sorted(iv for iv in intervals if iv[0] <= iv[1]):
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
 def fairness_gaurd_rate(r0_intervals: List[Tuple[int, int]], nonr0_requests: List[int]) -> Optional[float]:
     if not r0_intervals:
         return None
-    r0_intervals.sort()
+    # Sweep the sorted requests over the merged R0 intervals, O((n + m) log(n + m))
+    merged = merge_intervals(r0_intervals)
     gaurd_events = 0
+    i = 0
     for t in sorted(nonr0_requests):
-        if any(start <= t <= end for start, end in r0_intervals):
+        while i < len(merged) and merged[i][1] < t:
+            i += 1
+        if i == len(merged):
+            break
+        if merged[i][0] <= t:
             gaurd_events += 1
     return gaurd_events / len(r0_intervals)
 
+def fairness_overlap(
+    r0_intervals: List[Tuple[int, int]],
+    nonr0_intervals: List[Tuple[int, int]],
+) -> Dict[str, Optional[float]]:
+    """How much outer-ring traffic overlaps R0 traffic, in ms.
+
+    overlap_ms sums each non-R0 interval's overlap with R0 time, so concurrent
+    outer requests count separately; r0_overlapped_ms is the R0 time during
+    which at least one outer request was in flight.
+    """
+    r0 = merge_intervals(r0_intervals)
+    outer = merge_intervals(nonr0_intervals)
+    r0_ms = sum(end - start for start, end in r0)
+
+    def _overlap(a: List[Tuple[int, int]], b: List[Tuple[int, int]]) -> int:
+        # Both sorted and disjoint: two-pointer sweep
+        total = 0
+        i = j = 0
+        while i < len(a) and j < len(b):
+            lo = max(a[i][0], b[j][0])
+            hi = min(a[i][1], b[j][1])
+            if hi > lo:
+                total += hi - lo
+            if a[i][1] < b[j][1]:
+                i += 1
+            else:
+                j += 1
+        return total
+
+    # R0 time before x via prefix sums, so each outer interval costs one bisect
+    starts = [start for start, _end in r0]
+    before = [0]
+    for start, end in r0:
+        before.append(before[-1] + end - start)
+
+    def _r0_until(x: int) -> int:
+        k = bisect_right(starts, x) - 1
+        if k < 0:
+            return 0
+        return before[k] + min(x, r0[k][1]) - r0[k][0]
+
+    overlap_ms = sum(_r0_until(end) - _r0_until(start) for start, end in nonr0_intervals if start <= end)
+    r0_overlapped_ms = _overlap(r0, outer)
+    return {
+        "r0_ms": r0_ms,
+        "overlap_ms": overlap_ms,
+        "r0_overlapped_ms": r0_overlapped_ms,
+        "r0_overlapped_fraction": r0_overlapped_ms / r0_ms if r0_ms else None,
+    }
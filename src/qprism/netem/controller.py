@@ -3,7 +3,10 @@ import shutil
 import subprocess
 from qprism.netem.profiles import NetemProfile
 
-def apply_profile(profile: NetemProfile, interface: str = "lo", dry_run: bool = False):
+def _in_netns(cmd: list[str], netns: str | None) -> list[str]:
+    return ["ip", "netns", "exec", netns, *cmd] if netns else cmd
+
+def apply_profile(profile: NetemProfile, interface: str = "lo", dry_run: bool = False, netns: str | None = None):
     cmd = ["tc", "qdisc", "replace", "dev", interface, "root", "netem"]
     if profile.rtt_ms > 0:
         if profile.jitter_ms and profile.jitter_ms > 0:
@@ -14,6 +17,9 @@ def apply_profile(profile: NetemProfile, interface: str = "lo", dry_run: bool =
         loss_percent = profile.loss * 100.0
         loss_str = f"{loss_percent:.4f}".rstrip('0').rstrip('.')
         cmd += ["loss", f"{loss_str}%"]
+    if profile.rate_kbit > 0:
+        cmd += ["rate", f"{profile.rate_kbit}kbit"]
+    cmd = _in_netns(cmd, netns)
     if dry_run:
         return cmd
     # Make host machine has tc
@@ -25,8 +31,8 @@ def apply_profile(profile: NetemProfile, interface: str = "lo", dry_run: bool =
     subprocess.run(cmd, check=True)
     return True
 
-def clear(interface: str = "lo", dry_run: bool = False) -> bool | list[str]:
-    cmd = ["tc", "qdisc", "del", "dev", interface, "root"]
+def clear(interface: str = "lo", dry_run: bool = False, netns: str | None = None) -> bool | list[str]:
+    cmd = _in_netns(["tc", "qdisc", "del", "dev", interface, "root"], netns)
     if dry_run:
         return cmd
     if shutil.which("tc") is None:
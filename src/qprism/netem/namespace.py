@@ -0,0 +1,117 @@
+import ctypes
+import os
+import shutil
+import subprocess
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterator, List
+
+from qprism.netem import controller
+from qprism.netem.profiles import NetemProfile
+
+CLONE_NEWNET = 0x40000000
+NETNS_DIR = Path("/var/run/netns")
+MAX_SLOTS = 254
+
+@dataclass(frozen=True, slots=True)
+class NetnsPair:
+    """A network namespace joined to the host by a veth pair.
+
+    The server runs inside the namespace at peer_addr, the client stays in
+    the host namespace at host_addr, so every packet crosses the veth and
+    its qdiscs. Slot N uses 10.200.N.0/24.
+    """
+    slot: int
+    name: str
+    host_if: str
+    peer_if: str
+    host_addr: str
+    peer_addr: str
+
+def netns_pair(slot: int, prefix: str = "qprism") -> NetnsPair:
+    if not 0 <= slot < MAX_SLOTS:
+        raise ValueError(f"Namespace slot must be in [0, {MAX_SLOTS}): {slot}")
+    return NetnsPair(
+        slot=slot,
+        name=f"{prefix}{slot}",
+        # Interface names are limited to 15 characters
+        host_if=f"qph{slot}",
+        peer_if=f"qpn{slot}",
+        host_addr=f"10.200.{slot}.1",
+        peer_addr=f"10.200.{slot}.2",
+    )
+
+def setup_commands(pair: NetnsPair) -> List[List[str]]:
+    in_ns = ["ip", "netns", "exec", pair.name]
+    return [
+        ["ip", "netns", "add", pair.name],
+        ["ip", "link", "add", pair.host_if, "type", "veth", "peer", "name", pair.peer_if],
+        ["ip", "link", "set", pair.peer_if, "netns", pair.name],
+        ["ip", "addr", "add", f"{pair.host_addr}/24", "dev", pair.host_if],
+        ["ip", "link", "set", pair.host_if, "up"],
+        [*in_ns, "ip", "addr", "add", f"{pair.peer_addr}/24", "dev", pair.peer_if],
+        [*in_ns, "ip", "link", "set", pair.peer_if, "up"],
+        [*in_ns, "ip", "link", "set", "lo", "up"],
+    ]
+
+def teardown_commands(pair: NetnsPair) -> List[List[str]]:
+    # Deleting the namespace destroys the veth pair with it
+    return [["ip", "netns", "del", pair.name]]
+
+def _run(cmds: List[List[str]], dry_run: bool, check: bool = True) -> List[List[str]]:
+    if dry_run:
+        return cmds
+    if shutil.which("ip") is None:
+        raise FileNotFoundError("ip command not found, please install iproute2")
+    if os.geteuid() != 0:
+        raise PermissionError("Root privileges are required to manage network namespaces")
+    for cmd in cmds:
+        subprocess.run(cmd, check=check)
+    return cmds
+
+def create(pair: NetnsPair, dry_run: bool = False) -> List[List[str]]:
+    # A namespace left over from a crashed matrix would make "ip netns add" fail
+    if not dry_run and (NETNS_DIR / pair.name).exists():
+        destroy(pair)
+    return _run(setup_commands(pair), dry_run)
+
+def destroy(pair: NetnsPair, dry_run: bool = False) -> List[List[str]]:
+    return _run(teardown_commands(pair), dry_run, check=False)
+
+def apply_profile(pair: NetnsPair, profile: NetemProfile, dry_run: bool = False) -> List:
+    """Shape both veth ends, so each direction is delayed once like on lo."""
+    return [
+        controller.apply_profile(profile, interface=pair.host_if, dry_run=dry_run),
+        controller.apply_profile(profile, interface=pair.peer_if, dry_run=dry_run, netns=pair.name),
+    ]
+
+def clear(pair: NetnsPair, dry_run: bool = False) -> List:
+    return [
+        controller.clear(interface=pair.host_if, dry_run=dry_run),
+        controller.clear(interface=pair.peer_if, dry_run=dry_run, netns=pair.name),
+    ]
+
+_libc = None
+
+def _setns(fd: int) -> None:
+    global _libc
+    if _libc is None:
+        _libc = ctypes.CDLL(None, use_errno=True)
+    if _libc.setns(fd, CLONE_NEWNET) != 0:
+        errno = ctypes.get_errno()
+        raise OSError(errno, f"setns failed: {os.strerror(errno)}")
+
+@contextmanager
+def entered(name: str) -> Iterator[None]:
+    """Run the block with this thread inside network namespace name.
+
+    Sockets keep the namespace they were created in, so a server started
+    inside the block keeps listening there after the thread switches back.
+    """
+    with open(NETNS_DIR / name) as target, open("/proc/thread-self/ns/net") as home:
+        _setns(target.fileno())
+        try:
+            yield
+        finally:
+            _setns(home.fileno())
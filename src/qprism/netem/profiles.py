@@ -10,6 +10,8 @@ class NetemProfile:
     jitter_ms: int
     loss: float
     description: str
+    # Bottleneck bandwidth, 0 leaves the link unlimited
+    rate_kbit: int = 0
 
 def load_profiles(path: str | Path = "configs/netem_profiles.yaml") -> Dict[str, NetemProfile]:
     if isinstance(path, str):
@@ -29,6 +31,7 @@ def load_profiles(path: str | Path = "configs/netem_profiles.yaml") -> Dict[str,
                 rtt_ms=int(vals.get("rtt_ms", 0)),
                 jitter_ms=int(vals.get("jitter_ms", 0)),
                 loss=float(vals.get("loss", 0.0)),
-                description=str(vals.get("description", ""))
+                description=str(vals.get("description", "")),
+                rate_kbit=int(vals.get("rate_kbit", 0)),
             )
     return data
@@ -0,0 +1,56 @@
+import math
+from typing import Optional
+
+class BandwidthEstimator:
+    """Throughput/RTT estimate fed from measured tile completions.
+
+    Delivery rate is the bytes delivered between consecutive completions
+    (EWMA smoothed), RTT is tracked as a smoothed and a minimum latency.
+    Their product is the bandwidth-delay product of the link, which
+    bounds how many tiles can usefully be in flight at once.
+    """
+    def __init__(self, alpha: float = 0.25, rtt_alpha: float = 0.125) -> None:
+        self.alpha = alpha
+        self.rtt_alpha = rtt_alpha
+        self.bytes_per_ms: Optional[float] = None
+        self.srtt_ms: Optional[float] = None
+        self.min_rtt_ms: Optional[float] = None
+        self.mean_tile_bytes: Optional[float] = None
+        self._last_completed_ms: Optional[int] = None
+        self._pending_bytes = 0
+
+    def _ewma(self, prev: Optional[float], sample: float, alpha: float) -> float:
+        return sample if prev is None else (1.0 - alpha) * prev + alpha * sample
+
+    def observe(self, requested_at_ms: int, completed_at_ms: int, nbytes: int) -> None:
+        latency_ms = max(1, completed_at_ms - requested_at_ms)
+        self.srtt_ms = self._ewma(self.srtt_ms, latency_ms, self.rtt_alpha)
+        self.min_rtt_ms = latency_ms if self.min_rtt_ms is None else min(self.min_rtt_ms, latency_ms)
+        if nbytes <= 0:
+            return
+        self.mean_tile_bytes = self._ewma(self.mean_tile_bytes, nbytes, self.alpha)
+
+        # A single stream's rate is a lower bound on what the link delivers
+        rate = nbytes / latency_ms
+        if self._last_completed_ms is not None:
+            elapsed = completed_at_ms - self._last_completed_ms
+            if elapsed <= 0:
+                # Same-millisecond completions are folded into the next sample
+                self._pending_bytes += nbytes
+                return
+            rate = max(rate, (self._pending_bytes + nbytes) / elapsed)
+        self._pending_bytes = 0
+        self._last_completed_ms = completed_at_ms
+        self.bytes_per_ms = self._ewma(self.bytes_per_ms, rate, self.alpha)
+
+    def bdp_bytes(self) -> Optional[float]:
+        if self.bytes_per_ms is None or self.min_rtt_ms is None:
+            return None
+        return self.bytes_per_ms * self.min_rtt_ms
+
+    def capacity_tiles(self) -> Optional[int]:
+        """Number of average-sized tiles that fit in the pipe, None until measured."""
+        bdp = self.bdp_bytes()
+        if bdp is None or not self.mean_tile_bytes:
+            return None
+        return max(1, math.ceil(bdp / self.mean_tile_bytes))
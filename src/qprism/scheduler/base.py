@@ -0,0 +1,46 @@
+from typing import TYPE_CHECKING, Iterable, List, Optional, Protocol, Tuple, runtime_checkable
+from qprism.types import Tile, TileCompletion
+from qprism.scheduler.rings import Viewport
+from qprism.viewport.traces import TracePoint
+
+if TYPE_CHECKING:
+    from qprism.viewport.completeness import LiveCompleteness
+
+@runtime_checkable
+class Scheduler(Protocol):
+    """Interface the runner drives every scheduler variant through.
+
+    schedule() is called once per trace frame with the visible tiles not yet
+    requested, plus those of rings 1..candidate_rings when the policy sets
+    that attribute, and returns (to_load, to_cancel). The hooks let a policy
+    see the raw trace point, learn from completions (completion is None when
+    a fetch failed) and attach a deadline to each request it issues.
+    attach_completeness() hands over the run's live completeness tracker.
+    """
+    def schedule(self, viewport: Viewport, tiles: Iterable[Tile]) -> Tuple[List[Tile], List[Tile]]: ...
+
+    def observe_frame(self, tp: TracePoint) -> None: ...
+
+    def on_tile_completed(self, tile: Tile, completion: Optional[TileCompletion]) -> None: ...
+
+    def deadline_for(self, tile: Tile) -> Optional[int]: ...
+
+    def attach_completeness(self, tracker: "LiveCompleteness") -> None: ...
+
+class BaseScheduler:
+    """No-op hooks so a policy only overrides the ones it uses."""
+    completeness: Optional["LiveCompleteness"] = None
+    # Rings around the viewport offered besides the visible tiles, 0 keeps the baselines visible-only
+    candidate_rings: int = 0
+
+    def observe_frame(self, tp: TracePoint) -> None:
+        return None
+
+    def on_tile_completed(self, tile: Tile, completion: Optional[TileCompletion]) -> None:
+        return None
+
+    def deadline_for(self, tile: Tile) -> Optional[int]:
+        return None
+
+    def attach_completeness(self, tracker: "LiveCompleteness") -> None:
+        self.completeness = tracker
@@ -16,6 +16,9 @@ class FairnessGaurd:
            key = self._key(tile)
            self.skip_counts[key] = self.skip_counts.get(key, 0) + 1
     
+    def is_starved(self, tile: Tile) -> bool:
+        return self.skip_counts.get(self._key(tile), 0) >= self.threshold
+
     def reset(self, tiles: Iterable[Tile]) -> None:
         for tile in tiles:
             self.skip_counts.pop(self._key(tile), None)
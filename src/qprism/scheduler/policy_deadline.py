@@ -0,0 +1,137 @@
+import math
+from collections import deque
+from typing import Deque, Dict, Iterable, List, Optional, Tuple
+from qprism.types import Tile, TileCompletion
+from qprism.scheduler.base import BaseScheduler
+from qprism.scheduler.rings import compute_ring, Viewport
+from qprism.scheduler.inflight_tracker import InflightTracker, TileKey
+from qprism.scheduler.bandwidth_estimator import BandwidthEstimator
+from qprism.viewport.model import latlon_to_tile_frac
+from qprism.viewport.traces import TracePoint
+
+INF = math.inf
+
+def _axis_window(pos: int, lo: int, hi: int, v: float) -> Tuple[float, float]:
+    """Time window (ms from now) during which tile column/row `pos` lies in [lo, hi]
+    if the visible range keeps moving at `v` tiles/ms."""
+    if v == 0.0:
+        return (0.0, INF) if lo <= pos <= hi else (INF, INF)
+    if v > 0:
+        enter = 0.0 if pos <= hi else (pos - hi) / v
+        exit_ = (pos - lo + 1) / v
+    else:
+        enter = 0.0 if pos >= lo else (lo - pos) / -v
+        exit_ = (hi - pos + 1) / -v
+    if exit_ <= 0:
+        return INF, INF
+    return enter, exit_
+
+class DeadlineScheduler(BaseScheduler):
+    """Earliest-deadline-first scheduler driven by viewport motion prediction.
+
+    Viewport velocity is estimated from the recent trace points. Each tile's
+    deadline is the predicted time it enters the viewport; tiles that leave
+    the viewport before they could arrive are dropped, and tiles the viewport
+    is not moving towards are demoted behind every tile with a deadline.
+    """
+    candidate_rings = 3
+
+    def __init__(
+        self,
+        history: int = 5,
+        lookahead_ms: int = 2000,
+        default_latency_ms: int = 100,
+        estimator: Optional[BandwidthEstimator] = None,
+    ) -> None:
+        self.inflight_tracker = InflightTracker()
+        self.estimator = estimator or BandwidthEstimator()
+        self.lookahead_ms = lookahead_ms
+        self.default_latency_ms = default_latency_ms
+        self._recent: Deque[TracePoint] = deque(maxlen=max(2, history))
+        self._deadlines: Dict[TileKey, int] = {}
+
+    def observe_frame(self, tp: TracePoint) -> None:
+        self._recent.append(tp)
+
+    def now_ms(self) -> int:
+        return self._recent[-1].t_ms if self._recent else 0
+
+    def velocity(self) -> Tuple[float, float]:
+        """Viewport velocity in tiles/ms at the current zoom."""
+        if len(self._recent) < 2:
+            return 0.0, 0.0
+        last = self._recent[-1]
+        first = next(tp for tp in self._recent if tp.zoom == last.zoom)
+        dt = last.t_ms - first.t_ms
+        if dt <= 0:
+            return 0.0, 0.0
+        # Fractional positions, the center tile alone is too coarse for velocity
+        x0, y0 = latlon_to_tile_frac(first.lat, first.lon, last.zoom)
+        x1, y1 = latlon_to_tile_frac(last.lat, last.lon, last.zoom)
+        return (x1 - x0) / dt, (y1 - y0) / dt
+
+    def expected_latency_ms(self) -> float:
+        srtt = self.estimator.srtt_ms
+        return float(self.default_latency_ms) if srtt is None else srtt
+
+    def visibility_window(self, tile: Tile, viewport: Viewport) -> Tuple[float, float]:
+        min_x, max_x, min_y, max_y, view_z = viewport
+        if tile.z != view_z:
+            return INF, INF
+        vx, vy = self.velocity()
+        enter_x, exit_x = _axis_window(tile.x, min_x, max_x, vx)
+        enter_y, exit_y = _axis_window(tile.y, min_y, max_y, vy)
+        enter, exit_ = max(enter_x, enter_y), min(exit_x, exit_y)
+        return (enter, exit_) if enter < exit_ else (INF, INF)
+
+    def deadline_for(self, tile: Tile) -> Optional[int]:
+        return self._deadlines.get((tile.z, tile.x, tile.y))
+
+    def on_tile_completed(self, tile: Tile, completion: Optional[TileCompletion]) -> None:
+        self.inflight_tracker.remove(tile)
+        self._deadlines.pop((tile.z, tile.x, tile.y), None)
+        if completion is not None and not completion.cancelled and completion.bytes_transferred:
+            self.estimator.observe(
+                completion.requested_at_ms, completion.completed_at_ms, completion.bytes_transferred
+            )
+
+    def schedule(self, viewport: Viewport, tiles: Iterable[Tile]) -> Tuple[List[Tile], List[Tile]]:
+        now = self.now_ms()
+        latency = self.expected_latency_ms()
+
+        to_cancel: List[Tile] = []
+        for in_tile in list(self.inflight_tracker.get_in_flight()):
+            enter, _exit = self.visibility_window(in_tile, viewport)
+            if compute_ring(in_tile, viewport) > 3 and enter > self.lookahead_ms:
+                self.inflight_tracker.cancel(in_tile)
+                self._deadlines.pop((in_tile.z, in_tile.x, in_tile.y), None)
+                to_cancel.append(in_tile)
+
+        timed: List[Tuple[int, int, Tile]] = []
+        demoted: List[Tuple[int, Tile]] = []
+        for tile in tiles:
+            if self.inflight_tracker.is_in_flight(tile):
+                continue
+            ring_distance = compute_ring(tile, viewport)
+            enter, exit_ = self.visibility_window(tile, viewport)
+            if enter == INF:
+                if ring_distance <= 3:
+                    demoted.append((ring_distance, tile))
+                continue
+            if exit_ < latency or (ring_distance > 3 and enter > self.lookahead_ms):
+                # Gone from the viewport before it could arrive
+                continue
+            timed.append((now + int(enter), ring_distance, tile))
+
+        timed.sort(key=lambda c: (c[0], c[1]))
+        demoted.sort(key=lambda c: c[0])
+
+        to_load: List[Tile] = []
+        for deadline, _ring, tile in timed:
+            self._deadlines[(tile.z, tile.x, tile.y)] = deadline
+            to_load.append(tile)
+        to_load.extend(tile for _ring, tile in demoted)
+
+        for tile in to_load:
+            self.inflight_tracker.add(tile)
+        return to_load, to_cancel
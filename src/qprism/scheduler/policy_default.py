@@ -0,0 +1,9 @@
+from typing import Iterable, List, Tuple
+from qprism.types import Tile
+from qprism.scheduler.base import BaseScheduler
+from qprism.scheduler.rings import Viewport
+
+class PassthroughScheduler(BaseScheduler):
+    """Baseline for the http2/http3 defaults: load everything in the order given, never cancel."""
+    def schedule(self, viewport: Viewport, tiles: Iterable[Tile]) -> Tuple[List[Tile], List[Tile]]:
+        return list(tiles), []
@@ -1,9 +1,10 @@
 from typing import Iterable, List, Tuple
 from qprism.types import Tile
+from qprism.scheduler.base import BaseScheduler
 from qprism.scheduler.rings import compute_ring, Viewport
 from qprism.scheduler.inflight_tracker import InflightTracker
 
-class PriorityOnlyScheduler:
+class PriorityOnlyScheduler(BaseScheduler):
     def __init__(self) -> None:
         self.inflight_tracker = InflightTracker()
         
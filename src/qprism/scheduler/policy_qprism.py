@@ -1,40 +1,141 @@
-from typing import Iterable, List, Tuple
-from qprism.types import Tile
-from qprism.scheduler.rings import compute_ring, Viewport
-from qprism.scheduler.inflight_tracker import InflightTracker
+from typing import Dict, Iterable, List, Mapping, Optional, Set, Tuple
+from qprism.types import Tile, TileCompletion
+from qprism.scheduler.base import BaseScheduler
+from qprism.scheduler.rings import compute_ring, compute_zoom_ring, covering_parents, Viewport
+from qprism.scheduler.inflight_tracker import InflightTracker, TileKey
 from qprism.scheduler.fairness_gaurd import FairnessGaurd
+from qprism.scheduler.bandwidth_estimator import BandwidthEstimator
 
-class QPrismScheduler:
-    def __init__(self) -> None:
+class QPrismScheduler(BaseScheduler):
+    """Ring-ordered scheduler with cancellation and bandwidth-aware admission.
+
+    R0 tiles are always admitted. Outer-ring tiles are admitted only while
+    their ring is under its in-flight budget and the total in flight is under
+    the estimated link capacity; the rest are held back and released on later
+    calls, with the fairness guard releasing tiles that were skipped too often.
+
+    With zoom_fallback, a zoom change first requests the parent tiles
+    `fallback_levels` up that cover the new viewport as placeholders. In-flight
+    parents covering the viewport are kept; other zooms are cancelled as stale.
+
+    With r0_first and a live completeness tracker attached, rings past
+    R1 are held back while any visible tile is still missing.
+    """
+    candidate_rings = 3
+
+    def __init__(
+        self,
+        ring_budgets: Optional[Mapping[int, int]] = None,
+        fairness_threshold: int = 3,
+        estimator: Optional[BandwidthEstimator] = None,
+        zoom_fallback: bool = False,
+        fallback_levels: int = 1,
+        r0_first: bool = False,
+    ) -> None:
         self.inflight_tracker = InflightTracker()
-        self.fairness_gaurd = FairnessGaurd()
-        
+        self.fairness_gaurd = FairnessGaurd(threshold=fairness_threshold)
+        self.estimator = estimator or BandwidthEstimator()
+        self.ring_budgets: Dict[int, int] = {int(r): int(b) for r, b in (ring_budgets or {}).items()}
+        self._held: Dict[TileKey, Tile] = {}
+        self.zoom_fallback = zoom_fallback
+        self.fallback_levels = fallback_levels
+        self._last_zoom: Optional[int] = None
+        self._placeholders: Set[TileKey] = set()
+        self.r0_first = r0_first
+
+    def _r0_incomplete(self) -> bool:
+        return self.r0_first and self.completeness is not None and self.completeness.missing_r0_count > 0
+
+    def _distance(self, tile: Tile, viewport: Viewport) -> int:
+        if self.zoom_fallback and 0 < viewport[4] - tile.z <= self.fallback_levels:
+            return 0 if compute_zoom_ring(tile, viewport) == 0 else 999
+        return compute_ring(tile, viewport)
+
+    def _zoom_placeholders(self, viewport: Viewport) -> List[Tile]:
+        zoom_changed = self._last_zoom is not None and self._last_zoom != viewport[4]
+        self._last_zoom = viewport[4]
+        if not (self.zoom_fallback and zoom_changed):
+            return []
+        parents = []
+        for tile in covering_parents(viewport, self.fallback_levels):
+            key = (tile.z, tile.x, tile.y)
+            if key not in self._placeholders and not self.inflight_tracker.is_in_flight(tile):
+                self._placeholders.add(key)
+                parents.append(tile)
+        return parents
+
+    def _has_room(self, ring: int, by_ring: Dict[int, int], total: int, capacity: Optional[int]) -> bool:
+        budget = self.ring_budgets.get(ring)
+        if budget is not None and by_ring.get(ring, 0) >= budget:
+            return False
+        if capacity is not None and total >= capacity:
+            return False
+        return True
+
+    def on_tile_completed(self, tile: Tile, completion: Optional[TileCompletion]) -> None:
+        self.inflight_tracker.remove(tile)
+        if completion is not None and not completion.cancelled and completion.bytes_transferred:
+            self.estimator.observe(
+                completion.requested_at_ms, completion.completed_at_ms, completion.bytes_transferred
+            )
+
     def schedule(self, viewport: Viewport, tiles: Iterable[Tile]) -> Tuple[List[Tile], List[Tile]]:
         to_cancel: List[Tile] = []
+        by_ring: Dict[int, int] = {}
         for in_tile in list(self.inflight_tracker.get_in_flight()):
-            ring_distance = compute_ring(in_tile, viewport)
+            ring_distance = self._distance(in_tile, viewport)
             if ring_distance > 3:
                 self.inflight_tracker.cancel(in_tile)
                 to_cancel.append(in_tile)
                 self.fairness_gaurd.reset([in_tile])
-                
-        canidates: List[Tile] = []
+            else:
+                by_ring[ring_distance] = by_ring.get(ring_distance, 0) + 1
+
+        # Held-back tiles compete again with this call's tiles
+        pending: Dict[TileKey, Tile] = self._held
+        self._held = {}
+        for tile in self._zoom_placeholders(viewport):
+            pending[(tile.z, tile.x, tile.y)] = tile
         for tile in tiles:
+            pending[(tile.z, tile.x, tile.y)] = tile
+
+        canidates: List[Tile] = []
+        for tile in pending.values():
             if not self.inflight_tracker.is_in_flight(tile):
-                ring_distance = compute_ring(tile, viewport)
+                ring_distance = self._distance(tile, viewport)
                 if ring_distance <= 3:
                     canidates.append(tile)
-        canidates.sort(key=lambda t: compute_ring(t, viewport))
+                else:
+                    self.fairness_gaurd.reset([tile])
+        # Within a ring, coarser (placeholder) zooms go first
+        canidates.sort(key=lambda t: (self._distance(t, viewport), t.z))
         canidates = self.fairness_gaurd.promote(canidates)
-        
-        to_load: List[Tile] = canidates
+
+        capacity = self.estimator.capacity_tiles()
+        total = len(self.inflight_tracker.get_in_flight())
+        throttle_outer = self._r0_incomplete()
+        to_load: List[Tile] = []
         waiting: List[Tile] = []
-        
+        for tile in canidates:
+            ring_distance = self._distance(tile, viewport)
+            if throttle_outer and ring_distance > 1:
+                waiting.append(tile)
+            elif (
+                ring_distance == 0
+                or self.fairness_gaurd.is_starved(tile)
+                or self._has_room(ring_distance, by_ring, total, capacity)
+            ):
+                to_load.append(tile)
+                by_ring[ring_distance] = by_ring.get(ring_distance, 0) + 1
+                total += 1
+            else:
+                waiting.append(tile)
+
         if waiting:
             self.fairness_gaurd.record_skips(waiting)
-            
+            self._held = {(t.z, t.x, t.y): t for t in waiting}
+
         for tile in to_load:
             self.inflight_tracker.add(tile)
         self.fairness_gaurd.reset(to_load)
         return to_load, to_cancel
-
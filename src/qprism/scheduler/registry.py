@@ -0,0 +1,87 @@
+import importlib
+import inspect
+from importlib import metadata
+from typing import Any, Callable, Dict, List, Optional
+
+from qprism.scheduler.base import Scheduler
+from qprism.scheduler.policy_cancel_only import CancelOnlyScheduler
+from qprism.scheduler.policy_deadline import DeadlineScheduler
+from qprism.scheduler.policy_default import PassthroughScheduler
+from qprism.scheduler.policy_priority_only import PriorityOnlyScheduler
+from qprism.scheduler.policy_qprism import QPrismScheduler
+
+SchedulerFactory = Callable[..., Scheduler]
+
+ENTRY_POINT_GROUP = "qprism.schedulers"
+
+_REGISTRY: Dict[str, SchedulerFactory] = {
+    "http2_default": PassthroughScheduler,
+    "http3_default": PassthroughScheduler,
+    "qprism_full": QPrismScheduler,
+    "qprism_deadline": DeadlineScheduler,
+    "qprism_priority_only": PriorityOnlyScheduler,
+    "qprism_cancel_only": CancelOnlyScheduler,
+}
+_entry_points_loaded = False
+
+def register_scheduler(name: str, factory: Optional[SchedulerFactory] = None):
+    """Register a scheduler factory under a variant name.
+
+    Usable directly or as a class decorator: @register_scheduler("my_policy").
+    """
+    def _register(f: SchedulerFactory) -> SchedulerFactory:
+        _REGISTRY[name.lower()] = f
+        return f
+    if factory is not None:
+        return _register(factory)
+    return _register
+
+def load_factory(path: str) -> SchedulerFactory:
+    # "package.module:Attribute", as written in experiment YAML or an entry point
+    module_name, sep, attr = path.partition(":")
+    if not sep or not module_name or not attr:
+        raise ValueError(f"Scheduler factory must look like 'module:attr', got {path!r}")
+    obj: Any = importlib.import_module(module_name)
+    for part in attr.split("."):
+        obj = getattr(obj, part)
+    return obj
+
+def _load_entry_points() -> None:
+    global _entry_points_loaded
+    if _entry_points_loaded:
+        return
+    _entry_points_loaded = True
+    for ep in metadata.entry_points(group=ENTRY_POINT_GROUP):
+        _REGISTRY.setdefault(ep.name.lower(), ep.load())
+
+def available_schedulers() -> List[str]:
+    _load_entry_points()
+    return sorted(_REGISTRY)
+
+def make_scheduler(
+    variant: str,
+    params: Optional[Dict[str, Any]] = None,
+    factory: Optional[str] = None,
+) -> Scheduler:
+    name = variant.lower()
+    if factory is not None:
+        # Only for this call, an experiment's factory must not replace a variant for later ones
+        ctor = load_factory(factory)
+    else:
+        if name not in _REGISTRY:
+            _load_entry_points()
+        if name not in _REGISTRY:
+            raise KeyError(f"Unknown scheduler variant: {variant} (known: {available_schedulers()})")
+        ctor = _REGISTRY[name]
+    params = params or {}
+    try:
+        inspect.signature(ctor).bind(**params)
+    except TypeError as e:
+        raise ValueError(f"Bad scheduler params for {variant}: {sorted(params)} ({e})") from None
+    except ValueError:
+        # No signature to check against (builtins, some C types), let the call decide
+        pass
+    scheduler = ctor(**params)
+    if not isinstance(scheduler, Scheduler):
+        raise TypeError(f"Scheduler factory for {variant} returned {type(scheduler).__name__}, not a Scheduler")
+    return scheduler
@@ -1,4 +1,4 @@
-from typing import Set, Tuple
+from typing import List, Set, Tuple
 from qprism.types import Ring, Tile
 
 Viewport = Tuple[int, int, int, int, int]
@@ -26,8 +26,45 @@ def compute_ring(tile: Tile, viewport: Viewport) -> int:
 
     return max(dx, dy)
 
+def parent_tile(tile: Tile, levels: int = 1) -> Tile:
+    return Tile(tile.x >> levels, tile.y >> levels, tile.z - levels)
+
+def compute_zoom_ring(tile: Tile, viewport: Viewport) -> int:
+    # Overzoomed parents are measured against the viewport projected to their zoom
+    min_x, max_x, min_y, max_y, view_z = viewport
+    dz = view_z - tile.z
+    if dz <= 0:
+        return compute_ring(tile, viewport)
+    return compute_ring(tile, (min_x >> dz, max_x >> dz, min_y >> dz, max_y >> dz, tile.z))
+
+def covering_parents(viewport: Viewport, levels: int = 1) -> List[Tile]:
+    min_x, max_x, min_y, max_y, view_z = viewport
+    z = view_z - levels
+    if z < 0:
+        return []
+    return [
+        Tile(x, y, z)
+        for y in range(min_y >> levels, (max_y >> levels) + 1)
+        for x in range(min_x >> levels, (max_x >> levels) + 1)
+    ]
+
+def ring_tiles(viewport: Viewport, max_ring: int = 3) -> List[Tile]:
+    # Tiles of rings 1..max_ring around the viewport, inner rings first, clipped to the world
+    min_x, max_x, min_y, max_y, z = viewport
+    n = 1 << z
+    tiles = []
+    for ring in range(1, max_ring + 1):
+        for y in range(min_y - ring, max_y + ring + 1):
+            if not 0 <= y < n:
+                continue
+            edge = y in (min_y - ring, max_y + ring)
+            for x in (range(min_x - ring, max_x + ring + 1) if edge else (min_x - ring, max_x + ring)):
+                if 0 <= x < n:
+                    tiles.append(Tile(x, y, z))
+    return tiles
+
 def ring_enum(tile: Tile, viewport: Viewport) -> Ring:
-    dist = compute_ring(tile, viewport)
+    dist = compute_zoom_ring(tile, viewport)
     return Ring.R3 if dist > 3 else Ring(dist)
 
 def viewport_from_visible(visible_xy: Set[Tuple[int, int]], zoom: int) -> Viewport:
@@ -0,0 +1,152 @@
+import math
+import struct
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+
+_MAGIC = b"DDS1"
+_HEADER = struct.Struct("<4sdQQdddII")
+# A full store is collapsed down to this share of max_bins, so the sort is paid once per batch of new keys
+_COLLAPSE_TO = 0.9
+
+class DDSketch:
+    """Mergeable quantile sketch with relative error guarantees (DDSketch).
+
+    Values land in logarithmic buckets of width gamma = (1 + a) / (1 - a), so
+    any quantile is reported within relative_accuracy of a true sample value.
+    At most max_bins buckets are kept per sign, collapsing the smallest ones,
+    so memory stays constant however many values are added.
+    """
+    def __init__(self, relative_accuracy: float = 0.01, max_bins: int = 2048) -> None:
+        if not 0.0 < relative_accuracy < 1.0:
+            raise ValueError(f"relative_accuracy must be in (0, 1): {relative_accuracy}")
+        self.relative_accuracy = relative_accuracy
+        self.max_bins = max_bins
+        self._collapse_to = max(1, int(max_bins * _COLLAPSE_TO))
+        self.gamma = (1.0 + relative_accuracy) / (1.0 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.positive: Dict[int, int] = {}
+        self.negative: Dict[int, int] = {}
+        self.zero_count = 0
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def _key(self, value: float) -> int:
+        return math.ceil(math.log(value) / self._log_gamma)
+
+    def _value(self, key: int) -> float:
+        return 2.0 * self.gamma ** key / (self.gamma + 1.0)
+
+    def _collapse(self, store: Dict[int, int]) -> None:
+        # Fold the lowest buckets into one, as in the paper's collapsing store
+        if len(store) <= self.max_bins:
+            return
+        keys = sorted(store)
+        drop = len(keys) - self._collapse_to
+        folded = sum(store.pop(k) for k in keys[:drop])
+        store[keys[drop]] += folded
+
+    def add(self, value: float, count: int = 1) -> None:
+        if count <= 0:
+            return
+        if value > 0.0:
+            key = self._key(value)
+            self.positive[key] = self.positive.get(key, 0) + count
+            self._collapse(self.positive)
+        elif value < 0.0:
+            key = self._key(-value)
+            self.negative[key] = self.negative.get(key, 0) + count
+            self._collapse(self.negative)
+        else:
+            self.zero_count += count
+        self.count += count
+        self.sum += value * count
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def extend(self, values: Iterable[float]) -> None:
+        for value in values:
+            self.add(value)
+
+    def merge(self, other: "DDSketch") -> None:
+        if not math.isclose(self.gamma, other.gamma, rel_tol=1e-12):
+            raise ValueError("Cannot merge sketches with different relative accuracy")
+        for mine, theirs in ((self.positive, other.positive), (self.negative, other.negative)):
+            for key, c in theirs.items():
+                mine[key] = mine.get(key, 0) + c
+            self._collapse(mine)
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.sum += other.sum
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def quantile(self, q: float) -> Optional[float]:
+        if not 0.0 <= q <= 1.0:
+            raise ValueError(f"Quantile must be in [0, 1]: {q}")
+        if self.count == 0:
+            return None
+        rank = q * (self.count - 1)
+        seen = 0
+        for key in sorted(self.negative, reverse=True):
+            seen += self.negative[key]
+            if seen > rank:
+                return max(self.min, -self._value(key))
+        seen += self.zero_count
+        if seen > rank:
+            return 0.0
+        for key in sorted(self.positive):
+            seen += self.positive[key]
+            if seen > rank:
+                return min(self.max, self._value(key))
+        return self.max
+
+    def percentiles(self, percentiles=(50, 95, 99)) -> Dict[str, Optional[float]]:
+        return {f"p{p}": self.quantile(p / 100) for p in percentiles}
+
+    def to_bytes(self) -> bytes:
+        header = _HEADER.pack(
+            _MAGIC, self.relative_accuracy, self.zero_count, self.count,
+            self.sum, self.min, self.max, len(self.positive), len(self.negative),
+        )
+        parts = [header]
+        for store in (self.positive, self.negative):
+            keys = np.fromiter(store.keys(), dtype="<i4", count=len(store))
+            counts = np.fromiter(store.values(), dtype="<u8", count=len(store))
+            parts.append(keys.tobytes())
+            parts.append(counts.tobytes())
+        return b"".join(parts)
+
+    @classmethod
+    def from_bytes(cls, data: bytes, max_bins: int = 2048) -> "DDSketch":
+        magic, accuracy, zero_count, count, total, lo, hi, n_pos, n_neg = _HEADER.unpack_from(data)
+        if magic != _MAGIC:
+            raise ValueError("Not a serialized DDSketch")
+        sketch = cls(accuracy, max_bins)
+        sketch.zero_count, sketch.count, sketch.sum = zero_count, count, total
+        sketch.min, sketch.max = lo, hi
+        offset = _HEADER.size
+        for store, n in ((sketch.positive, n_pos), (sketch.negative, n_neg)):
+            keys = np.frombuffer(data, dtype="<i4", count=n, offset=offset)
+            offset += 4 * n
+            counts = np.frombuffer(data, dtype="<u8", count=n, offset=offset)
+            offset += 8 * n
+            store.update(zip(keys.tolist(), counts.tolist()))
+        return sketch
+
+ALL_RINGS = -1
+
+class RingSketches:
+    """One latency sketch per ring plus ALL_RINGS for the whole run."""
+    def __init__(self, relative_accuracy: float = 0.01) -> None:
+        self.relative_accuracy = relative_accuracy
+        self.by_ring: Dict[int, DDSketch] = {ALL_RINGS: DDSketch(relative_accuracy)}
+
+    def add(self, ring: int, latency_ms: float) -> None:
+        sketch = self.by_ring.get(ring)
+        if sketch is None:
+            sketch = self.by_ring[ring] = DDSketch(self.relative_accuracy)
+        sketch.add(latency_ms)
+        self.by_ring[ALL_RINGS].add(latency_ms)
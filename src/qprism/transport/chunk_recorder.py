@@ -0,0 +1,86 @@
+import time
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+CHUNK_KINDS = ("request", "headers", "data", "reset")
+REQUEST, HEADERS, DATA, RESET = range(len(CHUNK_KINDS))
+
+# tile_id, zoom, stream_id, kind, t_us, bytes
+ChunkColumns = Tuple[List[str], List[int], List[int], List[str], List[int], List[int]]
+# tile_id, zoom, stream_id of one opened stream
+StreamKey = Tuple[str, int, int]
+
+class ChunkRecorder:
+    """Preallocated ring buffer of per-stream byte events.
+
+    record() writes four preallocated slots and never allocates, so it can sit
+    on every DATA frame. drain() hands back everything recorded since the last
+    drain; if more than capacity events piled up, the oldest are overwritten
+    and counted in dropped. A stream's key lives in its ChunkStream and in the
+    slots of its events, so the recorder holds at most capacity of them.
+    """
+    def __init__(self, capacity: int = 1 << 16) -> None:
+        if capacity <= 0:
+            raise ValueError(f"capacity must be positive: {capacity}")
+        self.capacity = capacity
+        self._t_ns = np.zeros(capacity, dtype=np.int64)
+        self._key: List[Optional[StreamKey]] = [None] * capacity
+        self._size = np.zeros(capacity, dtype=np.int64)
+        self._kind = np.zeros(capacity, dtype=np.uint8)
+        self._head = 0 # Events ever recorded
+        self._tail = 0 # First event not drained yet
+        self.dropped = 0
+
+    def open(self, tile_id: str, zoom: int, stream_id: int = -1) -> "ChunkStream":
+        return ChunkStream(self, (tile_id, zoom, stream_id))
+
+    def record(self, key: StreamKey, kind: int, size: int = 0) -> None:
+        i = self._head % self.capacity
+        self._t_ns[i] = time.monotonic_ns()
+        self._key[i] = key
+        self._kind[i] = kind
+        self._size[i] = size
+        self._head += 1
+
+    @property
+    def pending(self) -> int:
+        return min(self._head - self._tail, self.capacity)
+
+    def drain(self, t0_ns: int = 0) -> ChunkColumns:
+        """Undrained events in record order, timestamps in microseconds since t0_ns."""
+        n = self._head - self._tail
+        if n > self.capacity:
+            self.dropped += n - self.capacity
+            self._tail = self._head - self.capacity
+        idx = np.arange(self._tail, self._head) % self.capacity
+        self._tail = self._head
+        streams = [self._key[i] for i in idx.tolist()]
+        return (
+            [s[0] for s in streams],
+            [s[1] for s in streams],
+            [s[2] for s in streams],
+            [CHUNK_KINDS[k] for k in self._kind[idx].tolist()],
+            ((self._t_ns[idx] - t0_ns) // 1000).tolist(),
+            self._size[idx].tolist(),
+        )
+
+class ChunkStream:
+    """One tile request's view of a ChunkRecorder."""
+    __slots__ = ("recorder", "key")
+
+    def __init__(self, recorder: ChunkRecorder, key: StreamKey) -> None:
+        self.recorder = recorder
+        self.key = key
+
+    def request(self) -> None:
+        self.recorder.record(self.key, REQUEST)
+
+    def headers(self) -> None:
+        self.recorder.record(self.key, HEADERS)
+
+    def data(self, size: int) -> None:
+        self.recorder.record(self.key, DATA, size)
+
+    def reset(self) -> None:
+        self.recorder.record(self.key, RESET)
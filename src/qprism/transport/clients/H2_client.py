@@ -1,7 +1,15 @@
 from typing import Optional
 import httpx
 
-async def fetch_tile_h2(base_url: str, tile_path: str, *, client: Optional[httpx.AsyncClient] = None) -> bytes:
+from qprism.transport.chunk_recorder import ChunkStream
+
+async def fetch_tile_h2(
+    base_url: str,
+    tile_path: str,
+    *,
+    client: Optional[httpx.AsyncClient] = None,
+    chunks: Optional[ChunkStream] = None,
+) -> bytes:
     close_client = False
     if client is None:
         client = httpx.AsyncClient(http2=True, timeout=30.0)
@@ -9,9 +17,23 @@ async def fetch_tile_h2(base_url: str, tile_path: str, *, client: Optional[httpx
 
     try:
         url = base_url.rstrip("/") + "/" + tile_path.lstrip("/")
-        r = await client.get(url)
-        r.raise_for_status()
-        return r.content
+        if chunks is None:
+            r = await client.get(url)
+            r.raise_for_status()
+            return r.content
+        chunks.request()
+        async with client.stream("GET", url) as r:
+            chunks.headers()
+            r.raise_for_status()
+            body = bytearray()
+            seen = 0
+            async for part in r.aiter_bytes():
+                body += part
+                # Wire bytes, before any content-encoding is undone
+                if r.num_bytes_downloaded > seen:
+                    chunks.data(r.num_bytes_downloaded - seen)
+                    seen = r.num_bytes_downloaded
+            return bytes(body)
     finally:
         if close_client:
             await client.aclose()
@@ -1,15 +1,16 @@
 from aioquic.asyncio.client import connect
 from aioquic.quic.configuration import QuicConfiguration
+from qprism.transport.chunk_recorder import ChunkStream
 from .H3_util import H3BaseClient, build_client_config, make_h3_headers
 
-async def fetch_tile_h3( server: str, port: int, tile_path: str, *, config: QuicConfiguration | None = None) -> bytes:
+async def fetch_tile_h3( server: str, port: int, tile_path: str, *, config: QuicConfiguration | None = None, chunks: ChunkStream | None = None) -> bytes:
     cfg = config or build_client_config()
     cfg.verify_mode = False
     headers = make_h3_headers(server, tile_path)
     proto_holder = []
 
     def create_protocol(*a, **k):
-        proto = H3BaseClient(*a, request_headers=headers, **k)
+        proto = H3BaseClient(*a, request_headers=headers, chunks=chunks, **k)
         proto_holder.append(proto)
         return proto
 
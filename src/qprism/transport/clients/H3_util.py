@@ -5,7 +5,9 @@ from aioquic.asyncio.protocol import QuicConnectionProtocol
 from aioquic.h3.connection import H3Connection, H3_ALPN
 from aioquic.h3.events import DataReceived, HeadersReceived
 from aioquic.quic.configuration import QuicConfiguration
-from aioquic.quic.events import HandshakeCompleted
+from aioquic.quic.events import HandshakeCompleted, StreamReset
+
+from qprism.transport.chunk_recorder import ChunkStream
 
 Headers = List[Tuple[bytes, bytes]]
 
@@ -31,7 +33,7 @@ def make_h3_headers(server: str, path: str, extra: Optional[Headers] = None) ->
     return hdrs
 
 class H3BaseClient(QuicConnectionProtocol):
-    def __init__(self, *args, request_headers: Headers, **kwargs):
+    def __init__(self, *args, request_headers: Headers, chunks: Optional[ChunkStream] = None, **kwargs):
         super().__init__(*args, **kwargs)
         self._h3 = H3Connection(self._quic)
         self._request_sent: bool = False
@@ -40,21 +42,24 @@ class H3BaseClient(QuicConnectionProtocol):
         self._body = bytearray()
         self._status: Optional[int] = None
         self._stream_id: Optional[int] = None
-
-    def connection_made(self, transport):
-        super().connection_made(transport)
-        self._stream_id = self._quic.get_next_available_stream_id(is_unidirectional=False)
-        self._h3.send_headers(self._stream_id, self._req_headers, end_stream=True)
+        self._chunks = chunks
 
     def quic_event_received(self, event):
+        # Sent once, after the handshake, so the response arrives on a single stream
         if isinstance(event, HandshakeCompleted) and not self._request_sent:
             self._request_sent = True
             self._stream_id = self._quic.get_next_available_stream_id(is_unidirectional=False)
             self._h3.send_headers(self._stream_id, self._req_headers, end_stream=True)
+            if self._chunks is not None:
+                self._chunks.request()
             self.transmit()
+        if isinstance(event, StreamReset) and event.stream_id == self._stream_id and self._chunks is not None:
+            self._chunks.reset()
 
         for http_event in self._h3.handle_event(event):
             if isinstance(http_event, HeadersReceived):
+                if self._chunks is not None:
+                    self._chunks.headers()
                 for k, v in http_event.headers:
                     if k == b":status":
                         try:
@@ -63,6 +68,8 @@ class H3BaseClient(QuicConnectionProtocol):
                             self._status = None
             elif isinstance(http_event, DataReceived):
                 self._body += http_event.data
+                if self._chunks is not None and http_event.data:
+                    self._chunks.data(len(http_event.data))
                 if http_event.stream_ended:
                     self._done.set()
 
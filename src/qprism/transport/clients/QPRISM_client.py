@@ -1,6 +1,7 @@
 from __future__ import annotations
 from aioquic.asyncio.client import connect
 from aioquic.quic.configuration import QuicConfiguration
+from qprism.transport.chunk_recorder import ChunkStream
 from .H3_util import H3BaseClient, build_client_config, make_h3_headers
 
 def _priority_value(urgency: int, incremental: bool) -> bytes:
@@ -8,7 +9,7 @@ def _priority_value(urgency: int, incremental: bool) -> bytes:
     s = f"u={u}" + (", i" if incremental else "")
     return s.encode()
 
-async def fetch_tile_qprism( server: str, port: int, tile_path: str, *, urgency: int = 0, incremental: bool = False, config: QuicConfiguration | None = None ) -> bytes:
+async def fetch_tile_qprism( server: str, port: int, tile_path: str, *, urgency: int = 0, incremental: bool = False, config: QuicConfiguration | None = None, chunks: ChunkStream | None = None ) -> bytes:
     cfg = config or build_client_config()
     cfg.verify_mode = False
     extra = [(b"priority", _priority_value(urgency, incremental))]
@@ -16,7 +17,7 @@ async def fetch_tile_qprism( server: str, port: int, tile_path: str, *, urgency:
     proto_holder: dict[str, H3BaseClient] = {}
 
     def make_proto(*a, **k):
-        p = H3BaseClient(*a, request_headers=headers, **k)
+        p = H3BaseClient(*a, request_headers=headers, chunks=chunks, **k)
         proto_holder["p"] = p
         return p
 
@@ -12,7 +12,9 @@ from aioquic.quic.events import (
     StreamReset,
 )
 
+from qprism.transport.chunk_recorder import ChunkRecorder, ChunkStream
 from qprism.transport.server_shim.mb_tiles_mixin import MbTilesMixin
+from qprism.transport.server_shim.server_stats import ServerStats
 
 Headers = List[Tuple[bytes, bytes]]
 CHUNK_BYTES = 16 * 1024
@@ -24,7 +26,14 @@ def _headers_to_dict(headers: Headers) -> Dict[bytes, bytes]:
 
 
 class BaseH3Shim(QuicConnectionProtocol, MbTilesMixin):
-    def __init__(self, *args, mbtiles_path: str = "", **kwargs):
+    def __init__(
+        self,
+        *args,
+        mbtiles_path: str = "",
+        chunk_recorder: Optional[ChunkRecorder] = None,
+        server_stats: Optional[ServerStats] = None,
+        **kwargs,
+    ):
         QuicConnectionProtocol.__init__(self, *args, **kwargs)
         default_path = Path("data/tiles/united_states_of_america.mbtiles")
         MbTilesMixin.__init__(self, Path(mbtiles_path) if mbtiles_path else default_path)
@@ -32,12 +41,34 @@ class BaseH3Shim(QuicConnectionProtocol, MbTilesMixin):
         self._http: Optional[H3Connection] = None
         self._cancelled: set[int] = set()
         self._tasks: Dict[int, asyncio.Task] = {}
+        # Shared by every connection of a server, one stream per admitted request
+        self._chunk_recorder = chunk_recorder
+        self._chunks: Dict[int, ChunkStream] = {}
+        self._stats = server_stats
+        if server_stats is not None:
+            server_stats.connections += 1
+            server_stats.open_connections += 1
+
+    def _open_chunks(self, stream_id: int, headers: Headers) -> None:
+        if self._chunk_recorder is None:
+            return
+        try:
+            z, x, y = self._parse_tile_path(_headers_to_dict(headers).get(b":path", b"/").decode(errors="ignore"))
+        except ValueError:
+            return
+        chunks = self._chunks[stream_id] = self._chunk_recorder.open(f"{x}_{y}", z, stream_id)
+        chunks.request()
 
     def _is_cancelled(self, stream_id: int) -> bool:
         return stream_id in self._cancelled
 
     def _mark_cancelled(self, stream_id: int) -> None:
+        if self._stats is not None and stream_id not in self._cancelled:
+            self._stats.cancelled += 1
         self._cancelled.add(stream_id)
+        chunks = self._chunks.pop(stream_id, None)
+        if chunks is not None:
+            chunks.reset()
 
         task = self._tasks.pop(stream_id, None)
         if task is not None:
@@ -50,6 +81,9 @@ class BaseH3Shim(QuicConnectionProtocol, MbTilesMixin):
         for t in list(self._tasks.values()):
             t.cancel()
         self._tasks.clear()
+        self._chunks.clear()
+        if self._stats is not None:
+            self._stats.open_connections -= 1
 
         if self._db is not None:
             asyncio.create_task(self._db.close())
@@ -81,6 +115,7 @@ class BaseH3Shim(QuicConnectionProtocol, MbTilesMixin):
         mv = memoryview(data)
         n = len(mv)
         off = 0
+        chunks = self._chunks.get(stream_id)
 
         while off < n:
             if self._is_cancelled(stream_id):
@@ -88,6 +123,10 @@ class BaseH3Shim(QuicConnectionProtocol, MbTilesMixin):
             end = min(off + CHUNK_BYTES, n)
             self._http.send_data(stream_id, mv[off:end].tobytes(), end_stream=(end == n))
             self.transmit()
+            if chunks is not None:
+                chunks.data(end - off)
+            if self._stats is not None:
+                self._stats.bytes_sent += end - off
             off = end
             await asyncio.sleep(0)
 
@@ -95,6 +134,8 @@ class BaseH3Shim(QuicConnectionProtocol, MbTilesMixin):
         if self._http is None or self._is_cancelled(stream_id):
             return
 
+        if self._stats is not None:
+            self._stats.active += 1
         try:
             h = _headers_to_dict(headers)
             method = h.get(b":method", b"GET").decode(errors="ignore")
@@ -117,7 +158,12 @@ class BaseH3Shim(QuicConnectionProtocol, MbTilesMixin):
                 return
 
             self._http.send_headers(stream_id, self._response_headers_for(data))
+            chunks = self._chunks.get(stream_id)
+            if chunks is not None:
+                chunks.headers()
             await self._send_tile_bytes(stream_id, data)
+            if self._stats is not None and not self._is_cancelled(stream_id):
+                self._stats.served += 1
 
         except asyncio.CancelledError:
             return
@@ -126,7 +172,10 @@ class BaseH3Shim(QuicConnectionProtocol, MbTilesMixin):
                 self._http.send_headers(stream_id, [(b":status", b"404")], end_stream=True)
                 self.transmit()
         finally:
+            if self._stats is not None:
+                self._stats.active -= 1
             self._tasks.pop(stream_id, None)
+            self._chunks.pop(stream_id, None)
             self._cancelled.discard(stream_id)
 
     def _admit_request(self, stream_id: int, headers: Headers) -> None:
@@ -136,6 +185,7 @@ class BaseH3Shim(QuicConnectionProtocol, MbTilesMixin):
         if isinstance(event, HeadersReceived):
             if self._is_cancelled(event.stream_id) or event.stream_id in self._tasks:
                 return
+            self._open_chunks(event.stream_id, event.headers)
             self._admit_request(event.stream_id, event.headers)
 
     def quic_event_received(self, event: QuicEvent) -> None:
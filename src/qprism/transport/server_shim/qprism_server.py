@@ -19,6 +19,9 @@ class QPRISMServer(BaseH3Shim):
     def connection_lost(self, exc):
         if self._worker:
             self._worker.cancel()
+        if self._stats is not None:
+            # Requests still waiting are dropped with the connection
+            self._stats.queued -= self._q.qsize()
         super().connection_lost(exc)
 
     def _extract_urgency(self, headers: List[Tuple[bytes, bytes]]) -> int:
@@ -37,10 +40,14 @@ class QPRISMServer(BaseH3Shim):
     def _admit_request(self, stream_id: int, headers: List[Tuple[bytes, bytes]]) -> None:
         u = self._extract_urgency(headers)
         self._q.put_nowait(_QueuedReq(sort_key=u, stream_id=stream_id, headers=headers))
+        if self._stats is not None:
+            self._stats.queued += 1
 
     async def _serve_queue(self) -> None:
         while True:
             req = await self._q.get()
+            if self._stats is not None:
+                self._stats.queued -= 1
             if self._is_cancelled(req.stream_id):
                 continue
             self._tasks[req.stream_id] = asyncio.create_task(
@@ -0,0 +1,25 @@
+from dataclasses import asdict, dataclass
+from typing import Dict
+
+@dataclass(slots=True)
+class ServerStats:
+    """Counters shared by every connection of one server.
+
+    queued counts requests admitted but waiting in a QPRISM priority queue,
+    active those being read or sent; their sum is the server's queue depth.
+    Everything runs on the server's event loop, so plain ints are enough.
+    """
+    connections: int = 0
+    open_connections: int = 0
+    queued: int = 0
+    active: int = 0
+    served: int = 0
+    cancelled: int = 0
+    bytes_sent: int = 0
+
+    @property
+    def depth(self) -> int:
+        return self.queued + self.active
+
+    def snapshot(self) -> Dict[str, int]:
+        return asdict(self)
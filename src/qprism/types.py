@@ -11,6 +11,23 @@ class Tile:
     def __repr__(self):
         return f"Tile({self.x}, {self.y}, z={self.z})"
 
+@dataclass(frozen=True, slots=True)
+class ViewportGeometry:
+    """Client viewport in CSS pixels plus the display's device pixel ratio.
+
+    The viewport covers width_px * device_pixel_ratio device pixels and each
+    tile is drawn at tile_size_px device pixels, so a 3x phone or a 4K
+    desktop needs several times the tiles of the 800x600 default.
+    """
+    width_px: int = 800
+    height_px: int = 600
+    device_pixel_ratio: float = 1.0
+    tile_size_px: int = 256
+
+    def half_extent_tiles(self) -> tuple[float, float]:
+        scale = self.device_pixel_ratio / self.tile_size_px
+        return self.width_px * scale / 2.0, self.height_px * scale / 2.0
+
 class Ring(int, Enum):
     R0 = 0
     R1 = 1
@@ -21,6 +38,7 @@ class SchedulerVariant(str, Enum):
     HTTP2_DEFAULT = "http2_default"
     HTTTP3_DEFAULT = "http3_default"
     QPRISM_FULL = "qprism_full" 
+    QPRISM_DEADLINE = "qprism_deadline"
     QPRISM_PRIORITY_ONLY = "qprism_priority_only"
     QPRISM_CANCEL_ONLY = "qprism_cancel_only"
 
@@ -42,3 +60,16 @@ class TileCompletion:
     cancelled: bool = False
     bytes_transferred: Optional[int] = None
 
+@dataclass(slots=True)
+class SchedulerFrame:
+    frame_idx: int
+    t_ms: int
+    candidates: int
+    loaded: int
+    cancelled: int
+    cpu_ns: int
+    wall_ns: int
+    # Paced replay only: how far behind its trace time the frame ran, and how much of that the event loop added
+    lateness_us: Optional[int] = None
+    loop_lag_us: Optional[int] = None
+
@@ -1,26 +1,35 @@
 import math
-from typing import List, Tuple
-from qprism.types import TileRequest, TileCompletion, Ring
+from typing import Callable, Iterable, Iterator, List, Optional, Sequence, Set, Tuple, Union
+from qprism.types import Tile, TileRequest, TileCompletion, Ring, ViewportGeometry
 from qprism.viewport import model
+from qprism.viewport.prepared import PreparedTrace, as_prepared
 from qprism.viewport.traces import TracePoint
 
-def generate_tile_requests(trace: List[TracePoint]) -> List[TileRequest]:
+TraceLike = Union[Sequence[TracePoint], PreparedTrace]
+
+def _prepared_sorted(trace: TraceLike, geometry: Optional[ViewportGeometry] = None) -> PreparedTrace:
+    if isinstance(trace, PreparedTrace):
+        return as_prepared(trace, geometry)
+    return as_prepared(sorted(trace, key=lambda tp: tp.t_ms), geometry)
+
+def generate_tile_requests(trace: TraceLike, geometry: Optional[ViewportGeometry] = None) -> List[TileRequest]:
     # Comverts list of points (our trace) and returns the tile requests
+    prepared = as_prepared(trace, geometry)
 
     requests: List[TileRequest] = []
     requested_tiles = set()
-    prev_visible = set()
-    for i, tp in enumerate(trace):
-        visible = model.visible_tile_coords(tp.lat, tp.lon, tp.zoom)
-        new_tiles = visible if i == 0 else (visible - prev_visible)
-        for (tx, ty) in sorted(new_tiles):
-            tile_key = (tp.zoom, tx, ty)
+    for i, tp in enumerate(prepared.trace):
+        new_tiles = prepared.entered[i]
+        if not new_tiles:
+            continue
+        x_float, y_float = model.latlon_to_tile(tp.lat, tp.lon, tp.zoom)
+        cx = math.floor(x_float)
+        cy = math.floor(y_float)
+        for tile_key in sorted(new_tiles):
             if tile_key in requested_tiles:
                 continue
-            x_float, y_float = model.latlon_to_tile(tp.lat, tp.lon, tp.zoom)
-            cx = math.floor(x_float)
-            cy = math.floor(y_float)
-    
+            _z, tx, ty = tile_key
+
             dx = abs(tx -cx)
             dy = abs(ty - cy)
 
@@ -30,48 +39,251 @@ def generate_tile_requests(trace: List[TracePoint]) -> List[TileRequest]:
             req = TileRequest(tile_id=tile_id, zoom=tp.zoom, ring=ring, requested_at_ms=tp.t_ms)
             requests.append(req)
             requested_tiles.add(tile_key)
-        prev_visible = visible
 
     requests.sort(key=lambda r: r.requested_at_ms)
     return requests
 
-def compute_completeness(trace: List[TracePoint], tile_completions: List[TileCompletion]) -> List[Tuple[int, float]]:
-    completeness_series: List[Tuple[int, float]] = []
-    trace = sorted(trace, key=lambda tp: tp.t_ms)
-    completions = sorted(tile_completions, key=lambda tc: tc.completed_at_ms)
-    needed_tiles = set()
-    loaded_tiles = set()
-    comp_idx = 0
+TileKey = Tuple[int, int, int]
+Sample = Tuple[int, float]
+
+def _tile_key(tc: TileCompletion) -> Optional[TileKey]:
+    tx_str, sep, ty_str = tc.tile_id.partition('_')
+    if not sep:
+        return None
+    try:
+        return (tc.zoom, int(tx_str), int(ty_str))
+    except ValueError:
+        return None
+
+class CompletenessState:
+    """Incremental viewport completeness.
+
+    Needed tiles change by the per-frame enter/leave deltas and loaded tiles
+    are a client cache (a tile loaded once counts whenever it is visible), so
+    every update costs O(delta) instead of rebuilding the sets.
+
+    With parent_weight > 0, a needed tile that is not loaded but has a loaded
+    overzoomed parent (up to parent_levels up) counts as that fraction of a tile.
+    """
+    def __init__(self, parent_weight: float = 0.0, parent_levels: int = 1) -> None:
+        self.parent_weight = parent_weight
+        self.parent_levels = parent_levels
+        self.needed: Set[TileKey] = set()
+        self.loaded: Set[TileKey] = set()
+        self.covered: Set[TileKey] = set()
+        self.loaded_needed = 0
+
+    def _has_loaded_parent(self, key: TileKey) -> bool:
+        z, x, y = key
+        return any((z - d, x >> d, y >> d) in self.loaded for d in range(1, self.parent_levels + 1))
+
+    @property
+    def missing(self) -> int:
+        # loaded_needed counts needed tiles already loaded, so this stays O(1)
+        return len(self.needed) - self.loaded_needed
+
+    @property
+    def fraction(self) -> float:
+        if not self.needed:
+            return 1.0
+        return (self.loaded_needed + self.parent_weight * len(self.covered)) / len(self.needed)
+
+    def apply_frame(self, entered: Iterable[TileKey], left: Iterable[TileKey]) -> None:
+        for key in left:
+            self.needed.discard(key)
+            if key in self.loaded:
+                self.loaded_needed -= 1
+            else:
+                self.covered.discard(key)
+        for key in entered:
+            self.needed.add(key)
+            if key in self.loaded:
+                self.loaded_needed += 1
+            elif self.parent_weight > 0.0 and self._has_loaded_parent(key):
+                self.covered.add(key)
+
+    def add_loaded(self, key: TileKey) -> bool:
+        """Record a loaded tile, True if the completeness fraction changed."""
+        if key in self.loaded:
+            return False
+        self.loaded.add(key)
+        changed = False
+        if key in self.needed:
+            self.loaded_needed += 1
+            self.covered.discard(key)
+            changed = True
+        if self.parent_weight > 0.0:
+            z, x, y = key
+            for d in range(1, self.parent_levels + 1):
+                span = 1 << d
+                for cx in range(x << d, (x << d) + span):
+                    for cy in range(y << d, (y << d) + span):
+                        child = (z + d, cx, cy)
+                        if child in self.needed and child not in self.loaded and child not in self.covered:
+                            self.covered.add(child)
+                            changed = True
+        return changed
+
+def iter_completeness(
+    trace: TraceLike,
+    tile_completions: Iterable[TileCompletion],
+    parent_weight: float = 0.0,
+    parent_levels: int = 1,
+    sample_hz: Optional[float] = None,
+    geometry: Optional[ViewportGeometry] = None,
+) -> Iterator[Sample]:
+    """Viewport completeness samples in a single merge pass over frames and completions.
+
+    A sample is emitted at every frame and at every completion that changes
+    the fraction; completions at a frame's timestamp count before that frame.
+    With sample_hz the series is resampled onto a uniform grid instead.
+    """
+    prepared = _prepared_sorted(trace, geometry)
+    samples = _iter_events(prepared, tile_completions, parent_weight, parent_levels)
+    if sample_hz:
+        return resample_completeness(samples, sample_hz)
+    return samples
 
-    if trace:
-        tp = trace[0]
-        needed_tiles = {(tp.zoom, x, y) for (x,y) in model.visible_tile_coords(tp.lat, tp.lon, tp.zoom)}
-        loaded_tiles.clear()
-        initial_frac = 1.0 if not needed_tiles else 0.0
-        completeness_series.append((tp.t_ms, initial_frac))
+def _iter_events(
+    prepared: PreparedTrace,
+    tile_completions: Iterable[TileCompletion],
+    parent_weight: float,
+    parent_levels: int,
+) -> Iterator[Sample]:
+    frames = prepared.trace
+    if not frames:
+        return
+    completions = sorted(
+        (tc for tc in tile_completions if not tc.cancelled), key=lambda tc: tc.completed_at_ms
+    )
+    state = CompletenessState(parent_weight, parent_levels)
+    state.apply_frame(prepared.entered[0], prepared.left[0])
+    yield (frames[0].t_ms, state.fraction)
 
-    for v_idx in range(1, len(trace) + 1):
-        next_view_time = trace[v_idx].t_ms if v_idx < len(trace) else None
-        while comp_idx < len(completions) and (next_view_time is None or completions[comp_idx].completed_at_ms <= next_view_time):
+    comp_idx = 0
+    for v_idx in range(1, len(frames) + 1):
+        next_view_time = frames[v_idx].t_ms if v_idx < len(frames) else None
+        while comp_idx < len(completions) and (
+            next_view_time is None or completions[comp_idx].completed_at_ms <= next_view_time
+        ):
             tc = completions[comp_idx]
             comp_idx += 1
-            try:
-                tx_str, ty_str = tc.tile_id.split('_')
-                tx_i, ty_i = int(tx_str), int(ty_str)
-            except ValueError:
-                continue
-            tile_key = (tc.zoom, tx_i,ty_i)
-            if tile_key in needed_tiles and not tc.cancelled:
-                loaded_tiles.add(tile_key)
-                frac = 1.0 if not needed_tiles else len(loaded_tiles) / len(needed_tiles)
-                completeness_series.append((tc.completed_at_ms, frac))
-            if next_view_time is not None:
-                tp_next = trace[v_idx]
-                needed_tiles = {(tp_next.zoom, x, y) for (x, y) in model.visible_tile_coords(tp_next.lat, tp_next.lon, tp_next.zoom)}
-                loaded_tiles = {t for t in loaded_tiles if t in needed_tiles}
-                frac = 1.0 if not needed_tiles else len(loaded_tiles) / len(needed_tiles)
-                completeness_series.append((tp_next.t_ms, frac))
-        completeness_series.sort(key=lambda x: x[0])
-    return completeness_series
-        
+            key = _tile_key(tc)
+            if key is not None and state.add_loaded(key):
+                yield (tc.completed_at_ms, state.fraction)
+        if next_view_time is not None:
+            state.apply_frame(prepared.entered[v_idx], prepared.left[v_idx])
+            yield (next_view_time, state.fraction)
+
+class _SampleGrid:
+    """Push-based hold-last-value resampling onto a uniform grid, finish() emits the held tail."""
+    def __init__(self, sample_hz: float, emit: Callable[[int, float], None]) -> None:
+        self.period_ms = 1000.0 / sample_hz
+        self.emit = emit
+        self.grid_t: Optional[float] = None
+        self.last: Optional[Sample] = None
+
+    def push(self, t: int, frac: float) -> None:
+        if self.grid_t is None:
+            self.grid_t = float(t)
+        while self.last is not None and self.grid_t < t:
+            self.emit(int(round(self.grid_t)), self.last[1])
+            self.grid_t += self.period_ms
+        self.last = (t, frac)
+
+    def finish(self) -> None:
+        if self.last is not None and self.grid_t is not None and self.grid_t <= self.last[0]:
+            self.emit(int(round(self.grid_t)), self.last[1])
+            self.grid_t += self.period_ms
+
+def resample_completeness(samples: Iterable[Sample], sample_hz: float) -> Iterator[Sample]:
+    """Hold-last-value resampling of a time-ordered series onto a uniform grid."""
+    out: List[Sample] = []
+    grid = _SampleGrid(sample_hz, lambda t, frac: out.append((t, frac)))
+    for t, frac in samples:
+        grid.push(t, frac)
+        yield from out
+        out.clear()
+    grid.finish()
+    yield from out
+
+def compute_completeness(
+    trace: TraceLike,
+    tile_completions: Iterable[TileCompletion],
+    parent_weight: float = 0.0,
+    parent_levels: int = 1,
+    sample_hz: Optional[float] = None,
+    geometry: Optional[ViewportGeometry] = None,
+) -> List[Sample]:
+    """Viewport completeness over time, see iter_completeness."""
+    return list(iter_completeness(trace, tile_completions, parent_weight, parent_levels, sample_hz, geometry))
+
+class LiveCompleteness:
+    """Completeness tracked while a run is in progress.
+
+    The runner calls advance() as it moves to each frame and record() from the
+    fetch completion callbacks; schedulers read fraction, missing_r0_count
+    and missing_r0().
+    Every change is passed to on_sample, with timestamps clamped so the
+    streamed series never goes back in time. With sample_hz, normally
+    BaseConfig.viewport_sample_hz, the series is resampled onto that grid as
+    it streams and finish() emits the last held sample at the end of a run.
+    """
+    def __init__(
+        self,
+        prepared: PreparedTrace,
+        parent_weight: float = 0.0,
+        parent_levels: int = 1,
+        on_sample: Optional[Callable[[int, float], None]] = None,
+        sample_hz: Optional[float] = None,
+    ) -> None:
+        self.prepared = prepared
+        self.state = CompletenessState(parent_weight, parent_levels)
+        self.on_sample = on_sample
+        self.frame_idx = -1
+        self._last_t: Optional[int] = None
+        self._grid = _SampleGrid(sample_hz, on_sample) if sample_hz and on_sample is not None else None
+
+    @property
+    def fraction(self) -> float:
+        return self.state.fraction
+
+    @property
+    def missing_r0_count(self) -> int:
+        return self.state.missing
+
+    def missing_r0(self) -> List[Tile]:
+        """Visible tiles of the current frame that have not loaded yet."""
+        loaded = self.state.loaded
+        return [Tile(x, y, z) for (z, x, y) in self.state.needed if (z, x, y) not in loaded]
+
+    def _emit(self, t_ms: int) -> None:
+        if self._last_t is not None and t_ms < self._last_t:
+            t_ms = self._last_t
+        self._last_t = t_ms
+        if self._grid is not None:
+            self._grid.push(t_ms, self.state.fraction)
+        elif self.on_sample is not None:
+            self.on_sample(t_ms, self.state.fraction)
+
+    def finish(self) -> None:
+        if self._grid is not None:
+            self._grid.finish()
+
+    def advance(self, frame_idx: int, t_ms: Optional[int] = None) -> None:
+        # t_ms is when the frame was actually shown, by default its trace time
+        if frame_idx <= self.frame_idx:
+            return
+        for i in range(self.frame_idx + 1, frame_idx + 1):
+            self.state.apply_frame(self.prepared.entered[i], self.prepared.left[i])
+        self.frame_idx = frame_idx
+        self._emit(int(self.prepared.trace[frame_idx].t_ms if t_ms is None else t_ms))
 
+    def record(self, tc: TileCompletion) -> bool:
+        if tc.cancelled:
+            return False
+        key = _tile_key(tc)
+        if key is None or not self.state.add_loaded(key):
+            return False
+        self._emit(int(tc.completed_at_ms))
+        return True
@@ -1,40 +1,125 @@
 import math
-import mercantile
+from typing import NamedTuple, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+from qprism.types import ViewportGeometry
+from qprism.viewport.qtrace import trace_columns
 
 TILE_SIZE_PX = 256 # Tile size in pixels
+DEFAULT_GEOMETRY = ViewportGeometry(800, 600, 1.0, TILE_SIZE_PX)
+MAX_LATITUDE = 85.0511287798066 # Web mercator cuts the poles off here
+_EPSILON = 1e-14
 
-def latlon_to_tile(lat: float, lon: float, zoom: int) -> tuple[float, float]:
-    # Converts lat long into EPSG:3857 aka web mercator projection
-    tile = mercantile.tile(lon, lat, zoom)
-    return float(tile.x), float(tile.y)
+class TileRanges(NamedTuple):
+    """Per-frame visible tile ranges, one array element per frame.
 
-def visible_tile_coords(lat: float, lon: float, zoom: int, viewport_height_px: int = 600, viewport_width_px: int = 800) -> set:
+    x ranges are unwrapped (may run past the antimeridian), y ranges are
+    clipped to the world. x_center/y_center keep the fractional tile position.
     """
-    Takes a viewport center and computes the set of tile coordinates that are visible
+    x_min: np.ndarray
+    x_max: np.ndarray
+    y_min: np.ndarray
+    y_max: np.ndarray
+    zoom: np.ndarray
+    x_center: np.ndarray
+    y_center: np.ndarray
 
-    The logic comes from the web Mercator "worl pixel" model from the slippy /xyz tiling scheme as used by OSM, Mapbox, and leaflet. 
-    """
-    x_center, y_center = latlon_to_tile(lat, lon, zoom)
-    global_px_x = x_center * TILE_SIZE_PX
-    global_px_y = y_center * TILE_SIZE_PX
-
-    half_w = viewport_width_px / 2.0
-    half_h = viewport_height_px / 2.0
-    left_px = global_px_x - half_w
-    right_px = global_px_x + half_w
-    top_px = global_px_y - half_h
-    bottom_px = global_px_y + half_h
-
-    x_min = math.floor(left_px / TILE_SIZE_PX)
-    y_min = math.floor(top_px / TILE_SIZE_PX)
-    x_max = math.floor(right_px / TILE_SIZE_PX)
-    y_max = math.floor(bottom_px / TILE_SIZE_PX)
+def latlon_to_tile_frac_array(lat, lon, zoom) -> Tuple[np.ndarray, np.ndarray]:
+    """Fractional EPSG:3857 tile coordinates, vectorized over NumPy arrays."""
+    lat = np.clip(np.asarray(lat, dtype=np.float64), -MAX_LATITUDE, MAX_LATITUDE)
+    lon = np.asarray(lon, dtype=np.float64)
+    n = np.exp2(np.asarray(zoom, dtype=np.float64))
+    x = (lon + 180.0) / 360.0 * n
+    y = (1.0 - np.arcsinh(np.tan(np.radians(lat))) / math.pi) / 2.0 * n
+    return x, y
+
+def tile_frac_to_latlon_array(x, y, zoom) -> Tuple[np.ndarray, np.ndarray]:
+    """Inverse of latlon_to_tile_frac_array, returns (lat, lon)."""
+    n = np.exp2(np.asarray(zoom, dtype=np.float64))
+    lon = np.asarray(x, dtype=np.float64) / n * 360.0 - 180.0
+    lat = np.degrees(np.arctan(np.sinh(math.pi * (1.0 - 2.0 * np.asarray(y, dtype=np.float64) / n))))
+    return lat, lon
+
+def latlon_to_tile_frac(lat: float, lon: float, zoom: int) -> tuple[float, float]:
+    # Scalar version of latlon_to_tile_frac_array, the per-frame hot paths don't want NumPy overhead
+    lat = max(-MAX_LATITUDE, min(MAX_LATITUDE, lat))
+    n = float(1 << zoom)
+    x = (lon + 180.0) / 360.0 * n
+    y = (1.0 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2.0 * n
+    return x, y
+
+def latlon_to_tile(lat: float, lon: float, zoom: int) -> tuple[float, float]:
+    # Converts lat long into the EPSG:3857 aka web mercator tile containing it
+    x, y = latlon_to_tile_frac(lat, lon, zoom)
+    n = 1 << zoom
+    tx = min(n - 1, max(0, math.floor(x + _EPSILON * n)))
+    ty = min(n - 1, max(0, math.floor(y + _EPSILON * n)))
+    return float(tx), float(ty)
 
+def _geometry(
+    geometry: Optional[ViewportGeometry], viewport_height_px: int, viewport_width_px: int
+) -> ViewportGeometry:
+    if geometry is not None:
+        return geometry
+    return ViewportGeometry(viewport_width_px, viewport_height_px, 1.0, TILE_SIZE_PX)
+
+def visible_tile_ranges(
+    lat,
+    lon,
+    zoom,
+    viewport_height_px: int = 600,
+    viewport_width_px: int = 800,
+    geometry: Optional[ViewportGeometry] = None,
+) -> TileRanges:
+    """Visible tile ranges for whole arrays of viewport centers at once."""
+    zoom = np.asarray(zoom, dtype=np.int64)
+    x_center, y_center = latlon_to_tile_frac_array(lat, lon, zoom)
+    half_w, half_h = _geometry(geometry, viewport_height_px, viewport_width_px).half_extent_tiles()
+    n = np.left_shift(1, zoom)
+    x_min = np.floor(x_center - half_w).astype(np.int64)
+    x_max = np.floor(x_center + half_w).astype(np.int64)
+    y_min = np.maximum(np.floor(y_center - half_h).astype(np.int64), 0)
+    y_max = np.minimum(np.floor(y_center + half_h).astype(np.int64), n - 1)
+    return TileRanges(x_min, x_max, y_min, y_max, zoom, x_center, y_center)
+
+def trace_tile_ranges(
+    trace: Sequence,
+    viewport_height_px: int = 600,
+    viewport_width_px: int = 800,
+    geometry: Optional[ViewportGeometry] = None,
+) -> TileRanges:
+    _t_ms, lat, lon, zoom = trace_columns(trace)
+    return visible_tile_ranges(lat, lon, zoom, viewport_height_px, viewport_width_px, geometry)
+
+def tiles_in_range(x_min: int, x_max: int, y_min: int, y_max: int, zoom: int) -> Set[Tuple[int, int]]:
+    # Expands one frame's range, wrapping x around the antimeridian
+    n = 1 << zoom
     visible_tiles = set()
-    for ty in range(y_min, y_max + 1):
-        if 0 <= ty < 2 ** zoom:
-            for tx in range(x_min, x_max+1):
-                n = 2 ** zoom
-                tx_mod = ((tx % n) + n) % n
-                visible_tiles.add((tx_mod, ty))
+    for ty in range(max(0, y_min), min(n - 1, y_max) + 1):
+        for tx in range(x_min, x_max + 1):
+            visible_tiles.add((tx % n, ty))
     return visible_tiles
+
+def visible_tile_coords(
+    lat: float,
+    lon: float,
+    zoom: int,
+    viewport_height_px: int = 600,
+    viewport_width_px: int = 800,
+    geometry: Optional[ViewportGeometry] = None,
+) -> set:
+    """
+    Takes a viewport center and computes the set of tile coordinates that are visible
+
+    The logic comes from the web Mercator "worl pixel" model from the slippy /xyz tiling scheme as used by OSM, Mapbox, and leaflet.
+    """
+    x_center, y_center = latlon_to_tile_frac(lat, lon, zoom)
+    half_w, half_h = _geometry(geometry, viewport_height_px, viewport_width_px).half_extent_tiles()
+    return tiles_in_range(
+        math.floor(x_center - half_w),
+        math.floor(x_center + half_w),
+        math.floor(y_center - half_h),
+        math.floor(y_center + half_h),
+        zoom,
+    )
@@ -0,0 +1,234 @@
+import hashlib
+from collections import OrderedDict
+from dataclasses import astuple, dataclass, field, fields
+from pathlib import Path
+from typing import Any, Callable, FrozenSet, Iterator, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from qprism.scheduler.rings import Viewport, viewport_from_visible
+from qprism.types import ViewportGeometry
+from qprism.viewport import model
+from qprism.viewport.qtrace import ColumnarTrace, iter_points, open_qtrace, trace_columns
+from qprism.viewport.traces import TracePoint, load_trace
+
+TileXY = Tuple[int, int]
+TileKey = Tuple[int, int, int]
+
+_CACHE_SIZE = 8
+# Frames each per-frame sequence keeps built, enough for runs and load clients a few seconds apart
+_FRAME_CACHE_SIZE = 256
+_cache: "OrderedDict[Tuple[str, ViewportGeometry], PreparedTrace]" = OrderedDict()
+
+AnyTrace = Union[Sequence[TracePoint], ColumnarTrace]
+
+def trace_fingerprint(trace: AnyTrace) -> str:
+    t_ms, lat, lon, zoom = trace_columns(trace)
+    h = hashlib.sha1()
+    # Fixed dtypes so JSON and .qtrace copies of a trace hash the same
+    h.update(np.ascontiguousarray(t_ms, dtype=np.int64).tobytes())
+    h.update(np.ascontiguousarray(lat, dtype=np.float64).tobytes())
+    h.update(np.ascontiguousarray(lon, dtype=np.float64).tobytes())
+    h.update(np.ascontiguousarray(zoom, dtype=np.int64).tobytes())
+    return h.hexdigest()
+
+def _open_trace(trace_path: Union[str, Path]) -> AnyTrace:
+    # .qtrace stays memory-mapped, PreparedTrace only reads the frames it is asked for
+    if str(trace_path).endswith(".qtrace"):
+        return open_qtrace(trace_path)
+    return load_trace(str(trace_path))
+
+class _Frames(Sequence):
+    """Read-only per-frame sequence, each item built on first access and kept in a bounded LRU."""
+    __slots__ = ("_n", "_at", "_built", "_size")
+
+    def __init__(self, n: int, at: Callable[[int], Any], size: int = _FRAME_CACHE_SIZE) -> None:
+        self._n = n
+        self._at = at
+        self._built: "OrderedDict[int, Any]" = OrderedDict()
+        self._size = size
+
+    def __len__(self) -> int:
+        return self._n
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(self._n))]
+        if i < 0:
+            i += self._n
+        built = self._built
+        if i in built:
+            built.move_to_end(i)
+            return built[i]
+        if not 0 <= i < self._n:
+            raise IndexError(f"frame index out of range: {i}")
+        item = built[i] = self._at(i)
+        if len(built) > self._size:
+            built.popitem(last=False)
+        return item
+
+@dataclass
+class PreparedTrace:
+    """Per-frame viewport state of a trace, computed once and shared.
+
+    visible[i] holds frame i's visible (x, y) tiles at trace[i].zoom, viewports[i]
+    its Viewport (None when nothing is visible), and entered[i]/left[i] the
+    (z, x, y) keys that became visible/invisible since frame i-1. Only the
+    tile ranges are kept for the whole trace and a .qtrace trace stays
+    memory-mapped; a frame's sets and Viewport are built the first time any
+    consumer reads it and the most recent frames stay cached for the others.
+    """
+    trace: AnyTrace
+    ranges: model.TileRanges
+    geometry: ViewportGeometry = model.DEFAULT_GEOMETRY
+    fingerprint: str = ""
+    visible: Sequence[FrozenSet[TileXY]] = field(init=False, repr=False)
+    viewports: Sequence[Optional[Viewport]] = field(init=False, repr=False)
+    entered: Sequence[FrozenSet[TileKey]] = field(init=False, repr=False)
+    left: Sequence[FrozenSet[TileKey]] = field(init=False, repr=False)
+    _keys: Sequence[FrozenSet[TileKey]] = field(init=False, repr=False)
+    _deltas: Sequence[Tuple[FrozenSet[TileKey], FrozenSet[TileKey]]] = field(init=False, repr=False)
+
+    def __post_init__(self) -> None:
+        n = len(self.trace)
+        self.visible = _Frames(n, self._visible_at)
+        self.viewports = _Frames(n, self._viewport_at)
+        self._keys = _Frames(n, self._keys_at)
+        self._deltas = _Frames(n, self._delta)
+        self.entered = _Frames(n, lambda i: self._deltas[i][0])
+        self.left = _Frames(n, lambda i: self._deltas[i][1])
+
+    def __len__(self) -> int:
+        return len(self.trace)
+
+    def points(self) -> Iterator[TracePoint]:
+        """Frames in order, copied out of a .qtrace mapping one chunk at a time."""
+        if isinstance(self.trace, ColumnarTrace):
+            return iter_points(self.trace)
+        return iter(self.trace)
+
+    def _range(self, i: int) -> Tuple[int, int, int, int, int]:
+        r = self.ranges
+        return int(r.x_min[i]), int(r.x_max[i]), int(r.y_min[i]), int(r.y_max[i]), int(r.zoom[i])
+
+    def _visible_at(self, i: int) -> FrozenSet[TileXY]:
+        return frozenset(model.tiles_in_range(*self._range(i)))
+
+    def _viewport_at(self, i: int) -> Optional[Viewport]:
+        x_min, x_max, y_min, y_max, z = self._range(i)
+        if x_max < x_min or max(0, y_min) > min((1 << z) - 1, y_max):
+            return None
+        if x_min >= 0 and x_max < (1 << z):
+            return (x_min, x_max, y_min, y_max, z)
+        # Wrapped around the antimeridian, keep viewport_from_visible's semantics
+        return viewport_from_visible(self.visible[i], z)
+
+    def keys(self, i: int) -> FrozenSet[TileKey]:
+        return self._keys[i]
+
+    def _keys_at(self, i: int) -> FrozenSet[TileKey]:
+        z = self._range(i)[4]
+        return frozenset((z, x, y) for (x, y) in self.visible[i])
+
+    def _delta(self, i: int) -> Tuple[FrozenSet[TileKey], FrozenSet[TileKey]]:
+        if i == 0:
+            return self.keys(0), frozenset()
+        if self._range(i) == self._range(i - 1):
+            return frozenset(), frozenset()
+        prev, keys = self.keys(i - 1), self.keys(i)
+        return keys - prev, prev - keys
+
+    def save(self, path: Union[str, Path]) -> Path:
+        path = Path(path)
+        r = self.ranges
+        np.savez(
+            path,
+            fingerprint=np.array(self.fingerprint),
+            geometry=np.array(astuple(self.geometry), dtype=np.float64),
+            x_min=r.x_min, x_max=r.x_max, y_min=r.y_min, y_max=r.y_max,
+            zoom=r.zoom, x_center=r.x_center, y_center=r.y_center,
+        )
+        return path
+
+    @classmethod
+    def load(cls, path: Union[str, Path], trace: AnyTrace) -> Optional["PreparedTrace"]:
+        """Load a saved preparation, None if it was made for another trace or geometry."""
+        with np.load(Path(path)) as data:
+            fingerprint = str(data["fingerprint"])
+            if fingerprint != trace_fingerprint(trace):
+                return None
+            saved = data["geometry"]
+            if len(saved) != len(fields(ViewportGeometry)):
+                # Written before device pixel ratio and tile size were recorded
+                return None
+            width, height, dpr, tile_size = (float(v) for v in saved)
+            geometry = ViewportGeometry(int(width), int(height), dpr, int(tile_size))
+            ranges = model.TileRanges(*(data[f] for f in model.TileRanges._fields))
+        return cls(trace, ranges, geometry, fingerprint)
+
+def prepared_path_for(trace_path: Union[str, Path], geometry: ViewportGeometry = model.DEFAULT_GEOMETRY) -> Path:
+    trace_path = Path(trace_path)
+    g = geometry
+    return trace_path.with_name(
+        f"{trace_path.stem}.{g.width_px}x{g.height_px}@{g.device_pixel_ratio:g}x{g.tile_size_px}.prepared.npz"
+    )
+
+def prepare_trace(
+    trace: AnyTrace,
+    geometry: Optional[ViewportGeometry] = None,
+) -> PreparedTrace:
+    """Prepare a trace, memoized on its content and viewport geometry."""
+    geometry = geometry or model.DEFAULT_GEOMETRY
+    fingerprint = trace_fingerprint(trace)
+    key = (fingerprint, geometry)
+    cached = _lookup(key)
+    if cached is not None:
+        return cached
+    ranges = model.trace_tile_ranges(trace, geometry=geometry)
+    prepared = PreparedTrace(trace if isinstance(trace, ColumnarTrace) else list(trace), ranges, geometry, fingerprint)
+    _remember(key, prepared)
+    return prepared
+
+def _lookup(key: Tuple[str, ViewportGeometry]) -> Optional[PreparedTrace]:
+    cached = _cache.get(key)
+    if cached is not None:
+        _cache.move_to_end(key)
+    return cached
+
+def _remember(key: Tuple[str, ViewportGeometry], prepared: PreparedTrace) -> None:
+    _cache[key] = prepared
+    while len(_cache) > _CACHE_SIZE:
+        _cache.popitem(last=False)
+
+def load_prepared_trace(
+    trace_path: Union[str, Path],
+    geometry: Optional[ViewportGeometry] = None,
+    save: bool = False,
+) -> PreparedTrace:
+    """Load a trace file and its preparation, reusing a saved sidecar next to the trace."""
+    geometry = geometry or model.DEFAULT_GEOMETRY
+    trace = _open_trace(trace_path)
+    key = (trace_fingerprint(trace), geometry)
+    cached = _lookup(key)
+    if cached is not None:
+        return cached
+    sidecar = prepared_path_for(trace_path, geometry)
+    if sidecar.is_file():
+        loaded = PreparedTrace.load(sidecar, trace)
+        if loaded is not None and loaded.geometry == geometry:
+            _remember(key, loaded)
+            return loaded
+    prepared = prepare_trace(trace, geometry)
+    if save:
+        prepared.save(sidecar)
+    return prepared
+
+def as_prepared(
+    trace: Union[AnyTrace, PreparedTrace],
+    geometry: Optional[ViewportGeometry] = None,
+) -> PreparedTrace:
+    if isinstance(trace, PreparedTrace):
+        if geometry is not None and trace.geometry != geometry:
+            raise ValueError(f"Trace was prepared for {trace.geometry}, not {geometry}")
+        return trace
+    return prepare_trace(trace, geometry)
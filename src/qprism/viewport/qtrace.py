@@ -0,0 +1,156 @@
+import os
+import struct
+from pathlib import Path
+from typing import Iterator, List, Sequence, Tuple, Union, overload
+
+import numpy as np
+
+from qprism.viewport.traces import TracePoint, load_json_trace
+
+# .qtrace layout: 16 byte header, then one contiguous little-endian block per column
+#   header  magic b"QTRC", u2 version, u2 reserved, u8 frame count
+#   t_ms    i8[n]   sorted ascending
+#   lat     f8[n]
+#   lon     f8[n]
+#   zoom    u1[n]
+MAGIC = b"QTRC"
+VERSION = 1
+_HEADER = struct.Struct("<4sHHQ")
+_COLUMNS: Tuple[Tuple[str, str], ...] = (("t_ms", "<i8"), ("lat", "<f8"), ("lon", "<f8"), ("zoom", "u1"))
+
+Columns = Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]
+PathLike = Union[str, Path]
+
+class ColumnarTrace:
+    """A .qtrace file mapped into memory, one NumPy array per column.
+
+    Indexing gives TracePoints, slicing gives a ColumnarTrace view; nothing
+    is read from disk until a page is touched.
+    """
+    def __init__(self, t_ms: np.ndarray, lat: np.ndarray, lon: np.ndarray, zoom: np.ndarray) -> None:
+        self.t_ms = t_ms
+        self.lat = lat
+        self.lon = lon
+        self.zoom = zoom
+
+    def __len__(self) -> int:
+        return len(self.t_ms)
+
+    @overload
+    def __getitem__(self, i: int) -> TracePoint: ...
+    @overload
+    def __getitem__(self, i: slice) -> "ColumnarTrace": ...
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return ColumnarTrace(self.t_ms[i], self.lat[i], self.lon[i], self.zoom[i])
+        return TracePoint(
+            t_ms=int(self.t_ms[i]), lat=float(self.lat[i]), lon=float(self.lon[i]), zoom=int(self.zoom[i])
+        )
+
+    def __iter__(self) -> Iterator[TracePoint]:
+        return iter_points(self)
+
+    def columns(self) -> Columns:
+        return self.t_ms, self.lat, self.lon, self.zoom
+
+def _column_offsets(n: int) -> List[Tuple[str, str, int]]:
+    offsets = []
+    offset = _HEADER.size
+    for name, dtype in _COLUMNS:
+        offsets.append((name, dtype, offset))
+        offset += n * np.dtype(dtype).itemsize
+    return offsets
+
+def _read_header(path: Path) -> int:
+    with path.open("rb") as f:
+        raw = f.read(_HEADER.size)
+    if len(raw) < _HEADER.size:
+        raise ValueError(f"Truncated qtrace header: {path}")
+    magic, version, _reserved, n = _HEADER.unpack(raw)
+    if magic != MAGIC:
+        raise ValueError(f"Not a qtrace file: {path}")
+    if version != VERSION:
+        raise ValueError(f"Unsupported qtrace version {version}: {path}")
+    _name, dtype, last = _column_offsets(n)[-1]
+    expected = last + n * np.dtype(dtype).itemsize
+    if path.stat().st_size != expected:
+        raise ValueError(f"qtrace size mismatch, expected {expected} bytes: {path}")
+    return n
+
+def open_qtrace(path: PathLike) -> ColumnarTrace:
+    path = Path(path)
+    if not path.is_file():
+        raise FileNotFoundError(f'Could not find trace file: {path}')
+    n = _read_header(path)
+    if n == 0:
+        return ColumnarTrace(*(np.empty(0, dtype=dtype) for _name, dtype in _COLUMNS))
+    cols = [
+        np.memmap(path, dtype=dtype, mode="r", offset=offset, shape=(n,))
+        for _name, dtype, offset in _column_offsets(n)
+    ]
+    return ColumnarTrace(*cols)
+
+def write_qtrace(path: PathLike, t_ms, lat, lon, zoom) -> Path:
+    """Write columns as a .qtrace file, sorted by t_ms."""
+    path = Path(path)
+    t_ms = np.asarray(t_ms, dtype="<i8")
+    lat = np.asarray(lat, dtype="<f8")
+    lon = np.asarray(lon, dtype="<f8")
+    zoom = np.asarray(zoom)
+    n = len(t_ms)
+    if not (len(lat) == len(lon) == len(zoom) == n):
+        raise ValueError("qtrace columns must have the same length")
+    if n and (zoom.min() < 0 or zoom.max() > 255):
+        raise ValueError("qtrace zoom levels must fit in a byte")
+    order = np.argsort(t_ms, kind="stable")
+    tmp = path.with_name(path.name + ".tmp")
+    with tmp.open("wb") as f:
+        f.write(_HEADER.pack(MAGIC, VERSION, 0, n))
+        for col, (_name, dtype) in zip((t_ms, lat, lon, zoom), _COLUMNS):
+            f.write(np.ascontiguousarray(col[order], dtype=dtype).tobytes())
+    os.replace(tmp, path)
+    return path
+
+def trace_columns(trace: Union[Sequence[TracePoint], ColumnarTrace]) -> Columns:
+    """(t_ms, lat, lon, zoom) arrays for any trace, without copying a ColumnarTrace."""
+    if isinstance(trace, ColumnarTrace):
+        return trace.columns()
+    n = len(trace)
+    return (
+        np.fromiter((tp.t_ms for tp in trace), dtype=np.int64, count=n),
+        np.fromiter((tp.lat for tp in trace), dtype=np.float64, count=n),
+        np.fromiter((tp.lon for tp in trace), dtype=np.float64, count=n),
+        np.fromiter((tp.zoom for tp in trace), dtype=np.int64, count=n),
+    )
+
+def convert_json_trace(src: PathLike, dst: Union[PathLike, None] = None) -> Path:
+    """Convert either JSON trace layout to .qtrace, next to the source by default."""
+    src = Path(src)
+    dst = Path(dst) if dst is not None else src.with_suffix(".qtrace")
+    return write_qtrace(dst, *trace_columns(load_json_trace(str(src))))
+
+def iter_chunks(trace: Union[PathLike, ColumnarTrace], chunk_frames: int = 65536) -> Iterator[Columns]:
+    """Column slices of at most chunk_frames frames, copied out of the mapping."""
+    if not isinstance(trace, ColumnarTrace):
+        trace = open_qtrace(trace)
+    for start in range(0, len(trace), chunk_frames):
+        stop = start + chunk_frames
+        yield (
+            np.array(trace.t_ms[start:stop]),
+            np.array(trace.lat[start:stop]),
+            np.array(trace.lon[start:stop]),
+            np.array(trace.zoom[start:stop]),
+        )
+
+def iter_points(trace: Union[PathLike, ColumnarTrace], chunk_frames: int = 65536) -> Iterator[TracePoint]:
+    """Stream TracePoints, holding one chunk of the file in memory at a time."""
+    for t_ms, lat, lon, zoom in iter_chunks(trace, chunk_frames):
+        for t, la, lo, z in zip(t_ms.tolist(), lat.tolist(), lon.tolist(), zoom.tolist()):
+            yield TracePoint(t_ms=t, lat=la, lon=lo, zoom=z)
+
+def iter_trace(trace_path: PathLike, chunk_frames: int = 65536) -> Iterator[TracePoint]:
+    # JSON has to be parsed whole, only .qtrace actually streams
+    if str(trace_path).endswith(".qtrace"):
+        return iter_points(trace_path, chunk_frames)
+    return iter(load_json_trace(str(trace_path)))
@@ -0,0 +1,133 @@
+import json
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+
+import numpy as np
+
+from qprism.viewport import model
+from qprism.viewport.qtrace import Columns, write_qtrace
+
+GESTURES = ("pan", "fling", "zoom", "pause")
+_PAN, _FLING, _ZOOM, _PAUSE = range(len(GESTURES))
+_FLING_DECAY = 4.0
+
+@dataclass
+class SynthConfig:
+    """Session shape shared by every synthesized user.
+
+    bbox is (min_lon, min_lat, max_lon, max_lat); gesture_weights follow GESTURES.
+    """
+    bbox: Tuple[float, float, float, float] = (-105.3, 39.5, -104.6, 40.1)
+    duration_s: float = 60.0
+    fps: int = 60
+    min_zoom: int = 10
+    max_zoom: int = 17
+    start_zoom: int = 14
+    gesture_weights: Tuple[float, float, float, float] = (0.45, 0.15, 0.2, 0.2)
+    viewport_tiles: float = 3.0 # Viewport width in tiles, sets pan/fling distances
+
+def _world_bbox(cfg: SynthConfig) -> Tuple[float, float, float, float]:
+    # Zoom-0 world units; y grows southwards so max_lat gives the smaller y
+    min_lon, min_lat, max_lon, max_lat = cfg.bbox
+    x0, y1 = model.latlon_to_tile_frac_array(min_lat, min_lon, 0)
+    x1, y0 = model.latlon_to_tile_frac_array(max_lat, max_lon, 0)
+    return float(x0), float(x1), float(y0), float(y1)
+
+def _gesture_plan(rng: np.random.Generator, cfg: SynthConfig) -> np.ndarray:
+    """Per-gesture rows of (kind, t_start_ms, t_end_ms, x0, y0, x1, y1, z0, z1)."""
+    wx0, wx1, wy0, wy1 = _world_bbox(cfg)
+    weights = np.asarray(cfg.gesture_weights, dtype=np.float64)
+    weights = weights / weights.sum()
+    duration_ms = cfg.duration_s * 1000.0
+
+    x, y = rng.uniform(wx0, wx1), rng.uniform(wy0, wy1)
+    z = int(np.clip(cfg.start_zoom, cfg.min_zoom, cfg.max_zoom))
+    t = 0.0
+    rows: List[Tuple[float, ...]] = []
+    while t < duration_ms:
+        kind = int(rng.choice(len(GESTURES), p=weights))
+        step = cfg.viewport_tiles / float(1 << z)
+        angle = rng.uniform(0.0, 2.0 * np.pi)
+        nx, ny, nz = x, y, z
+        if kind == _PAN:
+            length = rng.uniform(300.0, 1500.0)
+            dist = step * rng.uniform(0.2, 1.2)
+        elif kind == _FLING:
+            length = rng.uniform(600.0, 1500.0)
+            dist = step * rng.uniform(2.0, 6.0)
+        elif kind == _ZOOM:
+            length = rng.uniform(250.0, 600.0)
+            dist = step * rng.uniform(0.0, 0.3) # Zooming towards a point drifts the center
+            nz = int(np.clip(z + rng.choice((-2, -1, 1, 1, 2)), cfg.min_zoom, cfg.max_zoom))
+        else:
+            length = rng.uniform(500.0, 4000.0)
+            dist = 0.0
+        nx = float(np.clip(x + dist * np.cos(angle), wx0, wx1))
+        ny = float(np.clip(y + dist * np.sin(angle), wy0, wy1))
+        rows.append((kind, t, t + length, x, y, nx, ny, z, nz))
+        x, y, z = nx, ny, nz
+        t += length
+    return np.asarray(rows, dtype=np.float64)
+
+def _render(plan: np.ndarray, cfg: SynthConfig) -> Columns:
+    """Evaluate every gesture at the frame times in one vectorized pass."""
+    period_ms = 1000.0 / cfg.fps
+    t = np.arange(0.0, cfg.duration_s * 1000.0, period_ms)
+    seg = np.searchsorted(plan[:, 1], t, side="right") - 1
+    kind, t0, t1, x0, y0, x1, y1, z0, z1 = (plan[seg, c] for c in range(plan.shape[1]))
+    p = np.clip((t - t0) / np.maximum(t1 - t0, 1e-9), 0.0, 1.0)
+
+    smooth = p * p * (3.0 - 2.0 * p)
+    fling = (1.0 - np.exp(-_FLING_DECAY * p)) / (1.0 - np.exp(-_FLING_DECAY))
+    ease = np.where(kind == _FLING, fling, smooth)
+    x = x0 + (x1 - x0) * ease
+    y = y0 + (y1 - y0) * ease
+    # Discrete zoom levels, the switch happens halfway through the pinch
+    zoom = np.where(p < 0.5, z0, z1).astype(np.int64)
+
+    lat, lon = model.tile_frac_to_latlon_array(x, y, 0)
+    return np.rint(t).astype(np.int64), lat, lon, zoom
+
+def synthesize_session(rng: np.random.Generator, cfg: SynthConfig) -> Tuple[Columns, Dict[str, int]]:
+    plan = _gesture_plan(rng, cfg)
+    counts = np.bincount(plan[:, 0].astype(np.int64), minlength=len(GESTURES))
+    return _render(plan, cfg), {name: int(c) for name, c in zip(GESTURES, counts)}
+
+def synthesize_traces(
+    out_dir: Union[str, Path],
+    n_sessions: int,
+    cfg: Optional[SynthConfig] = None,
+    seed: int = 0,
+) -> Path:
+    """Write n_sessions .qtrace files plus a manifest.json describing them.
+
+    Session i draws from its own child of SeedSequence(seed), so a session
+    is the same regardless of how many others are generated with it.
+    """
+    cfg = cfg or SynthConfig()
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    sessions = []
+    for i, child in enumerate(np.random.SeedSequence(seed).spawn(n_sessions)):
+        columns, gestures = synthesize_session(np.random.default_rng(child), cfg)
+        name = f"session_{i:05d}.qtrace"
+        write_qtrace(out_dir / name, *columns)
+        t_ms = columns[0]
+        sessions.append({
+            "file": name,
+            "session": i,
+            "frames": int(len(t_ms)),
+            "duration_ms": int(t_ms[-1]) if len(t_ms) else 0,
+            "zoom_range": [int(columns[3].min()), int(columns[3].max())] if len(t_ms) else None,
+            "gestures": gestures,
+        })
+    manifest = {
+        "format": "qtrace",
+        "seed": seed,
+        "config": asdict(cfg),
+        "sessions": sessions,
+    }
+    path = out_dir / "manifest.json"
+    path.write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+    return path
@@ -9,22 +9,37 @@ class TracePoint:
     lon: float
     zoom: int
 
-def load_trace(trace_path: str):
+def _point_from_json(pt) -> TracePoint:
+    # Two layouts: {"t_ms", "lat", "lon", "zoom"} and generate_trace.py's {"t_ms", "center_lon_lat", "zoom"}
+    if all(k in pt for k in ("t_ms", "lat", "lon", "zoom")):
+        lat, lon = pt['lat'], pt['lon']
+    elif all(k in pt for k in ("t_ms", "center_lon_lat", "zoom")):
+        lon, lat = pt['center_lon_lat']
+    else:
+        raise ValueError(f"Trace point is missing required fields: {pt}")
+    return TracePoint(
+        t_ms = int(pt['t_ms']),
+        lat = float(lat),
+        lon = float(lon),
+        zoom = int(pt['zoom'])
+    )
+
+def load_json_trace(trace_path: str):
     if not os.path.isfile(trace_path):
         raise FileNotFoundError(f'Could not find trace file: {trace_path}')
     with open(trace_path, 'r') as f:
         points = json.load(f)
+    if isinstance(points, dict):
+        if "frames" not in points:
+            raise ValueError(f"Trace file has no frames: {trace_path}")
+        points = points["frames"]
 
-    trace = []
-    for pt in points:
-        if all(k in pt for k in ("t_ms", "lat", "lon", "zoom")):
-            trace.append(TracePoint(
-                t_ms = int(pt['t_ms']),
-                lat = float(pt['lat']),
-                lon = float(pt['lon']),
-                zoom = int(pt['zoom'])
-            ))
-        else:
-            raise ValueError(f"Trace point is missing required fields: {pt}")
+    trace = [_point_from_json(pt) for pt in points]
     trace.sort(key=lambda p: p.t_ms)
     return trace
+
+def load_trace(trace_path: str):
+    if str(trace_path).endswith(".qtrace"):
+        from qprism.viewport.qtrace import open_qtrace
+        return list(open_qtrace(trace_path))
+    return load_json_trace(trace_path)
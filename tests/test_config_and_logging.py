@@ -36,6 +36,15 @@ def test_load_experiment_config_h2_default() -> None:
     assert cfg.runs > 0
     assert cfg.seed_base >= 0
 
+def test_experiment_replay_speed() -> None:
+    import pytest
+    cfg = load_experiment_config(Path(__file__).parent.parent / "src/qprism/configs/experiments/qprism_full.yaml")
+    assert cfg.replay_speed == 1.0
+    data = {"name": "x", "scheduler_variant": "qprism_full", "netem_profile": "low_loss", "trace_path": "t.json"}
+    assert ExperimentConfig.from_dict({**data, "replay_speed": 0}).replay_speed == 0.0
+    with pytest.raises(ValueError):
+        ExperimentConfig.from_dict({**data, "replay_speed": -1})
+
 def test_configure_logging_and_get_logger(capsys) -> None:
     configure_logging()
     logger = get_logger("qprism.test.config")
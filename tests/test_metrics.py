@@ -19,3 +19,187 @@ def test_fairness_gaurd():
     r0 = [(0, 100), (200, 300)]
     nonr0 = [50, 250, 400]
     assert metrics.fairness_gaurd_rate(r0, nonr0) == 1.0
+
+def test_fairness_sweep_matches_brute_force():
+    import random
+
+    rng = random.Random(11)
+    for _ in range(50):
+        r0 = [(s, s + rng.randint(0, 40)) for s in (rng.randint(0, 500) for _ in range(rng.randint(1, 20)))]
+        requests = [rng.randint(-10, 560) for _ in range(rng.randint(0, 60))]
+        before = list(r0)
+        brute = sum(1 for t in requests if any(s <= t <= e for s, e in r0)) / len(r0)
+        assert metrics.fairness_gaurd_rate(r0, requests) == brute
+        assert r0 == before
+
+        outer = [(s, s + rng.randint(0, 60)) for s in requests]
+        covered = {t for s, e in r0 for t in range(s, e)}
+        overlap = metrics.fairness_overlap(r0, outer)
+        assert overlap["overlap_ms"] == sum(1 for s, e in outer for t in range(s, e) if t in covered)
+        assert overlap["r0_ms"] == len(covered)
+        outer_cover = {t for s, e in outer for t in range(s, e)}
+        assert overlap["r0_overlapped_ms"] == len(covered & outer_cover)
+    assert metrics.fairness_overlap([], [(0, 10)])["r0_overlapped_fraction"] is None
+
+def test_sql_run_metrics_match_python(tmp_path):
+    import random
+    from pathlib import Path
+    import pytest
+    from qprism.config import ExperimentConfig
+    from qprism.experiments.analysis import compute_all_run_metrics, compute_run_metrics
+    from qprism.logging_sink.duckdb_logger import DuckDBLogger
+    from qprism.types import Ring, TileCompletion, TileRequest
+
+    exp = ExperimentConfig(
+        name="sql", scheduler_variant="qprism_full", netem_profile="low_loss",
+        trace_path=Path("trace.json"), runs=2, seed_base=0,
+    )
+    rng = random.Random(3)
+    expected = {}
+    with DuckDBLogger(tmp_path / "m.duckdb") as ddb:
+        for run_idx in range(2):
+            run_id = ddb.log_run(exp, run_idx=run_idx)
+            samples = [(t, rng.choice([0.0, 0.5, 0.99, 1.0])) for t in range(0, 3000, 50)]
+            for t, c in samples:
+                ddb.log_viewport_sample(run_id, t, c)
+            r0, nonr0, outer, cancelled = [], [], [], 0
+            for i in range(40):
+                ring = Ring(rng.randint(0, 3))
+                req = rng.randint(0, 2000)
+                done = req + rng.randint(1, 300)
+                is_cancelled = rng.random() < 0.2
+                cancelled += is_cancelled
+                ddb.log_tile_requested(run_id, TileRequest(f"{i}_0", 14, ring, req))
+                ddb.log_tile_completed(run_id, TileCompletion(f"{i}_0", 14, ring, req, done, is_cancelled, 100))
+                if ring == Ring.R0:
+                    r0.append((req, done))
+                else:
+                    nonr0.append(req)
+                    outer.append((req, done))
+            expected[run_id] = {
+                "ttfv": metrics.time_to_first_viewport(samples),
+                "vss": metrics.viewport_stall_seconds(samples),
+                "cancel_ratio": cancelled / 40,
+                "fairness_gaurd_rate": metrics.fairness_gaurd_rate(r0, nonr0),
+                "fairness_overlap_ms": metrics.fairness_overlap(r0, outer)["overlap_ms"],
+            }
+        rows = compute_all_run_metrics(ddb.conn)
+        assert [r["run_id"] for r in rows] == sorted(expected)
+        for row in rows:
+            for key, value in expected[row["run_id"]].items():
+                assert row[key] == pytest.approx(value), key
+            assert row["p50"] <= row["p95"] <= row["p99"]
+        single = compute_run_metrics(ddb.conn, rows[1]["run_id"])
+        assert "run_id" not in single and single["vss"] == rows[1]["vss"]
+        with pytest.raises(KeyError):
+            compute_run_metrics(ddb.conn, 999)
+
+def test_materialized_run_metrics_only_compute_new_runs(tmp_path):
+    from pathlib import Path
+    from qprism.config import ExperimentConfig
+    from qprism.experiments.analysis import (
+        compute_all_run_metrics, invalidate_run_metrics, materialized_run_metrics, refresh_run_metrics,
+    )
+    from qprism.logging_sink.duckdb_logger import DuckDBLogger
+    from qprism.types import Ring, TileCompletion, TileRequest
+
+    exp = ExperimentConfig(
+        name="mat", scheduler_variant="qprism_full", netem_profile="low_loss",
+        trace_path=Path("trace.json"), runs=1, seed_base=0,
+    )
+    def log_run(ddb, done_at):
+        run_id = ddb.log_run(exp)
+        ddb.log_tile_requested(run_id, TileRequest("0_0", 14, Ring.R0, 0))
+        ddb.log_tile_completed(run_id, TileCompletion("0_0", 14, Ring.R0, 0, done_at, False, 10))
+        ddb.log_viewport_samples(run_id, [(0, 0.0), (done_at, 1.0)])
+        return run_id
+
+    with DuckDBLogger(tmp_path / "m.duckdb") as ddb:
+        first = log_run(ddb, 40)
+        ddb.finish_run(first)
+        ddb.finish_run(log_run(ddb, 80))
+        assert refresh_run_metrics(ddb.conn) == 2
+        assert refresh_run_metrics(ddb.conn) == 0
+        # A run still logging is not materialized until it finishes
+        third = log_run(ddb, 120)
+        assert refresh_run_metrics(ddb.conn) == 0
+        ddb.finish_run(third)
+        assert refresh_run_metrics(ddb.conn) == 1
+        rows = materialized_run_metrics(ddb.conn)
+        assert rows == compute_all_run_metrics(ddb.conn)
+        assert [r["ttfv"] for r in rows] == [40, 80, 120]
+
+        # Changed events are picked up once the run is invalidated
+        ddb.conn.execute("UPDATE viewport_samples SET ts_ms = 60 WHERE run_id = ? AND ts_ms = 40", [first])
+        invalidate_run_metrics(ddb.conn, [first])
+        assert refresh_run_metrics(ddb.conn) == 1
+        assert materialized_run_metrics(ddb.conn)[0]["ttfv"] == 60
+        # Other parameters make every row stale
+        assert refresh_run_metrics(ddb.conn, threshold=0.5) == 3
+
+def test_ddsketch_accuracy_merge_and_serialization():
+    import random
+    import pytest
+    from qprism.sketch import DDSketch
+
+    rng = random.Random(5)
+    values = [rng.lognormvariate(4.0, 1.0) for _ in range(20000)] + [0.0] * 50
+    whole = DDSketch(relative_accuracy=0.01)
+    parts = [DDSketch(relative_accuracy=0.01) for _ in range(4)]
+    for i, v in enumerate(values):
+        whole.add(v)
+        parts[i % 4].add(v)
+    merged = parts[0]
+    for p in parts[1:]:
+        merged.merge(DDSketch.from_bytes(p.to_bytes()))
+
+    ordered = sorted(values)
+    for q in (0.01, 0.5, 0.95, 0.99):
+        exact = ordered[int(q * (len(ordered) - 1))]
+        assert whole.quantile(q) == pytest.approx(exact, rel=0.0101, abs=1e-9)
+        assert merged.quantile(q) == pytest.approx(whole.quantile(q))
+    assert merged.count == whole.count == len(values)
+    assert len(whole.positive) < 1000
+    assert DDSketch().quantile(0.5) is None
+    with pytest.raises(ValueError):
+        whole.merge(DDSketch(relative_accuracy=0.05))
+
+    bounded = DDSketch(relative_accuracy=0.01, max_bins=64)
+    bounded.extend(values)
+    assert len(bounded.positive) <= 64
+    # Overflowing collapses in a batch, down to 90% of max_bins
+    batch = DDSketch(relative_accuracy=0.01, max_bins=64)
+    batch.extend(float(1.05 ** i) for i in range(65))
+    assert len(batch.positive) == 57 and batch.count == 65
+    assert bounded.quantile(0.99) == pytest.approx(whole.quantile(0.99))
+
+def test_pooled_latency_percentiles_from_stored_sketches(tmp_path):
+    from pathlib import Path
+    import pytest
+    from qprism.config import ExperimentConfig
+    from qprism.experiments.analysis import pooled_latency_percentiles
+    from qprism.logging_sink.duckdb_logger import DuckDBLogger
+    from qprism.sketch import ALL_RINGS, RingSketches
+
+    pooled_values = {"a": [], "b": []}
+    with DuckDBLogger(tmp_path / "s.duckdb") as ddb:
+        for variant, base in (("a", 10), ("a", 1000), ("b", 50)):
+            exp = ExperimentConfig(
+                name="x", scheduler_variant=variant, netem_profile="low_loss",
+                trace_path=Path("t.json"), runs=1, seed_base=0,
+            )
+            run_id = ddb.log_run(exp)
+            sketches = RingSketches()
+            for i in range(100):
+                sketches.add(i % 4, base + i)
+                pooled_values[variant].append(base + i)
+            for ring, sketch in sketches.by_ring.items():
+                ddb.log_latency_sketch(run_id, ring, sketch)
+        rows = pooled_latency_percentiles(ddb.conn, group_by=("scheduler_variant",))
+        assert [(r["scheduler_variant"], r["runs"], r["count"]) for r in rows] == [("a", 2, 200), ("b", 1, 100)]
+        exact = sorted(pooled_values["a"])[int(0.5 * 199)]
+        assert rows[0]["p50"] == pytest.approx(exact, rel=0.0101)
+        ring0 = pooled_latency_percentiles(ddb.conn, group_by=(), ring=0)
+        assert ring0[0]["count"] == 75
+        with pytest.raises(KeyError):
+            pooled_latency_percentiles(ddb.conn, group_by=("run_id; DROP TABLE runs",))
@@ -3,7 +3,7 @@ import textwrap
 import pytest
 from pathlib import Path
 from qprism.config import ExperimentConfig
-from qprism.types import TileRequest, TileCompletion, Ring
+from qprism.types import TileRequest, TileCompletion, Ring, SchedulerFrame
 from qprism.logging_sink.duckdb_logger import DuckDBLogger
 from qprism.netem import profiles as netem_profiles
 from qprism.netem import controller as netem_controller
@@ -63,12 +63,52 @@ def test_duckdb_logger_integration(tmp_path):
         "SELECT run_id, tile_id, zoom, ring, requested_at, completed_at, cancelled, bytes_transferred FROM tile_completions"
     ).fetchall()
     assert comp_rows == [(run_id, "tile1", 5, 1, 100, 300, False, 5000)]
+    DDB_logger.log_scheduler_frame(run_id, SchedulerFrame(
+        frame_idx=0, t_ms=0, candidates=12, loaded=10, cancelled=1, cpu_ns=4200, wall_ns=5100
+    ))
+    DDB_logger.log_scheduler_frame(run_id, SchedulerFrame(
+        frame_idx=1, t_ms=50, candidates=0, loaded=0, cancelled=0, cpu_ns=1, wall_ns=1, lateness_us=900, loop_lag_us=40
+    ))
+    frame_rows = DDB_logger.conn.execute(
+        "SELECT run_id, frame_idx, candidates, loaded, cancelled, cpu_ns, wall_ns, lateness_us, loop_lag_us "
+        "FROM scheduler_frames ORDER BY frame_idx"
+    ).fetchall()
+    assert frame_rows == [(run_id, 0, 12, 10, 1, 4200, 5100, None, None), (run_id, 1, 0, 0, 0, 1, 1, 900, 40)]
     sample_rows = DDB_logger.conn.execute(
         "SELECT run_id, ts_ms, completeness FROM viewport_samples"
     ).fetchall()
     assert sample_rows == [(run_id, 150, pytest.approx(0.075, rel=1e-9, abs=1e-9))]
     DDB_logger.close()
 
+    # Reopening an existing database keeps its data and schema
+    with DuckDBLogger(db_file) as reopened:
+        assert reopened.conn.execute("SELECT count(*) FROM runs").fetchone() == (1,)
+
+def test_run_records_viewport_geometry(tmp_path):
+    from qprism.types import ViewportGeometry
+
+    raw = {
+        "name": "phone",
+        "scheduler_variant": "qprism_full",
+        "netem_profile": "low_loss",
+        "trace_path": "data/traces/lu_trace.json",
+    }
+    assert ExperimentConfig.from_dict(raw).viewport == ViewportGeometry()
+    exp_config = ExperimentConfig.from_dict({
+        **raw, "viewport": {"width_px": 390, "height_px": 844, "device_pixel_ratio": 3},
+    })
+    assert exp_config.viewport == ViewportGeometry(390, 844, 3.0, 256)
+    with pytest.raises(ValueError):
+        ExperimentConfig.from_dict({**raw, "viewport": {"device_pixel_ratio": 0}})
+
+    with DuckDBLogger(tmp_path / "geometry.duckdb") as ddb:
+        run_id = ddb.log_run(exp_config)
+        row = ddb.conn.execute(
+            "SELECT viewport_width_px, viewport_height_px, device_pixel_ratio, tile_size_px FROM runs WHERE run_id = ?",
+            [run_id],
+        ).fetchone()
+    assert row == (390, 844, 3.0, 256)
+
 def test_netem_profiles_loading(tmp_path):
     yaml_content = textwrap.dedent("""\
             profiles:
@@ -114,3 +154,226 @@ def test_netem_controller_commands():
     clear_cmd = netem_controller.clear(interface="lo", dry_run=True)
     assert clear_cmd == ["tc", "qdisc", "del", "dev", "lo", "root"]
     
+
+def test_buffered_logger_batches_and_flushes(tmp_path):
+    import time
+    from qprism.logging_sink.duckdb_logger import BufferedDuckDBLogger
+
+    exp_config = ExperimentConfig(
+        name="buffered", scheduler_variant="qprism_full", netem_profile="low_loss",
+        trace_path=Path("trace.json"), runs=1, seed_base=0,
+    )
+    db_file = tmp_path / "buffered.duckdb"
+    ddb = BufferedDuckDBLogger(db_file, max_batch=1000, flush_interval_s=60.0)
+    run_id = ddb.log_run(exp_config)
+    for i in range(10):
+        ddb.log_tile_requested(run_id, TileRequest(f"{i}_0", 14, Ring.R0, i))
+        ddb.log_viewport_sample(run_id, i, i / 10)
+    # A cursor is a separate connection handle, safe next to the writer thread
+    count = lambda table: ddb.conn.cursor().execute(f"SELECT count(*) FROM {table}").fetchone()[0]
+    # Below the batch size and before the interval nothing is written yet
+    assert count("tile_requests") == 0
+    ddb.flush()
+    assert count("tile_requests") == 10 and count("viewport_samples") == 10
+
+    # Reaching max_batch wakes the background writer
+    for i in range(1000):
+        ddb.log_viewport_sample(run_id, 100 + i, 1.0)
+    deadline = time.monotonic() + 5.0
+    while count("viewport_samples") < 1010 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert count("viewport_samples") == 1010
+
+    ddb.log_tile_completed(run_id, TileCompletion("0_0", 14, Ring.R0, 0, 25, False, 100))
+    ddb.close()
+    with DuckDBLogger(db_file) as reopened:
+        assert reopened.conn.execute("SELECT count(*) FROM tile_completions").fetchone() == (1,)
+
+def test_buffered_logger_raises_after_failed_write(tmp_path):
+    import time
+    from qprism.logging_sink.duckdb_logger import BufferedDuckDBLogger
+
+    exp_config = ExperimentConfig(
+        name="buffered", scheduler_variant="qprism_full", netem_profile="low_loss",
+        trace_path=Path("trace.json"), runs=1, seed_base=0,
+    )
+    ddb = BufferedDuckDBLogger(tmp_path / "failing.duckdb", max_batch=2, flush_interval_s=60.0)
+    run_id = ddb.log_run(exp_config)
+    # Same x_y at two zooms, as a zoom-fallback parent would be, is not a collision
+    ddb.log_tile_requested(run_id, TileRequest("3_5", 14, Ring.R0, 0))
+    ddb.log_tile_requested(run_id, TileRequest("3_5", 13, Ring.R0, 0))
+    ddb.flush()
+    assert ddb.conn.cursor().execute("SELECT count(*) FROM tile_requests").fetchone() == (2,)
+
+    # A real duplicate fails the background write, later calls raise instead of queueing
+    ddb.log_tile_requested(run_id, TileRequest("3_5", 14, Ring.R0, 0))
+    ddb.log_viewport_sample(run_id, 0, 1.0)
+    deadline = time.monotonic() + 5.0
+    while ddb._error is None and time.monotonic() < deadline:
+        time.sleep(0.01)
+    with pytest.raises(RuntimeError):
+        ddb.log_viewport_sample(run_id, 1, 1.0)
+    with pytest.raises(RuntimeError):
+        ddb.close()
+
+def test_columnar_ingest_keeps_types_and_nulls(tmp_path):
+    from qprism.logging_sink.duckdb_logger import BufferedDuckDBLogger
+
+    exp_config = ExperimentConfig(
+        name="columnar", scheduler_variant="qprism_full", netem_profile="low_loss",
+        trace_path=Path("trace.json"), runs=1, seed_base=0,
+    )
+    series = [(t, t / 1000) for t in range(0, 1000, 10)]
+    with DuckDBLogger(tmp_path / "direct.duckdb") as ddb:
+        run_id = ddb.log_run(exp_config)
+        ddb.log_viewport_samples(run_id, series)
+        ddb.log_viewport_samples(run_id, [])
+        assert ddb.conn.execute("SELECT count(*), max(completeness) FROM viewport_samples").fetchone() == (100, 0.99)
+
+    with BufferedDuckDBLogger(tmp_path / "buffered.duckdb", flush_interval_s=60.0) as ddb:
+        run_id = ddb.log_run(exp_config)
+        ddb.log_tile_requested(run_id, TileRequest("1_2", 14, Ring.R1, 5, deadline_ms=40))
+        ddb.log_tile_requested(run_id, TileRequest("1_3", 14, Ring.R2, 6))
+        ddb.log_tile_completed(run_id, TileCompletion("1_2", 14, Ring.R1, 5, 30, True, None))
+        ddb.log_viewport_samples(run_id, series)
+        ddb.flush()
+        assert ddb.conn.execute(
+            "SELECT tile_id, ring, requested_at, deadline_at FROM tile_requests ORDER BY tile_id"
+        ).fetchall() == [("1_2", 1, 5, 40), ("1_3", 2, 6, None)]
+        assert ddb.conn.execute(
+            "SELECT cancelled, bytes_transferred FROM tile_completions"
+        ).fetchall() == [(True, None)]
+        assert ddb.conn.execute("SELECT count(*) FROM viewport_samples").fetchone() == (100,)
+
+        from qprism.transport.chunk_recorder import ChunkRecorder
+        recorder = ChunkRecorder()
+        stream = recorder.open("1_2", 14, stream_id=4)
+        stream.headers()
+        stream.data(16384)
+        ddb.log_tile_chunks(run_id, "server", recorder.drain())
+        ddb.flush()
+        assert ddb.conn.execute(
+            "SELECT side, tile_id, stream_id, kind, bytes FROM tile_chunks ORDER BY rowid"
+        ).fetchall() == [("server", "1_2", 4, "headers", 0), ("server", "1_2", 4, "data", 16384)]
+
+def test_parquet_sink_partitions_runs_and_views(tmp_path):
+    from qprism.experiments.analysis import compute_all_run_metrics, pooled_latency_percentiles
+    from qprism.logging_sink.parquet_sink import ParquetRunLogger, open_results
+    from qprism.sketch import ALL_RINGS, DDSketch
+
+    root = tmp_path / "parquet"
+    run_ids = {}
+    # Two writers on the same root, as parallel runners would be
+    for variant in ("baseline", "qprism_full"):
+        exp_config = ExperimentConfig(
+            name="parquet/exp 1", scheduler_variant=variant, netem_profile="low_loss",
+            trace_path=Path("trace.json"), runs=1, seed_base=0,
+        )
+        with ParquetRunLogger(root, flush_interval_s=60.0) as sink:
+            run_id = run_ids[variant] = sink.log_run(exp_config)
+            sink.log_tile_requested(run_id, TileRequest("0_0", 14, Ring.R0, 0, deadline_ms=50))
+            sink.log_tile_requested(run_id, TileRequest("1_0", 14, Ring.R1, 0))
+            sink.log_tile_completed(run_id, TileCompletion("0_0", 14, Ring.R0, 0, 40, False, 10))
+            sink.log_tile_completed(run_id, TileCompletion("1_0", 14, Ring.R1, 0, 30, True, None))
+            sink.log_viewport_samples(run_id, [(0, 0.0), (40, 1.0)])
+            sketch = DDSketch()
+            sketch.add(40.0)
+            sink.log_latency_sketch(run_id, ALL_RINGS, sketch)
+    assert len(set(run_ids.values())) == 2
+    partition = root / "tile_requests" / "experiment_name=parquet%2Fexp%201" / "scheduler_variant=baseline"
+    assert list(partition.glob(f"netem_profile=low_loss/run_id={run_ids['baseline']}/*.parquet"))
+
+    conn = open_results(root)
+    assert conn.execute(
+        "SELECT scheduler_variant, experiment_name FROM runs WHERE run_id = ?", [run_ids["baseline"]]
+    ).fetchall() == [("baseline", "parquet/exp 1")]
+    assert conn.execute(
+        "SELECT count(*), count(deadline_at) FROM tile_requests WHERE scheduler_variant = 'qprism_full'"
+    ).fetchone() == (2, 1)
+    assert conn.execute("SELECT count(*) FROM scheduler_frames").fetchone() == (0,)
+    metrics = compute_all_run_metrics(conn, threshold=0.98)
+    assert sorted(m["run_id"] for m in metrics) == sorted(run_ids.values())
+    assert all(m["ttfv"] == 40 and m["cancel_ratio"] == 0.5 for m in metrics)
+    pooled = pooled_latency_percentiles(conn, group_by=("netem_profile",))
+    assert pooled[0]["runs"] == 2 and pooled[0]["count"] == 2
+
+def test_qlog_streaming_parse_finds_losses_and_retransmissions(tmp_path):
+    import json
+    from qprism.logging_sink.qlog import iter_qlog_events, qlog_rows
+
+    def sent(t, pn, offset, length=1000):
+        frames = [{"frame_type": "ack"}, {"frame_type": "stream", "stream_id": 0, "offset": offset, "length": length}]
+        return {"name": "transport:packet_sent", "time": t,
+                "data": {"frames": frames, "header": {"packet_number": pn, "packet_type": "1RTT"}}}
+    events = [
+        {"name": "recovery:metrics_updated", "time": 1000.0, "data": {"cwnd": 13500, "bytes_in_flight": 0}},
+        sent(1001.0, 1, 0),
+        sent(1002.0, 2, 1000),
+        {"name": "recovery:packet_lost", "time": 1050.0, "data": {"type": "1RTT", "packet_number": 1}},
+        sent(1051.0, 3, 0),
+        {"name": "recovery:metrics_updated", "time": 1060.0, "data": {
+            "cwnd": 6750, "bytes_in_flight": 1000, "ssthresh": 6750,
+            "latest_rtt": 48.0, "min_rtt": 40.0, "smoothed_rtt": 45.5, "rtt_variance": 3.0,
+        }},
+    ]
+    doc = {"qlog_format": "JSON", "qlog_version": "0.3", "traces": [
+        {"common_fields": {"ODCID": "ab12"}, "events": events, "vantage_point": {"type": "client"}},
+    ]}
+    path = tmp_path / "ab12.qlog"
+    path.write_text(json.dumps(doc, indent=1), encoding="utf-8")
+
+    # Tiny reads split keys and events across buffer refills
+    assert list(iter_qlog_events(path, read_chars=7)) == events
+    rows = list(qlog_rows(path, t0_ms=1000.0))
+    metrics = [row for table, row in rows if table == "qlog_metrics"]
+    assert metrics == [
+        ("ab12", 0.0, None, None, None, None, 13500, 0, None),
+        ("ab12", 60.0, 48.0, 40.0, 45.5, 3.0, 6750, 1000, 6750),
+    ]
+    loss = [row for table, row in rows if table == "qlog_loss"]
+    assert loss == [
+        ("ab12", 50.0, "lost", "1RTT", 1, None, None, None),
+        ("ab12", 51.0, "retransmit", "1RTT", 3, 0, 0, 1000),
+    ]
+
+    # Cut inside the last event
+    path.write_text(json.dumps(doc)[:-120], encoding="utf-8")
+    with pytest.raises(ValueError):
+        list(iter_qlog_events(path))
+
+    from qprism.logging_sink.duckdb_logger import BufferedDuckDBLogger
+    path.write_text(json.dumps(doc), encoding="utf-8")
+    exp_config = ExperimentConfig(
+        name="qlog", scheduler_variant="qprism_full", netem_profile="low_loss",
+        trace_path=Path("trace.json"), runs=1, seed_base=0,
+    )
+    with BufferedDuckDBLogger(tmp_path / "q.duckdb", flush_interval_s=60.0) as ddb:
+        run_id = ddb.log_run(exp_config)
+        assert ddb.log_qlog(run_id, "client", path, t0_ms=1000.0) == 4
+        ddb.flush()
+        assert ddb.conn.execute(
+            "SELECT count(*), count(smoothed_rtt_ms), max(ssthresh) FROM qlog_metrics"
+        ).fetchone() == (2, 1, 6750)
+        assert ddb.conn.execute(
+            "SELECT kind, frame_offset FROM qlog_loss ORDER BY t_ms"
+        ).fetchall() == [("lost", None), ("retransmit", 0)]
+
+def test_netns_pair_commands():
+    from qprism.netem import namespace as netns
+    from qprism.netem.profiles import NetemProfile
+
+    pair = netns.netns_pair(3)
+    assert (pair.name, pair.host_addr, pair.peer_addr) == ("qprism3", "10.200.3.1", "10.200.3.2")
+    assert max(len(pair.host_if), len(netns.netns_pair(253).peer_if)) <= 15
+    setup = netns.create(pair, dry_run=True)
+    assert setup[0] == ["ip", "netns", "add", "qprism3"]
+    assert ["ip", "link", "set", "qpn3", "netns", "qprism3"] in setup
+    assert netns.destroy(pair, dry_run=True) == [["ip", "netns", "del", "qprism3"]]
+    with pytest.raises(ValueError):
+        netns.netns_pair(254)
+
+    profile = NetemProfile(name="p", rtt_ms=40, jitter_ms=0, loss=0.0, description="")
+    host_cmd, peer_cmd = netns.apply_profile(pair, profile, dry_run=True)
+    assert host_cmd == ["tc", "qdisc", "replace", "dev", "qph3", "root", "netem", "delay", "40ms"]
+    assert peer_cmd == ["ip", "netns", "exec", "qprism3", *host_cmd[:4], "qpn3", *host_cmd[5:]]
+    assert netns.clear(pair, dry_run=True)[1] == ["ip", "netns", "exec", "qprism3", "tc", "qdisc", "del", "dev", "qpn3", "root"]
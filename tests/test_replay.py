@@ -0,0 +1,324 @@
+import random
+
+from qprism.experiments.replay import ModeledLatency, RecordedLatency, replay_trace, ring_inversions
+from qprism.experiments.scheduler_bench import compare_to_baseline, run_benchmarks, synthetic_viewport
+from qprism.scheduler.registry import make_scheduler
+from qprism.scheduler.rings import compute_ring
+from qprism.types import Tile
+from qprism.viewport.traces import TracePoint
+
+def _pan_trace(frames: int = 20):
+    return [TracePoint(t_ms=i * 100, lat=39.74, lon=-104.99 + i * 0.01, zoom=12) for i in range(frames)]
+
+def test_ring_inversions():
+    assert ring_inversions([0, 0, 1, 2, 3]) == 0
+    assert ring_inversions([3, 0]) == 1
+    assert ring_inversions([2, 1, 0]) == 3
+
+def test_replay_trace_without_network():
+    trace = _pan_trace()
+    result = replay_trace(trace, make_scheduler("qprism_full"), ModeledLatency(seed=1), rng=random.Random(1))
+    assert result.frames == len(trace)
+    assert result.requested > 0
+    assert len(result.completions) == result.requested
+    assert result.ordering_quality == 1.0
+    summary = result.summary()
+    assert summary["ns_per_schedule"] > 0 and summary["ns_p99"] >= summary["ns_p50"]
+
+    # Replaying the recorded completions reproduces their latencies
+    recorded = RecordedLatency(result.completions)
+    again = replay_trace(trace, make_scheduler("qprism_full"), recorded, rng=random.Random(1))
+    lat = lambda cs: sorted(c.completed_at_ms - c.requested_at_ms for c in cs)
+    assert lat(again.completions) == lat(result.completions)
+
+def test_replay_scores_ring_ordering_per_policy():
+    trace = _pan_trace()
+
+    def replay(variant, rings=3):
+        return replay_trace(
+            trace, make_scheduler(variant), ModeledLatency(seed=1), rng=random.Random(1), candidate_rings=rings,
+        )
+
+    # Offered the same rings, the passthrough sends them in shuffled order
+    passthrough, full = replay("http2_default"), replay("qprism_full")
+    assert passthrough.ring_pairs and full.ring_pairs
+    assert passthrough.ring_inversions > full.ring_inversions
+    assert passthrough.ordering_quality < full.ordering_quality
+    # Left to their own candidates, only the ring-aware policy looks past the viewport
+    assert replay("http2_default", None).requested < replay("qprism_full", None).requested
+
+def test_synthetic_viewport_and_benchmarks():
+    for n in (10, 100, 1000):
+        viewport, tiles = synthetic_viewport(n)
+        assert len(tiles) == n
+        assert all(compute_ring(t, viewport) <= 3 for t in tiles)
+
+    rows = run_benchmarks(sizes=(10, 100), policies=["qprism_full", "http3_default"], repeats=1)
+    assert {(r["policy"], r["tiles"]) for r in rows} == {
+        ("qprism_full", 10), ("qprism_full", 100), ("http3_default", 10), ("http3_default", 100)
+    }
+    assert all(r["ns_per_schedule"] > 0 for r in rows)
+    assert compare_to_baseline(rows, rows) == []
+    fast = [{**r, "ns_per_schedule": 1} for r in rows]
+    assert len(compare_to_baseline(rows, fast)) == len(rows)
+
+def test_matrix_expansion_and_failing_cells_are_reported(tmp_path):
+    from dataclasses import replace
+    from pathlib import Path
+    import pytest
+    from qprism.config import BaseConfig, ExperimentConfig
+    from qprism.experiments.matrix import expand_matrix, run_matrix, worker_base
+
+    exps = [
+        ExperimentConfig(
+            name=variant, scheduler_variant=variant, netem_profile="low_loss",
+            trace_path=Path("trace.json"), runs=2, seed_base=10,
+        )
+        for variant in ("qprism_full", "http3_default")
+    ]
+    cells = expand_matrix(exps, profiles=["low_loss", "high_loss"], seeds=[1, 2, 3])
+    assert len(cells) == 12 and [c.index for c in cells] == list(range(12))
+    assert {(c.exp.netem_profile, c.exp.seed_base, c.exp.runs) for c in cells[:6]} == {
+        (p, s, 1) for p in ("low_loss", "high_loss") for s in (1, 2, 3)
+    }
+    assert [c.exp.seed_base for c in expand_matrix(exps[:1])] == [10, 11]
+
+    base = BaseConfig(
+        experiment_root=tmp_path, duckdb_path=tmp_path / "r.duckdb", default_trace=Path("t.json"),
+        default_tile_source=Path("tiles.mbtiles"), viewport_sample_hz=10,
+        viewport_complete_threshold=0.95, stall_threshold_seconds=0.25,
+    )
+    assert worker_base(base, 2).duckdb_path == tmp_path / "r.w2.duckdb"
+    assert worker_base(replace(base, results_store="parquet"), 2).duckdb_path == base.duckdb_path
+
+    with pytest.raises(ValueError):
+        run_matrix(cells, base=base, repo_root=tmp_path, workers=2, isolate=False)
+    # Missing tiles fail every cell inside the workers without stopping the matrix
+    seen = []
+    results = run_matrix(
+        cells[:3], base=base, repo_root=tmp_path, workers=2, mbtiles_path=tmp_path / "missing.mbtiles",
+        isolate=False, apply_netem=False, on_result=seen.append,
+    )
+    assert [r.index for r in results] == [0, 1, 2] and len(seen) == 3
+    assert {r.slot for r in results} <= {0, 1}
+    assert all("MBTiles not found" in r.error for r in results)
+
+def test_simulated_transport_is_seeded_and_models_the_profile(tmp_path):
+    from dataclasses import replace
+    from pathlib import Path
+    import pytest
+    from qprism.config import BaseConfig, ExperimentConfig
+    from qprism.experiments.sim import SimLink, simulate_experiment, simulate_trace
+    from qprism.logging_sink.duckdb_logger import DuckDBLogger
+    from qprism.netem.profiles import NetemProfile
+    from qprism.sketch import RingSketches
+    from qprism.viewport.completeness import LiveCompleteness
+    from qprism.viewport.prepared import as_prepared
+
+    prepared = as_prepared(_pan_trace(40))
+
+    def p50(profile, seed=1):
+        sketches = RingSketches()
+        result = simulate_trace(
+            prepared, make_scheduler("qprism_full"), "qprism_full", SimLink(profile, random.Random(seed)),
+            random.Random(seed), LiveCompleteness(prepared), sketches,
+        )
+        assert len(result.completions) == result.requested > 0
+        return [(c.tile_id, c.completed_at_ms) for c in result.completions], sketches.by_ring[-1].quantile(0.5)
+
+    clean = NetemProfile(name="clean", rtt_ms=40, jitter_ms=5, loss=0.0, description="")
+    assert p50(clean) == p50(clean)
+    assert p50(clean) != p50(clean, seed=2)
+    assert p50(NetemProfile("lossy", 40, 5, 0.05, ""))[1] > p50(clean)[1]
+    assert p50(NetemProfile("narrow", 40, 5, 0.0, "", rate_kbit=1000))[1] > p50(clean)[1]
+
+    # 100 bytes/ms shared by two streams until the reset reaches the server
+    link = SimLink(NetemProfile("slow", 10, 0, 0.0, "", rate_kbit=800), random.Random(0))
+    delivered = []
+    on_delivered = lambda key, at_ms, nbytes: delivered.append((key, at_ms, nbytes))
+    link.request((12, 1, 1), 0, 20_000)
+    link.request((12, 1, 2), 0, 20_000)
+    link.advance(130, on_delivered)
+    assert link.cancel((12, 1, 2), 130) and not link.cancel((12, 1, 2), 130)
+    link.advance(1_000, on_delivered)
+    assert [(k, round(t), n) for k, t, n in delivered] == [((12, 1, 1), 295, 20_000)]
+    assert link.wasted_bytes == 5_500 and link.in_flight == 0
+
+    base = BaseConfig(
+        experiment_root=tmp_path, duckdb_path=tmp_path / "r.duckdb", default_trace=Path("t.json"),
+        default_tile_source=Path("tiles.mbtiles"), viewport_sample_hz=10,
+        viewport_complete_threshold=0.95, stall_threshold_seconds=0.25,
+    )
+    exp = ExperimentConfig(
+        name="sim", scheduler_variant="http3_default", netem_profile="mid_loss",
+        trace_path=Path("trace.json"), runs=3, seed_base=7,
+    )
+    ddb = DuckDBLogger(":memory:")
+    summaries = simulate_experiment(base=base, exp=exp, ddb=ddb, prepared=prepared)
+    assert [s.seed for s in summaries] == [7, 8, 9]
+    assert all(s.completed == s.requested and s.ttfv_ms is not None for s in summaries)
+    assert ddb.conn.execute("SELECT DISTINCT mode FROM runs").fetchall() == [("sim",)]
+    assert ddb.conn.execute("SELECT count(DISTINCT run_id) FROM tile_completions").fetchone()[0] == 3
+    # Logged completeness is on the base.viewport_sample_hz grid, one 100 ms step apart
+    steps = ddb.conn.execute(
+        "SELECT DISTINCT ts_ms - lag(ts_ms) OVER (PARTITION BY run_id ORDER BY ts_ms) FROM viewport_samples"
+    ).fetchall()
+    assert {s for (s,) in steps if s is not None} == {100}
+    with pytest.raises(KeyError):
+        simulate_experiment(base=base, exp=replace(exp, netem_profile="nope"), prepared=prepared)
+
+def test_frame_step_offers_unrequested_tiles_to_the_transport():
+    from qprism.experiments.frame_step import schedule_frame
+    from qprism.viewport.prepared import as_prepared
+
+    class Recording:
+        def __init__(self):
+            self.requests, self.cancels = [], []
+
+        def now_ms(self):
+            return 7
+
+        def request(self, tile, tr):
+            self.requests.append((tile, tr))
+
+        def cancel(self, tile):
+            self.cancels.append(tile)
+
+    prepared = as_prepared(_pan_trace(2))
+    transport, requested = Recording(), set()
+    scheduler = make_scheduler("http3_default")
+    frame = schedule_frame(0, prepared.trace[0], prepared, scheduler, transport, requested, random.Random(0))
+    assert frame.candidates == frame.loaded == len(transport.requests) == len(requested) > 0
+    assert all(tr.requested_at_ms == 7 and tr.tile_id == f"{t.x}_{t.y}" for t, tr in transport.requests)
+    # The same frame again has nothing left to offer
+    again = schedule_frame(0, prepared.trace[0], prepared, scheduler, transport, requested, random.Random(0))
+    assert again.candidates == 0 and len(transport.requests) == frame.loaded
+
+def test_baselines_request_only_visible_tiles():
+    from qprism.experiments.sim import SimLink, simulate_trace
+    from qprism.netem.profiles import NetemProfile
+    from qprism.scheduler.rings import compute_ring
+    from qprism.sketch import RingSketches
+    from qprism.viewport.completeness import LiveCompleteness
+    from qprism.viewport.prepared import as_prepared
+
+    prepared = as_prepared([TracePoint(t_ms=i * 100, lat=39.74, lon=-104.99, zoom=12) for i in range(5)])
+    visible = {(12, x, y) for (x, y) in prepared.visible[0]}
+    viewport = prepared.viewports[0]
+
+    def requested(variant):
+        result = simulate_trace(
+            prepared, make_scheduler(variant), variant, SimLink(NetemProfile("clean", 10, 0, 0.0, ""), random.Random(0)),
+            random.Random(0), LiveCompleteness(prepared), RingSketches(),
+        )
+        return {(c.zoom, *map(int, c.tile_id.split("_"))) for c in result.completions}
+
+    for variant in ("http2_default", "http3_default", "qprism_priority_only", "qprism_cancel_only"):
+        assert requested(variant) == visible
+    # Ring-aware policies opt in to the rings around the viewport
+    full = requested("qprism_full")
+    assert visible < full
+    assert {compute_ring(Tile(x, y, z), viewport) for (z, x, y) in full} == {0, 1, 2, 3}
+
+def _area_mbtiles(tmp_path):
+    import sqlite3
+    # Every z12 tile around Denver
+    mbtiles = tmp_path / "area.mbtiles"
+    con = sqlite3.connect(str(mbtiles))
+    con.execute("CREATE TABLE tiles (zoom_level INTEGER, tile_column INTEGER, tile_row INTEGER, tile_data BLOB)")
+    con.executemany(
+        "INSERT INTO tiles VALUES (12, ?, ?, ?)",
+        [(x, y, b"\x02" * 3000) for x in range(840, 870) for y in range(2520, 2560)],
+    )
+    con.commit()
+    con.close()
+    return mbtiles
+
+def _run_h2_trace(tmp_path, prepared, scheduler, replay_speed=1.0):
+    import asyncio
+    from pathlib import Path
+    from qprism.config import ExperimentConfig
+    from qprism.experiments.run import _run_single_trace, _start_h2_server
+    from qprism.logging_sink.duckdb_logger import DuckDBLogger
+    from qprism.sketch import RingSketches
+    from qprism.viewport.completeness import LiveCompleteness
+
+    ddb = DuckDBLogger(":memory:")
+    exp = ExperimentConfig(
+        name="runner", scheduler_variant="http2_default", netem_profile="low_loss",
+        trace_path=Path("trace.json"), runs=1, seed_base=0,
+    )
+    run_id = ddb.log_run(exp)
+
+    async def run():
+        runner, base_url = await _start_h2_server(_area_mbtiles(tmp_path))
+        try:
+            return await _run_single_trace(
+                prepared, scheduler, "http2_default", base_url, "127.0.0.1", 0, run_id, ddb,
+                random.Random(0), LiveCompleteness(prepared), RingSketches(), replay_speed=replay_speed,
+            )
+        finally:
+            await runner.cleanup()
+
+    return asyncio.run(run()), ddb
+
+def test_runner_stamps_requests_on_trace_time_at_any_speed(tmp_path):
+    from qprism.viewport.prepared import as_prepared
+
+    frames = (0, 400, 800)
+    prepared = as_prepared([TracePoint(t_ms=t, lat=39.74, lon=-104.99 + i * 0.1, zoom=12) for i, t in enumerate(frames)])
+    completions, ddb = _run_h2_trace(tmp_path, prepared, make_scheduler("http2_default"), replay_speed=4.0)
+    assert completions and not any(c.cancelled for c in completions)
+    requested = sorted(c.requested_at_ms for c in completions)
+    assert requested[0] >= frames[0]
+    # The last frame's requests are sent once it is released, on the frame's own clock
+    loaded, lateness_us = ddb.conn.execute(
+        "SELECT loaded, lateness_us FROM scheduler_frames WHERE frame_idx = 2"
+    ).fetchone()
+    released_ms = frames[-1] + lateness_us * 4 // 1000
+    assert loaded and all(released_ms <= r < released_ms + 200 for r in requested[-loaded:])
+    assert all(c.completed_at_ms >= c.requested_at_ms for c in completions)
+
+def test_runner_holds_outer_rings_back_until_ring_0_is_complete(tmp_path):
+    from qprism.scheduler.policy_qprism import QPrismScheduler
+    from qprism.types import Ring
+    from qprism.viewport.prepared import as_prepared
+
+    # A still viewport, so every frame offers the same rings
+    prepared = as_prepared([TracePoint(t_ms=i * 100, lat=39.74, lon=-104.99, zoom=12) for i in range(40)])
+    completions, ddb = _run_h2_trace(tmp_path, prepared, QPrismScheduler(r0_first=True))
+    assert not any(c.cancelled for c in completions)
+    candidates, loaded = ddb.conn.execute(
+        "SELECT candidates, loaded FROM scheduler_frames WHERE frame_idx = 0"
+    ).fetchone()
+    r0 = [c for c in completions if c.ring == Ring.R0]
+    outer = [c for c in completions if c.ring >= Ring.R2]
+    # Ring 2-3 tiles were offered with the first frame but only sent once all of ring 0 was in
+    assert r0 and outer and loaded < candidates
+    assert min(c.requested_at_ms for c in outer) >= max(c.completed_at_ms for c in r0)
+
+def test_frame_pacer_releases_frames_on_trace_time():
+    import asyncio
+    import time
+    from qprism.experiments.run import _FramePacer
+
+    async def replay(speed, t_ms=(1000, 1040, 1080, 1120)):
+        pacer = _FramePacer(time.monotonic_ns(), t_ms[0], speed)
+        frames = []
+        for t in t_ms:
+            lateness, lag = await pacer.wait(t)
+            frames.append((pacer.now_ms(), lateness, lag))
+        return frames
+
+    paced = asyncio.run(replay(1.0))
+    # Run clock starts at the first trace time and frames wait for theirs
+    assert 1000 <= paced[0][0] < 1030 and paced[-1][0] >= 1120
+    assert all(lateness is not None and -2_000 < lateness < 30_000 and 0 <= lag <= lateness + 2_000
+               for _now, lateness, lag in paced)
+    # At 4x the frames come four times as fast but the clock still reads trace time
+    start = time.monotonic()
+    fast = asyncio.run(replay(4.0))
+    assert time.monotonic() - start < 0.1
+    assert 1120 <= fast[-1][0] < 1240 and all(now >= t for (now, _l, _g), t in zip(fast, (1000, 1040, 1080, 1120)))
+    unpaced = asyncio.run(replay(0.0))
+    assert unpaced[-1][0] < 1030 and all(lateness is None for _now, lateness, _lag in unpaced)
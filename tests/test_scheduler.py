@@ -115,3 +115,169 @@ for t in outside_inflight_tiles:
     assert not cancel_scheduler.inflight_tracker.is_in_flight(t)
 
 
+
+def test_qprism_ring_budgets_hold_back_outer_rings():
+    ring1 = [Tile(7, 5, 10), Tile(7, 6, 10), Tile(5, 7, 10)]
+    ring2 = [Tile(8, 5, 10), Tile(8, 6, 10)]
+    sched = QPrismScheduler(ring_budgets={1: 1, 2: 0, 3: 0}, fairness_threshold=2)
+    to_load, _ = sched.schedule(viewport, R0_tiles + ring1 + ring2)
+    assert set(R0_tiles) <= set(to_load)
+    assert sum(1 for t in to_load if t in ring1) == 1
+    assert not any(t in ring2 for t in to_load)
+
+    # Held-back tiles are reconsidered without being passed again and the
+    # fairness guard releases them once they have been skipped enough times
+    to_load, _ = sched.schedule(viewport, [])
+    assert to_load == []
+    to_load, _ = sched.schedule(viewport, [])
+    assert set(ring1[1:] + ring2) == set(to_load)
+
+def test_qprism_bandwidth_admission_uses_completions():
+    from qprism.types import TileCompletion, Ring
+
+    ring1 = [Tile(7, 5, 10), Tile(7, 6, 10)]
+    sched = QPrismScheduler(fairness_threshold=100)
+    to_load, _ = sched.schedule(viewport, [tile_r0_a])
+    assert to_load == [tile_r0_a]
+    # 10 KB in 100 ms: the pipe holds about one tile
+    sched.on_tile_completed(tile_r0_a, TileCompletion(
+        tile_id="5_5", zoom=10, ring=Ring.R0, requested_at_ms=0,
+        completed_at_ms=100, bytes_transferred=10_000,
+    ))
+    assert sched.estimator.capacity_tiles() == 1
+    assert not sched.inflight_tracker.is_in_flight(tile_r0_a)
+
+    to_load, _ = sched.schedule(viewport, [tile_r0_b] + ring1)
+    assert to_load == [tile_r0_b]
+    sched.on_tile_completed(tile_r0_b, None)
+    to_load, _ = sched.schedule(viewport, [])
+    assert len(to_load) == 1 and to_load[0] in ring1
+
+def test_qprism_r0_first_throttles_outer_rings_until_viewport_complete():
+    from qprism.types import TileCompletion, Ring
+    from qprism.viewport.completeness import LiveCompleteness
+    from qprism.viewport.prepared import prepare_trace
+    from qprism.viewport.traces import TracePoint
+
+    prepared = prepare_trace([TracePoint(t_ms=0, lat=0.0, lon=0.0, zoom=12)])
+    samples = []
+    tracker = LiveCompleteness(prepared, on_sample=lambda t, f: samples.append((t, f)))
+    tracker.advance(0)
+    live_viewport = prepared.viewports[0]
+    min_x, max_x, min_y, _max_y, z = live_viewport
+    r0 = [Tile(x, y, z) for (x, y) in sorted(prepared.visible[0])]
+    ring1, ring2 = Tile(max_x + 1, min_y, z), Tile(max_x + 2, min_y, z)
+
+    sched = QPrismScheduler(fairness_threshold=100, r0_first=True)
+    sched.attach_completeness(tracker)
+    to_load, _ = sched.schedule(live_viewport, r0 + [ring1, ring2])
+    assert set(to_load) == set(r0) | {ring1}
+    assert set(tracker.missing_r0()) == set(r0) and tracker.missing_r0_count == len(r0)
+
+    for i, t in enumerate(r0):
+        tc = TileCompletion(
+            tile_id=f"{t.x}_{t.y}", zoom=z, ring=Ring.R0, requested_at_ms=0, completed_at_ms=10 + i,
+        )
+        assert tracker.record(tc)
+        sched.on_tile_completed(t, tc)
+    assert tracker.fraction == 1.0 and tracker.missing_r0() == [] and tracker.missing_r0_count == 0
+    assert samples[0] == (0, 0.0) and samples[-1] == (10 + len(r0) - 1, 1.0)
+
+    to_load, _ = sched.schedule(live_viewport, [])
+    assert to_load == [ring2]
+
+def test_deadline_scheduler_orders_by_predicted_entry():
+    from qprism.scheduler.policy_deadline import DeadlineScheduler
+    from qprism.viewport.traces import TracePoint
+
+    sched = DeadlineScheduler(default_latency_ms=50)
+    # Pan east at zoom 10: one tile width (360/1024 deg) every 500 ms
+    step = 360.0 / 1024
+    sched.observe_frame(TracePoint(t_ms=0, lat=0.0, lon=0.0, zoom=10))
+    sched.observe_frame(TracePoint(t_ms=500, lat=0.0, lon=step, zoom=10))
+    vx, vy = sched.velocity()
+    assert vx > 0 and abs(vy) < 1e-12
+
+    ahead_far = Tile(9, 5, 10)
+    ahead_near = Tile(7, 5, 10)
+    behind = Tile(3, 5, 10)
+    leaving = Tile(4, 5, 10)
+    to_load, to_cancel = sched.schedule(viewport, [ahead_far, behind, tile_r0_a, ahead_near])
+    assert to_cancel == []
+    assert to_load == [tile_r0_a, ahead_near, ahead_far, behind]
+    assert sched.deadline_for(tile_r0_a) == 500
+    assert 500 < sched.deadline_for(ahead_near) < sched.deadline_for(ahead_far)
+    assert sched.deadline_for(behind) is None
+
+    # The trailing column exits in ~500 ms, too soon for a slow link
+    slow = DeadlineScheduler(default_latency_ms=1000)
+    for tp in list(sched._recent):
+        slow.observe_frame(tp)
+    to_load, _ = slow.schedule(viewport, [leaving, tile_r0_c])
+    assert to_load == [tile_r0_c]
+
+def test_qprism_zoom_fallback_requests_parents_first():
+    from qprism.scheduler.rings import ring_enum
+    from qprism.types import Ring
+
+    sched = QPrismScheduler(zoom_fallback=True)
+    sched.schedule(viewport, [tile_r0_a])
+    zoomed: Viewport = (8, 13, 8, 13, 11)
+    children = [Tile(x, y, 11) for x in range(8, 14) for y in range(8, 14)]
+    to_load, to_cancel = sched.schedule(zoomed, children)
+    parents = [t for t in to_load if t.z == 10]
+    # tile_r0_a is already in flight at z10 and is not requested again
+    assert {(t.x, t.y) for t in parents} == {(x, y) for x in range(4, 7) for y in range(4, 7)} - {(5, 5)}
+    assert to_load[:len(parents)] == parents
+    assert set(to_load[len(parents):]) == set(children)
+    assert ring_enum(parents[0], zoomed) == Ring.R0
+    # The old-zoom tile still covers the viewport so it is kept as a placeholder
+    assert to_cancel == []
+
+    # Zooming back out cancels the stale children and parents off screen
+    to_load, to_cancel = sched.schedule((40, 42, 40, 42, 10), [])
+    assert set(to_cancel) == set(children) | set(parents) | {tile_r0_a}
+
+def test_scheduler_registry():
+    import pytest
+    from qprism.scheduler.base import Scheduler
+    from qprism.scheduler.policy_default import PassthroughScheduler
+    from qprism.scheduler.registry import _REGISTRY, available_schedulers, make_scheduler, register_scheduler
+
+    for name in ("http2_default", "http3_default", "qprism_full", "qprism_deadline",
+                 "qprism_priority_only", "qprism_cancel_only"):
+        assert name in available_schedulers()
+        assert isinstance(make_scheduler(name), Scheduler)
+
+    baseline = make_scheduler("HTTP3_DEFAULT")
+    assert isinstance(baseline, PassthroughScheduler)
+    assert baseline.schedule(viewport, [tile_r3_a, tile_r0_a]) == ([tile_r3_a, tile_r0_a], [])
+
+    sched = make_scheduler("qprism_full", {"ring_budgets": {1: 2}})
+    assert sched.ring_budgets == {1: 2}
+    # Variants without that knob say so instead of failing inside the constructor
+    for name in ("qprism_priority_only", "qprism_cancel_only", "http3_default"):
+        with pytest.raises(ValueError, match=name):
+            make_scheduler(name, {"ring_budgets": {1: 2}})
+
+    try:
+        register_scheduler("test_passthrough", PassthroughScheduler)
+        assert isinstance(make_scheduler("test_passthrough"), PassthroughScheduler)
+        from_config = make_scheduler(
+            "test_from_config", factory="qprism.scheduler.policy_priority_only:PriorityOnlyScheduler"
+        )
+        assert isinstance(from_config, PriorityOnlyScheduler)
+        # A factory is used for that call only, builtins and the registry stay as they were
+        assert "test_from_config" not in available_schedulers()
+        shadow = make_scheduler("qprism_full", factory="qprism.scheduler.policy_priority_only:PriorityOnlyScheduler")
+        assert isinstance(shadow, PriorityOnlyScheduler)
+        assert not isinstance(make_scheduler("qprism_full"), PriorityOnlyScheduler)
+
+        with pytest.raises(KeyError):
+            make_scheduler("no_such_policy")
+        with pytest.raises(TypeError):
+            make_scheduler("not_a_scheduler", factory="builtins:object")
+    finally:
+        for name in ("test_passthrough", "test_from_config", "not_a_scheduler"):
+            _REGISTRY.pop(name, None)
+    assert "test_passthrough" not in available_schedulers()
@@ -46,6 +46,39 @@ def _cert_paths() -> Tuple[str, str]:
     else:
         raise FileNotFoundError(f'Could not find Cert or key at {root}/certs/')
 
+def _self_signed_cert(tmp_path: Path) -> Tuple[Path, Path]:
+    import datetime
+    from cryptography import x509
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import ec
+    from cryptography.x509.oid import NameOID
+
+    key = ec.generate_private_key(ec.SECP256R1())
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "localhost")])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(name).issuer_name(name).public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now).not_valid_after(now + datetime.timedelta(days=1))
+        .sign(key, hashes.SHA256())
+    )
+    cert_path, key_path = tmp_path / "cert.pem", tmp_path / "key.pem"
+    cert_path.write_bytes(cert.public_bytes(serialization.Encoding.PEM))
+    key_path.write_bytes(key.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+    ))
+    return cert_path, key_path
+
+def _tiny_mbtiles(tmp_path: Path, payload: bytes) -> Tuple[Path, str]:
+    mbtiles = tmp_path / "tiles.mbtiles"
+    con = sqlite3.connect(str(mbtiles))
+    con.execute("CREATE TABLE tiles (zoom_level INTEGER, tile_column INTEGER, tile_row INTEGER, tile_data BLOB)")
+    con.execute("INSERT INTO tiles VALUES (3, 1, 2, ?)", (payload,))
+    con.commit()
+    con.close()
+    return mbtiles, f"/tiles/3/1/{(1 << 3) - 1 - 2}.pbf"
+
 async def _start_h2_test_server(backend: MbTilesBackend) -> Tuple[web.AppRunner, str]:
     async def handle(request: web.Request) -> web.Response:
         z = int(request.match_info["z"])
@@ -132,3 +165,183 @@ async def test_qprism_client_server_pair_smoke():
     finally:
         server.close()
         await asyncio.sleep(0.05)
+
+def test_chunk_recorder_ring_buffer_drains_in_order():
+    from qprism.transport.chunk_recorder import ChunkRecorder
+
+    recorder = ChunkRecorder(capacity=4)
+    a = recorder.open("1_2", 14)
+    b = recorder.open("3_4", 14, stream_id=8)
+    a.request()
+    b.request()
+    tile_ids, zooms, stream_ids, kinds, t_us, sizes = recorder.drain()
+    assert tile_ids == ["1_2", "3_4"] and stream_ids == [-1, 8] and kinds == ["request", "request"]
+    assert recorder.pending == 0
+
+    # Six events into four slots: the two oldest are overwritten
+    a.headers()
+    for size in (100, 200, 300, 400):
+        a.data(size)
+    b.reset()
+    tile_ids, _zooms, _streams, kinds, t_us, sizes = recorder.drain()
+    assert kinds == ["data", "data", "data", "reset"] and sizes == [200, 300, 400, 0]
+    assert tile_ids[-1] == "3_4" and recorder.dropped == 2
+    assert t_us == sorted(t_us)
+
+def test_chunk_recorder_keeps_no_stream_past_its_slots():
+    from qprism.transport.chunk_recorder import ChunkRecorder
+
+    recorder = ChunkRecorder(capacity=8)
+    for i in range(10_000):
+        recorder.open(f"{i}_0", 14, stream_id=i).request()
+    tile_ids, _zooms, stream_ids, _kinds, _t_us, _sizes = recorder.drain()
+    assert stream_ids == list(range(9_992, 10_000)) and tile_ids[0] == "9992_0"
+    # Nothing the recorder holds grows past its preallocated slots
+    assert all(len(v) <= recorder.capacity for v in vars(recorder).values() if hasattr(v, "__len__"))
+
+@pytest.mark.asyncio
+async def test_qprism_records_tile_chunks_on_both_ends(tmp_path):
+    from qprism.transport.chunk_recorder import ChunkRecorder
+    from qprism.transport.server_shim.base_H3_shim import CHUNK_BYTES
+
+    payload = bytes(range(256)) * (CHUNK_BYTES * 2 // 256 + 10)
+    mbtiles, tile_path = _tiny_mbtiles(tmp_path, payload)
+
+    cert, key = _self_signed_cert(tmp_path)
+    quic_cfg = QuicConfiguration(is_client=False, alpn_protocols=["h3"])
+    quic_cfg.load_cert_chain(str(cert), str(key))
+    server_chunks = ChunkRecorder()
+    protocol_factory = server_shim_init(
+        "QPRISM", mbtiles_path=mbtiles, protocol_kwargs={"chunk_recorder": server_chunks}
+    )
+    client_chunks = ChunkRecorder()
+    client_config = QuicConfiguration(is_client=True, alpn_protocols=["h3"])
+
+    port = _free_port()
+    server = await serve("127.0.0.1", port, configuration=quic_cfg, create_protocol=protocol_factory)
+    try:
+        body = await asyncio.wait_for(
+            fetch_tile_qprism(
+                "127.0.0.1", port, tile_path, urgency=0,
+                config=client_config, chunks=client_chunks.open("1_5", 3),
+            ),
+            timeout=5.0,
+        )
+        assert body == payload
+    finally:
+        server.close()
+        await asyncio.sleep(0.05)
+
+    _ids, _zooms, _streams, kinds, t_us, sizes = client_chunks.drain()
+    assert kinds[:2] == ["request", "headers"] and set(kinds[2:]) == {"data"}
+    assert sum(sizes) == len(payload) and t_us == sorted(t_us)
+    ids, zooms, _streams, kinds, _t_us, sizes = server_chunks.drain()
+    assert set(ids) == {"1_5"} and set(zooms) == {3}
+    assert kinds[:2] == ["request", "headers"] and kinds.count("data") == 3
+    assert sum(sizes) == len(payload)
+
+@pytest.mark.asyncio
+async def test_qlog_capture_on_both_ends_is_ingested(tmp_path):
+    from aioquic.quic.logger import QuicFileLogger
+    from qprism.config import ExperimentConfig
+    from qprism.logging_sink.duckdb_logger import DuckDBLogger
+
+    payload = b"\x01" * 100_000
+    mbtiles, tile_path = _tiny_mbtiles(tmp_path, payload)
+    (tmp_path / "server").mkdir()
+    (tmp_path / "client").mkdir()
+
+    cert, key = _self_signed_cert(tmp_path)
+    quic_cfg = QuicConfiguration(is_client=False, alpn_protocols=["h3"])
+    quic_cfg.load_cert_chain(str(cert), str(key))
+    quic_cfg.quic_logger = QuicFileLogger(str(tmp_path / "server"))
+    client_config = QuicConfiguration(is_client=True, alpn_protocols=["h3"])
+    client_config.quic_logger = QuicFileLogger(str(tmp_path / "client"))
+
+    port = _free_port()
+    server = await serve(
+        "127.0.0.1", port, configuration=quic_cfg, create_protocol=server_shim_init("QPRISM", mbtiles_path=mbtiles)
+    )
+    try:
+        body = await asyncio.wait_for(
+            fetch_tile_qprism("127.0.0.1", port, tile_path, config=client_config), timeout=5.0
+        )
+        assert body == payload
+        # The server writes its trace once the connection has drained
+        for _ in range(100):
+            if list((tmp_path / "server").glob("*.qlog")):
+                break
+            await asyncio.sleep(0.05)
+    finally:
+        server.close()
+        await asyncio.sleep(0.05)
+
+    client_logs = list((tmp_path / "client").glob("*.qlog"))
+    server_logs = list((tmp_path / "server").glob("*.qlog"))
+    assert len(client_logs) == 1 and [p.name for p in server_logs] == [client_logs[0].name]
+
+    exp = ExperimentConfig(
+        name="qlog", scheduler_variant="qprism_full", netem_profile="low_loss",
+        trace_path=Path("trace.json"), runs=1, seed_base=0,
+    )
+    with DuckDBLogger(tmp_path / "q.duckdb") as ddb:
+        run_id = ddb.log_run(exp)
+        assert ddb.log_qlog(run_id, "client", client_logs[0]) > 0
+        ddb.log_qlog(run_id, "server", server_logs[0])
+        rows = ddb.conn.execute(
+            "SELECT side, count(*), count(smoothed_rtt_ms), min(cwnd) > 0 FROM qlog_metrics "
+            "JOIN runs USING (run_id) GROUP BY side ORDER BY side"
+        ).fetchall()
+    assert [r[0] for r in rows] == ["client", "server"]
+    assert all(r[1] > 0 and r[2] > 0 and r[3] for r in rows)
+
+@pytest.mark.asyncio
+async def test_load_mode_spreads_clients_and_reports_server_queue(tmp_path):
+    import json
+    import shutil
+    import duckdb
+    from qprism.config import BaseConfig, ExperimentConfig
+    from qprism.experiments.load import run_load
+
+    cert, key = _self_signed_cert(tmp_path)
+    certs = tmp_path / "src" / "qprism" / "certs"
+    certs.mkdir(parents=True)
+    shutil.copy(cert, certs / "cert.pem")
+    shutil.copy(key, certs / "key.pem")
+    # Every z12 tile the trace can show
+    mbtiles = tmp_path / "area.mbtiles"
+    con = sqlite3.connect(str(mbtiles))
+    con.execute("CREATE TABLE tiles (zoom_level INTEGER, tile_column INTEGER, tile_row INTEGER, tile_data BLOB)")
+    con.executemany(
+        "INSERT INTO tiles VALUES (12, ?, ?, ?)",
+        [(x, y, b"\x02" * 3000) for x in range(840, 870) for y in range(2520, 2560)],
+    )
+    con.commit()
+    con.close()
+    trace = tmp_path / "trace.json"
+    trace.write_text(json.dumps([{"t_ms": i * 50, "lat": 39.74, "lon": -104.99 + i * 0.01, "zoom": 12} for i in range(3)]))
+
+    base = BaseConfig(
+        experiment_root=tmp_path, duckdb_path=tmp_path / "r.duckdb", default_trace=trace,
+        default_tile_source=mbtiles, viewport_sample_hz=10,
+        viewport_complete_threshold=0.95, stall_threshold_seconds=0.25,
+    )
+    exp = ExperimentConfig(
+        name="load", scheduler_variant="qprism_full", netem_profile="low_loss", trace_path=trace, runs=1, seed_base=3,
+    )
+    clients = []
+    steps = await run_load(
+        base=base, exp=exp, repo_root=tmp_path, client_counts=[1, 3], mbtiles_path=mbtiles, port=_free_port(),
+        clients_per_process=2, sample_interval_s=0.001, on_client=clients.append,
+    )
+    assert [(s.clients, s.processes, s.errors) for s in steps] == [(1, 0, 0), (3, 2, 0)]
+    assert [c.seed for c in clients] == [3, 3, 4, 5] and all(c.p99_ms for c in clients)
+    for s in steps:
+        assert s.completed > 0 and s.tiles_per_s > 0 and s.served >= s.completed
+        assert s.p99_ms >= s.client_p99_median_ms
+    assert steps[1].depth_max >= 1
+
+    # In-process clients log to the sink, spawned ones to their worker's file
+    for path, runs in ((tmp_path / "r.duckdb", 1), (tmp_path / "r.w0.duckdb", 2), (tmp_path / "r.w1.duckdb", 1)):
+        with duckdb.connect(str(path), read_only=True) as conn:
+            assert conn.execute("SELECT count(*), min(mode) FROM runs").fetchone() == (runs, "load")
@@ -58,6 +58,211 @@ def test_generate_requests_and_completeness(tmp_path):
     comp_series = completeness.compute_completeness(loaded_trace, completions)
     comp_dict = {t: frac for t, frac in comp_series}
     assert comp_dict.get(0, None) == 0.0
-    assert math.isclose(comp_dict.get(1000, 0.0), 0.0625, rel_tol = 1e-6)
+    assert math.isclose(comp_dict.get(1000, 0.0), 1.0, rel_tol = 1e-6)
     assert math.isclose(comp_dict.get(2000, 0.0), 0.0, rel_tol = 1e-6)
+    assert [t for t, _ in comp_series] == sorted(t for t, _ in comp_series)
 
+def test_completeness_keeps_loaded_tiles_across_frames():
+    trace = [
+        traces.TracePoint(t_ms=0, lat=0.0, lon=0.0, zoom=12),
+        traces.TracePoint(t_ms=1000, lat=0.0, lon=90.0, zoom=12),
+        traces.TracePoint(t_ms=2000, lat=0.0, lon=0.0, zoom=12),
+    ]
+    needed = model.visible_tile_coords(0.0, 0.0, 12)
+    completions = [
+        TileCompletion(tile_id=f"{x}_{y}", zoom=12, ring=Ring.R0, requested_at_ms=0, completed_at_ms=500)
+        for (x, y) in needed
+    ]
+    completions.append(TileCompletion(
+        tile_id="0_0", zoom=12, ring=Ring.R0, requested_at_ms=0, completed_at_ms=600, cancelled=True,
+    ))
+    series = completeness.compute_completeness(trace, completions)
+    assert series[0] == (0, 0.0)
+    assert series[-1] == (2000, 1.0)
+    assert dict(series)[1000] == 0.0
+
+    resampled = completeness.compute_completeness(trace, completions, sample_hz=4)
+    assert [t for t, _ in resampled] == list(range(0, 2001, 250))
+    assert dict(resampled)[500] == 1.0 and dict(resampled)[750] == 1.0 and dict(resampled)[1250] == 0.0
+
+    # The live tracker streams the same grid
+    from qprism.viewport.prepared import as_prepared
+    streamed = []
+    tracker = completeness.LiveCompleteness(
+        as_prepared(trace), on_sample=lambda t, frac: streamed.append((t, frac)), sample_hz=4,
+    )
+    tracker.advance(0)
+    for tc in completions:
+        tracker.record(tc)
+    tracker.advance(1)
+    tracker.advance(2)
+    tracker.finish()
+    tracker.finish()
+    assert streamed == resampled
+
+
+def test_completeness_counts_overzoomed_parents():
+    trace = [traces.TracePoint(t_ms=0, lat=0.0, lon=0.0, zoom=12)]
+    needed = model.visible_tile_coords(0.0, 0.0, 12)
+    parent_x, parent_y = min(needed)[0] >> 1, min(needed)[1] >> 1
+    parent = TileCompletion(
+        tile_id=f"{parent_x}_{parent_y}", zoom=11, ring=Ring.R0,
+        requested_at_ms=0, completed_at_ms=100,
+    )
+    covered = sum(1 for (x, y) in needed if (x >> 1, y >> 1) == (parent_x, parent_y))
+
+    plain = completeness.compute_completeness(trace, [parent])
+    assert plain == [(0, 0.0)]
+    weighted = completeness.compute_completeness(trace, [parent], parent_weight=0.5)
+    assert weighted[-1] == (100, 0.5 * covered / len(needed))
+
+def test_vectorized_tile_ranges_match_scalar():
+    import numpy as np
+    import random as _random
+
+    rng = _random.Random(7)
+    pts = [(rng.uniform(-84, 84), rng.uniform(-180, 180), rng.randint(0, 18)) for _ in range(200)]
+    pts += [(0.0, 179.99, 3), (0.0, -179.99, 3), (85.0, 10.0, 4)]
+    lat = np.array([p[0] for p in pts])
+    lon = np.array([p[1] for p in pts])
+    zoom = np.array([p[2] for p in pts])
+    ranges = model.visible_tile_ranges(lat, lon, zoom)
+    for i, (la, lo, z) in enumerate(pts):
+        expanded = model.tiles_in_range(
+            int(ranges.x_min[i]), int(ranges.x_max[i]), int(ranges.y_min[i]), int(ranges.y_max[i]), z
+        )
+        assert expanded == model.visible_tile_coords(la, lo, z)
+        fx, fy = model.latlon_to_tile_frac(la, lo, z)
+        assert math.isclose(ranges.x_center[i], fx, rel_tol=1e-12)
+        assert math.isclose(ranges.y_center[i], fy, rel_tol=1e-12)
+        assert model.latlon_to_tile(la, lo, z) == (float(math.floor(fx)), float(min(math.floor(fy), 2 ** z - 1)))
+
+def test_prepared_trace_shared_state(tmp_path):
+    from qprism.scheduler.rings import viewport_from_visible
+    from qprism.viewport import prepared as prep
+
+    points = [
+        {"t_ms": 0, "lat": 39.74, "lon": -104.99, "zoom": 12},
+        {"t_ms": 100, "lat": 39.74, "lon": -104.90, "zoom": 12},
+        {"t_ms": 200, "lat": 39.74, "lon": -104.90, "zoom": 13},
+        {"t_ms": 300, "lat": 0.0, "lon": 179.99, "zoom": 3},
+    ]
+    trace_path = tmp_path / "trace.json"
+    trace_path.write_text(json.dumps(points))
+    loaded = traces.load_trace(str(trace_path))
+
+    prepared = prep.prepare_trace(loaded)
+    assert prep.prepare_trace(traces.load_trace(str(trace_path))) is prepared
+    prev = set()
+    for i, tp in enumerate(loaded):
+        visible = model.visible_tile_coords(tp.lat, tp.lon, tp.zoom)
+        assert prepared.visible[i] == visible
+        assert prepared.viewports[i] == viewport_from_visible(visible, tp.zoom)
+        keys = {(tp.zoom, x, y) for (x, y) in visible}
+        assert prepared.entered[i] == keys - prev
+        assert prepared.left[i] == prev - keys
+        prev = keys
+    # Built once per frame and shared by every consumer, evicted past the bound
+    assert prepared.visible[1] is prepared.visible[1] and prepared.entered[2] is prepared.entered[2]
+    frames = prep._Frames(3, lambda i: object(), size=2)
+    built = frames[0]
+    assert frames[0] is built and frames[1] is frames[1]
+    frames[2]
+    assert frames[0] is not built
+
+    sidecar = prep.prepared_path_for(trace_path)
+    prep._cache.clear()
+    first = prep.load_prepared_trace(trace_path, save=True)
+    assert sidecar.is_file()
+    prep._cache.clear()
+    again = prep.load_prepared_trace(trace_path)
+    assert again is not first and list(again.visible) == list(first.visible)
+    assert prep.PreparedTrace.load(sidecar, loaded[:2]) is None
+
+def test_qtrace_roundtrip_and_streaming(tmp_path):
+    import numpy as np
+    import pytest
+    from qprism.viewport import qtrace
+    from qprism.viewport.prepared import trace_fingerprint
+
+    points = [
+        {"t_ms": 100, "lat": 39.74, "lon": -104.90, "zoom": 12},
+        {"t_ms": 0, "lat": 39.74, "lon": -104.99, "zoom": 12},
+        {"t_ms": 200, "lat": 39.75, "lon": -104.80, "zoom": 13},
+    ]
+    flat = tmp_path / "flat.json"
+    flat.write_text(json.dumps(points))
+    framed = tmp_path / "framed.json"
+    framed.write_text(json.dumps({"frames": [
+        {"t_ms": p["t_ms"], "center_lon_lat": [p["lon"], p["lat"]], "zoom": p["zoom"]} for p in points
+    ]}))
+    expected = traces.load_trace(str(flat))
+    assert traces.load_trace(str(framed)) == expected
+
+    for src in (flat, framed):
+        dst = qtrace.convert_json_trace(src, tmp_path / f"{src.stem}.qtrace")
+        mapped = qtrace.open_qtrace(dst)
+        assert len(mapped) == 3 and mapped[0] == expected[0]
+        assert list(mapped) == expected == traces.load_trace(str(dst))
+        assert list(qtrace.iter_trace(dst, chunk_frames=2)) == expected
+        assert [len(c[0]) for c in qtrace.iter_chunks(dst, chunk_frames=2)] == [2, 1]
+        assert trace_fingerprint(mapped) == trace_fingerprint(expected)
+
+    # A sidecar hit keeps the columns mapped and builds frames only when read
+    from qprism.viewport import prepared as prep
+    fresh = prep.load_prepared_trace(dst, save=True)
+    prep._cache.clear()
+    lazy = prep.load_prepared_trace(dst)
+    assert lazy is not fresh and isinstance(lazy.trace.t_ms, np.memmap)
+    assert list(lazy.points()) == expected
+    assert [lazy.entered[i] for i in range(3)] == [fresh.entered[i] for i in range(3)]
+    assert lazy.viewports[-1] == fresh.viewports[2] and lazy.left[2]
+
+    (tmp_path / "bad.qtrace").write_bytes(b"NOPE" + bytes(12))
+    with pytest.raises(ValueError):
+        qtrace.open_qtrace(tmp_path / "bad.qtrace")
+
+def test_synthesized_sessions_are_seeded_and_bounded(tmp_path):
+    import numpy as np
+    from qprism.viewport import qtrace, synth
+
+    cfg = synth.SynthConfig(duration_s=20.0, fps=30, min_zoom=11, max_zoom=15)
+    manifest_path = synth.synthesize_traces(tmp_path / "a", 3, cfg, seed=5)
+    manifest = json.loads(manifest_path.read_text())
+    assert [s["file"] for s in manifest["sessions"]] == [f"session_{i:05d}.qtrace" for i in range(3)]
+
+    first = qtrace.open_qtrace(tmp_path / "a" / "session_00000.qtrace")
+    assert len(first) == manifest["sessions"][0]["frames"] == 600
+    assert np.all(np.diff(first.t_ms) > 0)
+    min_lon, min_lat, max_lon, max_lat = cfg.bbox
+    assert np.all((first.lon >= min_lon - 1e-9) & (first.lon <= max_lon + 1e-9))
+    assert np.all((first.lat >= min_lat - 1e-9) & (first.lat <= max_lat + 1e-9))
+    assert first.zoom.min() >= 11 and first.zoom.max() <= 15
+    assert sum(manifest["sessions"][0]["gestures"].values()) > 1
+
+    # A session depends only on its seed and index, not on how many were generated
+    synth.synthesize_traces(tmp_path / "b", 1, cfg, seed=5)
+    again = qtrace.open_qtrace(tmp_path / "b" / "session_00000.qtrace")
+    assert np.array_equal(first.lat, again.lat) and np.array_equal(first.zoom, again.zoom)
+
+    lat, lon = model.tile_frac_to_latlon_array(*model.latlon_to_tile_frac_array(39.7, -104.9, 12), 12)
+    assert math.isclose(float(lat), 39.7, abs_tol=1e-9) and math.isclose(float(lon), -104.9, abs_tol=1e-9)
+
+def test_viewport_geometry_scales_tile_sets():
+    from qprism.types import ViewportGeometry
+    from qprism.viewport.prepared import prepare_trace
+
+    trace = [traces.TracePoint(t_ms=0, lat=39.74, lon=-104.99, zoom=14)]
+    assert model.visible_tile_coords(39.74, -104.99, 14, geometry=ViewportGeometry()) == \
+        model.visible_tile_coords(39.74, -104.99, 14)
+    desktop = prepare_trace(trace)
+    phone = prepare_trace(trace, ViewportGeometry(390, 844, 3.0, 256))
+    uhd = prepare_trace(trace, ViewportGeometry(3840, 2160, 1.0, 256))
+    retina_512 = prepare_trace(trace, ViewportGeometry(800, 600, 2.0, 512))
+    assert len(phone.visible[0]) >= 3 * len(desktop.visible[0])
+    assert len(uhd.visible[0]) >= 5 * len(desktop.visible[0])
+    assert retina_512.visible[0] == desktop.visible[0] and retina_512 is not desktop
+
+    requests = completeness.generate_tile_requests(trace, ViewportGeometry(390, 844, 3.0, 256))
+    assert len(requests) == len(phone.visible[0])
+    assert completeness.compute_completeness(phone, []) == [(0, 0.0)]